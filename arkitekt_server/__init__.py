@@ -1,4 +1,20 @@
-from .main import main
-from .create import create_server
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .create import create_server
+    from .main import main
 
 __all__ = ["main", "create_server"]
+
+
+def __getattr__(name: str) -> Any:
+    # Imported lazily, so the programmatic API doesn't load the whole CLI
+    if name == "main":
+        from .main import main
+
+        return main
+    if name == "create_server":
+        from .create import create_server
+
+        return create_server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
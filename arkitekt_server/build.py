@@ -0,0 +1,293 @@
+import hashlib
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel, Field, ValidationError
+
+from .serialization import iterate_json
+from .utils import get_package_version
+
+
+MANIFEST_FILE = ".arkitekt_build.json"
+
+
+def hash_input(content: Any) -> str:
+    """
+    Create a content hash for the input of an artifact.
+
+    Lazy sequences in the content are hashed item by item, without
+    creating them as a whole.
+
+    Args:
+        content: A JSON serializable dictionary or a string
+
+    Returns:
+        The hex digest of the SHA-256 hash of the content
+    """
+    if isinstance(content, str):
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    digest = hashlib.sha256()
+    for chunk in iterate_json(content, default=str):
+        digest.update(chunk.encode())
+    return digest.hexdigest()
+
+
+class ArtifactRecord(BaseModel):
+    """
+    Record of a built artifact in the build manifest.
+
+    Attributes:
+        input_hash: Content hash of the input the artifact was built from
+        files: Paths of the files of the artifact, relative to the deployment directory
+    """
+
+    input_hash: str
+    files: list[str] = Field(default_factory=list)
+
+
+class ArtifactTiming(BaseModel):
+    """
+    Timing of the generation of a single artifact.
+
+    Attributes:
+        name: The name of the artifact
+        generate: Seconds it took to create the content of the artifact
+        write: Seconds it took to serialize and write the artifact
+    """
+
+    name: str
+    generate: float
+    write: float
+
+    @property
+    def total(self) -> float:
+        return self.generate + self.write
+
+
+class BuildManifest(BaseModel):
+    """
+    Manifest of the last build of a deployment directory.
+
+    The manifest is used to skip artifacts whose inputs did not change
+    since the last build. It is invalidated when the version of
+    arkitekt-server changes, as the generators might have changed.
+    """
+
+    version: str = Field(default_factory=get_package_version)
+    artifacts: dict[str, ArtifactRecord] = Field(default_factory=dict)
+
+    def is_up_to_date(
+        self, name: str, record: ArtifactRecord, base_path: Path
+    ) -> bool:
+        """
+        Check if an artifact can be skipped.
+
+        Args:
+            name: The name of the artifact
+            record: The record of the artifact that would be built now
+            base_path: The deployment directory
+
+        Returns:
+            True if the artifact was built from the same input and all of its files still exist
+        """
+        if self.version != get_package_version():
+            return False
+
+        previous = self.artifacts.get(name)
+        if previous is None or previous.input_hash != record.input_hash:
+            return False
+
+        return all((base_path / file).is_file() for file in previous.files)
+
+
+def load_manifest(base_path: Path) -> BuildManifest:
+    """
+    Load the build manifest of a deployment directory.
+
+    Args:
+        base_path: The deployment directory
+
+    Returns:
+        The build manifest, or an empty manifest if there is none or it is unreadable
+    """
+    try:
+        return BuildManifest.model_validate_json(
+            (base_path / MANIFEST_FILE).read_text()
+        )
+    except (FileNotFoundError, ValidationError):
+        return BuildManifest()
+
+
+def save_manifest(base_path: Path, manifest: BuildManifest) -> None:
+    """
+    Save the build manifest to a deployment directory.
+
+    Args:
+        base_path: The deployment directory
+        manifest: The manifest to save
+    """
+    (base_path / MANIFEST_FILE).write_text(manifest.model_dump_json(indent=2))
+
+
+RESTART_PLAN_FILE = ".arkitekt_restart.json"
+
+
+class RestartPlan(BaseModel):
+    """
+    Plan of the Docker Compose services that need to be recreated after a build.
+
+    Attributes:
+        services: The services to recreate, with the reasons why they are affected
+        removed: Services that are no longer part of the deployment
+    """
+
+    services: dict[str, list[str]] = Field(default_factory=dict)
+    removed: list[str] = Field(default_factory=list)
+
+    def merge(self, other: "RestartPlan") -> "RestartPlan":
+        """Merge another plan into this one (e.g. a pending plan of an earlier build)."""
+        services = {name: list(reasons) for name, reasons in self.services.items()}
+        for name, reasons in other.services.items():
+            services.setdefault(name, [])
+            services[name] += [r for r in reasons if r not in services[name]]
+        removed = sorted(
+            (set(self.removed) - set(other.services)) | set(other.removed)
+        )
+        return RestartPlan(
+            services={k: v for k, v in services.items() if k not in removed},
+            removed=removed,
+        )
+
+
+def get_depends_on(definition: dict[str, Any]) -> list[str]:
+    """
+    Get the names of the services a Docker Compose service depends on.
+
+    Args:
+        definition: The Docker Compose service definition
+
+    Returns:
+        The names of the dependencies, for both the list and the mapping syntax
+    """
+    depends_on = definition.get("depends_on") or []
+    if isinstance(depends_on, dict):
+        return list(depends_on.keys())
+    return list(depends_on)
+
+
+def get_mounted_files(definition: dict[str, Any]) -> list[Path]:
+    """
+    Get the files of the deployment directory a Docker Compose service mounts.
+
+    Args:
+        definition: The Docker Compose service definition
+
+    Returns:
+        The mounted paths, relative to the deployment directory
+    """
+    mounted: list[Path] = []
+    for volume in definition.get("volumes") or []:
+        source = volume.split(":")[0]
+        if source.startswith("./"):
+            mounted.append(Path(source))
+    return mounted
+
+
+def plan_restarts(
+    changed: list[Path],
+    old_compose: dict[str, Any] | None,
+    new_compose: dict[str, Any],
+    compose_file: Path = Path("docker-compose.yaml"),
+) -> RestartPlan:
+    """
+    Map changed files to the minimal set of services that need to be recreated.
+
+    A service is affected if it mounts a changed file, or if its definition
+    in the Docker Compose file changed. Services that depend on an affected
+    service are affected as well.
+
+    Args:
+        changed: Changed files, relative to the deployment directory
+        old_compose: The previous Docker Compose definition (None if there was none)
+        new_compose: The new Docker Compose definition
+        compose_file: The path of the Docker Compose file, relative to the deployment directory
+
+    Returns:
+        The restart plan
+    """
+    services: dict[str, Any] = new_compose.get("services", {})
+    old_services: dict[str, Any] = (old_compose or {}).get("services", {})
+    changed_files = set(changed)
+    affected: dict[str, list[str]] = {}
+
+    for name, definition in services.items():
+        for mounted in get_mounted_files(definition):
+            if mounted in changed_files:
+                affected.setdefault(name, []).append(mounted.as_posix())
+
+    removed: list[str] = []
+    if compose_file in changed_files:
+        shared_changed = old_compose is None or any(
+            old_compose.get(key) != new_compose.get(key)
+            for key in ("networks", "volumes")
+        )
+        for name, definition in services.items():
+            if shared_changed or old_services.get(name) != definition:
+                affected.setdefault(name, []).append(compose_file.as_posix())
+        removed = sorted(set(old_services) - set(services))
+
+    dependents: dict[str, list[str]] = {}
+    for name, definition in services.items():
+        for dependency in get_depends_on(definition):
+            dependents.setdefault(dependency, []).append(name)
+
+    queue = list(affected)
+    while queue:
+        dependency = queue.pop()
+        for name in dependents.get(dependency, []):
+            if name not in affected:
+                affected[name] = []
+                queue.append(name)
+            reason = f"depends on {dependency}"
+            if reason not in affected[name]:
+                affected[name].append(reason)
+
+    return RestartPlan(
+        services={name: affected[name] for name in sorted(affected)},
+        removed=removed,
+    )
+
+
+def load_restart_plan(base_path: Path) -> RestartPlan:
+    """
+    Load the pending restart plan of a deployment directory.
+
+    Args:
+        base_path: The deployment directory
+
+    Returns:
+        The pending restart plan, or an empty plan if there is none
+    """
+    try:
+        return RestartPlan.model_validate_json(
+            (base_path / RESTART_PLAN_FILE).read_text()
+        )
+    except (FileNotFoundError, ValidationError):
+        return RestartPlan()
+
+
+def save_restart_plan(base_path: Path, plan: RestartPlan) -> None:
+    """
+    Save the pending restart plan to a deployment directory.
+
+    Args:
+        base_path: The deployment directory
+        plan: The restart plan to save
+    """
+    (base_path / RESTART_PLAN_FILE).write_text(plan.model_dump_json(indent=2))
+
+
+def clear_restart_plan(base_path: Path) -> None:
+    """Remove the pending restart plan of a deployment directory."""
+    (base_path / RESTART_PLAN_FILE).unlink(missing_ok=True)
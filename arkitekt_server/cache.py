@@ -0,0 +1,109 @@
+import hashlib
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable
+
+from . import config as config_module
+from .config import ArkitektServerConfig
+from .utils import get_package_version
+
+
+CACHE_DIR = ".arkitekt_cache"
+
+
+@lru_cache(maxsize=None)
+def get_schema_fingerprint() -> str:
+    """
+    Get a fingerprint of the config models.
+
+    The package version is not enough to detect changed models, it stays
+    the same between commits (and is unknown if the package isn't
+    installed), so the source of the module defining the models is hashed.
+
+    Returns:
+        The hex digest of the SHA-256 hash of the source of the config models
+    """
+    return hashlib.sha256(Path(config_module.__file__).read_bytes()).hexdigest()
+
+
+def get_cache_key(content: bytes) -> str:
+    """
+    Create the cache key for the content of a config file.
+
+    The key includes the version of arkitekt-server and a fingerprint of
+    the config models, as the models (and their defaults) might change.
+
+    Args:
+        content: The raw content of the config file
+
+    Returns:
+        The hex digest of the SHA-256 hash of the content, version and models
+    """
+    digest = hashlib.sha256(content)
+    digest.update(get_package_version().encode())
+    digest.update(get_schema_fingerprint().encode())
+    return digest.hexdigest()
+
+
+def get_cache_file(config_file: Path) -> Path:
+    """Get the path of the validated snapshot of a config file."""
+    return config_file.parent / CACHE_DIR / f"{config_file.name}.pickle"
+
+
+def load_cached_config(
+    config_file: Path,
+    parse: Callable[[bytes], ArkitektServerConfig],
+) -> ArkitektServerConfig:
+    """
+    Load a config file, reusing the validated snapshot of an earlier load.
+
+    The snapshot is only used if it was created from the same file content
+    by the same version of arkitekt-server, with the same config models. Otherwise the file is parsed
+    and validated again, and the snapshot is replaced. Set
+    ARKITEKT_SERVER_NO_CACHE to always parse the file.
+
+    Args:
+        config_file: The path of the config file
+        parse: Parses and validates the raw content of the config file
+
+    Returns:
+        The validated configuration
+    """
+    content = config_file.read_bytes()
+    if os.environ.get("ARKITEKT_SERVER_NO_CACHE"):
+        return parse(content)
+
+    key = get_cache_key(content)
+    cache_file = get_cache_file(config_file)
+
+    try:
+        with open(cache_file, "rb") as f:
+            # The key is stored first, so stale snapshots are never unpickled
+            if pickle.load(f) == key:
+                config = pickle.load(f)
+                if isinstance(config, ArkitektServerConfig):
+                    return config
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # Corrupt or incompatible snapshot, it is replaced below
+        pass
+
+    config = parse(content)
+
+    try:
+        cache_file.parent.mkdir(exist_ok=True)
+        temporary = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        # The snapshot contains the same secrets as the config file
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cache_file)
+    except OSError:
+        # Caching is best effort, e.g. for read-only deployment directories
+        pass
+
+    return config
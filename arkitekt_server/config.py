@@ -1,15 +1,15 @@
-from asyncio import subprocess
-from typing import Dict, Literal, Protocol, Sequence, Union, runtime_checkable
-
-import click
-import namegenerator
-import typer
-import yaml
-from cryptography.hazmat.backends import default_backend as crypto_default_backend
-from cryptography.hazmat.primitives import serialization as crypto_serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from pydantic import BaseModel, ConfigDict, Field
+import os
 import secrets
+from typing import Any, Dict, Literal, Protocol, Union, runtime_checkable
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    PrivateAttr,
+    field_serializer,
+    model_validator,
+)
 
 
 def generate_django_secret_key():
@@ -41,10 +41,17 @@ def generate_name() -> str:
     Generate a random name using the namegenerator library.
     This is used to create unique names for resources such as S3 buckets.
     """
+    import namegenerator
+
     return namegenerator.gen()
 
 
 def build_key_pair() -> KeyPair:
+    # cryptography is slow to import, and only needed once a key is generated
+    from cryptography.hazmat.backends import default_backend as crypto_default_backend
+    from cryptography.hazmat.primitives import serialization as crypto_serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
     key = rsa.generate_private_key(
         public_exponent=65537, key_size=2048, backend=crypto_default_backend()
     )
@@ -127,11 +134,66 @@ class GlobalAdminConfig(BaseModel):
     )
 
 
+class RedisTuningConfig(BaseModel):
+    """
+    Sizing, persistence and eviction settings of a local Redis instance.
+
+    If disabled, Redis runs with the defaults of the image (no memory
+    limit, RDB snapshots and no eviction).
+    """
+
+    enabled: bool = Field(
+        default=False,
+        description="Whether to apply the settings. If False, Redis runs with the defaults of the image",
+    )
+    maxmemory: str | None = Field(
+        default=None,
+        description="Memory limit of Redis (e.g. 512mb). If None, the memory is not limited",
+    )
+    maxmemory_policy: Literal[
+        "noeviction",
+        "allkeys-lru",
+        "allkeys-lfu",
+        "allkeys-random",
+        "volatile-lru",
+        "volatile-lfu",
+        "volatile-random",
+        "volatile-ttl",
+    ] = Field(
+        default="noeviction",
+        description="What Redis evicts when maxmemory is reached. Only use an allkeys policy for instances that only hold caches",
+    )
+    rdb: bool = Field(
+        default=True,
+        description="Whether to write RDB snapshots. Snapshots fork the Redis process, which causes latency spikes on large instances",
+    )
+    aof: bool = Field(
+        default=False,
+        description="Whether to write an append only file",
+    )
+    io_threads: int = Field(
+        default=1,
+        ge=1,
+        description="Number of I/O threads of Redis",
+    )
+    model_config = ConfigDict(
+        extra="forbid",
+    )
+
+
 class LocalRedisConfig(BaseModel):
     kind: Literal["local"] = Field(
         default="local",
         description="Kind of the Redis configuration, specifically for local Redis",
     )
+    dedicated: bool = Field(
+        default=False,
+        description="Whether the service gets its own Redis instance, instead of sharing the local Redis with the other services",
+    )
+    tuning: RedisTuningConfig | None = Field(
+        default=None,
+        description="Settings of the dedicated Redis instance. If None, the settings of the shared local Redis are used",
+    )
 
 
 class RemoteRedisConfig(BaseModel):
@@ -243,6 +305,186 @@ class ForcePath(BaseModel):
 PathConfig = Union[LocalPath, ForcePath]
 
 
+def get_cpu_count() -> int:
+    """Get the number of CPUs of this machine."""
+    return os.cpu_count() or 1
+
+
+def get_memory_mb() -> int:
+    """Get the physical memory of this machine in MB (8GB if it can't be determined)."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return 8192
+
+
+class ServiceResourceConfig(BaseModel):
+    """
+    Resources of a single Docker Compose service in the resource plan.
+
+    Services without explicit limits share the remaining resources of the
+    host according to their weights.
+    """
+
+    weight: float = Field(
+        default=1.0,
+        gt=0,
+        description="Share of the remaining resources, relative to the other services",
+    )
+    cpus: float | None = Field(
+        default=None,
+        gt=0,
+        description="Explicit CPU limit of the service. If None, it is derived from the weight",
+    )
+    memory_mb: int | None = Field(
+        default=None,
+        gt=0,
+        description="Explicit memory limit (in MB) of the service. If None, it is derived from the weight",
+    )
+    cpuset: str | None = Field(
+        default=None,
+        description="CPUs the service is pinned to (e.g. 0-3 or 0,2)",
+    )
+    model_config = ConfigDict(
+        extra="forbid",
+    )
+
+
+class ResourcePlanConfig(BaseModel):
+    """
+    Plan of the CPU and memory limits of the deployment.
+
+    The resources of the host are split between all Docker Compose
+    services, so that no single workload can starve the others.
+    """
+
+    enabled: bool = Field(
+        default=False,
+        description="Whether to write resource limits and reservations into docker-compose.yaml",
+    )
+    cpus: float | None = Field(
+        default=None,
+        gt=0,
+        description="CPUs of the host available to the deployment. If None, the CPUs of the machine the deployment is built on",
+    )
+    memory_mb: int | None = Field(
+        default=None,
+        gt=0,
+        description="Memory (in MB) of the host available to the deployment. If None, the memory of the machine the deployment is built on",
+    )
+    reservation_ratio: float = Field(
+        default=0.5,
+        ge=0,
+        le=1,
+        description="Fraction of the limits that is reserved for every service",
+    )
+    services: Dict[str, ServiceResourceConfig] = Field(
+        default_factory=dict,
+        description="Weights and explicit limits per Docker Compose service. Services that are not listed get a weight of 1",
+    )
+    model_config = ConfigDict(
+        extra="forbid",
+    )
+
+
+class ProcessModelConfig(BaseModel):
+    """
+    Process model of a service.
+
+    Controls how many processes serve requests in a service container,
+    and whether background jobs run in dedicated worker containers, so
+    that they don't compete with request serving.
+
+    The web containers keep the command of the image, the ASGI server
+    (uvicorn or gunicorn) reads its number of workers from
+    WEB_CONCURRENCY, and asgiref sizes the thread pool that runs the
+    synchronous Django code from ASGI_THREADS. The worker containers run
+    the worker_command, as the images don't share a common one.
+    """
+
+    cpus: int | None = Field(
+        default=None,
+        ge=1,
+        description="Number of CPUs available to the service. If None, the CPUs of the machine the deployment is built on",
+    )
+    web_workers: int | None = Field(
+        default=None,
+        ge=1,
+        description="Number of ASGI worker processes per container (WEB_CONCURRENCY). If None, one per CPU, split between the replicas of the service",
+    )
+    threads: int | None = Field(
+        default=None,
+        ge=1,
+        description="Number of threads per ASGI worker process that run synchronous code (ASGI_THREADS). If None, the default of asgiref is used",
+    )
+    worker_replicas: int = Field(
+        default=0,
+        ge=0,
+        description="Number of dedicated containers running the background queue of the service. If 0, background jobs run in the web containers",
+    )
+    worker_concurrency: int | None = Field(
+        default=None,
+        ge=1,
+        description="Number of background jobs a worker container runs concurrently, replaces {concurrency} in the worker_command. If None, one per CPU",
+    )
+    worker_command: str | None = Field(
+        default=None,
+        description="Command that runs the background queue of the service (e.g. 'python manage.py rqworker --num-workers {concurrency}'). Required if worker_replicas is greater than 0",
+    )
+    model_config = ConfigDict(
+        extra="forbid",
+    )
+
+    @model_validator(mode="after")
+    def check_worker_command(self) -> "ProcessModelConfig":
+        if self.worker_replicas > 0 and not self.worker_command:
+            raise ValueError(
+                "worker_command is required to run dedicated background workers"
+            )
+        return self
+
+    def get_cpus(self) -> int:
+        """Get the number of CPUs available to the service."""
+        return self.cpus or get_cpu_count()
+
+    def get_web_workers(self, replicas: int = 1, cpus: float | None = None) -> int:
+        """
+        Get the number of ASGI worker processes per container.
+
+        Args:
+            replicas: Number of containers the CPUs are shared between
+            cpus: CPU limit of a container, overrides the share of the CPUs
+        """
+        if self.web_workers is not None:
+            return self.web_workers
+        if cpus is not None:
+            return max(int(cpus), 1)
+        return max(self.get_cpus() // max(replicas, 1), 1)
+
+    def build_web_environment(
+        self, replicas: int = 1, cpus: float | None = None
+    ) -> dict[str, str]:
+        """Build the environment of the web containers, read by the ASGI server and asgiref."""
+        environment = {"WEB_CONCURRENCY": str(self.get_web_workers(replicas, cpus))}
+        if self.threads is not None:
+            environment["ASGI_THREADS"] = str(self.threads)
+        return environment
+
+    def build_worker_command(self, cpus: float | None = None) -> str:
+        """
+        Build the command of the worker containers.
+
+        Args:
+            cpus: CPU limit of a worker container, overrides the CPUs of the service
+        """
+        if self.worker_command is None:
+            raise ValueError("No worker_command is configured")
+        concurrency = self.worker_concurrency
+        if concurrency is None:
+            concurrency = self.get_cpus() if cpus is None else max(int(cpus), 1)
+        return self.worker_command.replace("{concurrency}", str(concurrency))
+
+
 class BaseServiceConfig(BaseModel):
     internal_port: int = Field(
         default=80,
@@ -280,6 +522,19 @@ class BaseServiceConfig(BaseModel):
         default_factory=generate_django_secret_key,
         description="Secret key for the service. This is used to sign cookies and other sensitive data. It should be kept secret and not shared with anyone",
     )
+    replicas: int = Field(
+        default=1,
+        ge=1,
+        description="Number of containers running the service. If more than one, the gateway balances the requests between them",
+    )
+    process_model: ProcessModelConfig | None = Field(
+        default=None,
+        description="Process model of the service (web workers, threads and dedicated background workers). If None, the defaults of the service image are used",
+    )
+    config_format: Literal["yaml", "json"] = Field(
+        default="yaml",
+        description="Format of the generated config file of the service. JSON is a lot faster to generate and parse, and is still a valid YAML document, so only use it for services whose config loader accepts it",
+    )
 
     def build_run_command(self) -> str:
         """
@@ -323,6 +578,9 @@ class BaseService(Protocol):
     debug: bool
     allowed_hosts: list[str]
     secret_key: str
+    config_format: Literal["yaml", "json"]
+    replicas: int
+    process_model: ProcessModelConfig | None
     internal_port: int = Field(
         default=80,
     )
@@ -403,9 +661,13 @@ class LokConfig(BaseServiceConfig):
         default_factory=LocalRedisConfig,
         description="Redis configuration for the service",
     )
-    auth_key_pair: KeyPair = Field(
-        default_factory=build_key_pair,
-        description="Key pair for the Arkitekt server, used for secure communication",
+    auth_key_pair: KeyPair | None = Field(
+        default=None,
+        description="Key pair for the Arkitekt server, used for secure communication. If not provided, it will be generated by the active key provider once it is needed",
+    )
+    seed_file: bool = Field(
+        default=False,
+        description="Write the users, organizations, roles, instances and redeem tokens to a separate JSONL seed file instead of the config file. Recommended for large user lists",
     )
 
     def get_buckets(self) -> Dict[str, BucketConfig]:
@@ -415,6 +677,22 @@ class LokConfig(BaseServiceConfig):
         """
         return {"media": self.media_bucket}
 
+    def get_auth_key_pair(self) -> KeyPair:
+        """
+        Get the key pair for the Lok service.
+        The key pair is only generated the first time it is requested, and then kept on the configuration.
+        """
+        if self.auth_key_pair is None:
+            from .keys import get_key_provider
+
+            self.auth_key_pair = get_key_provider().get_key_pair()
+        return self.auth_key_pair
+
+    @field_serializer("auth_key_pair")
+    def serialize_auth_key_pair(self, auth_key_pair: KeyPair | None) -> dict[str, str]:
+        # Serializing the configuration needs a key pair, so it is generated here at the latest
+        return self.get_auth_key_pair().model_dump()
+
 
 class MinioConfig(BaseModel):
     host: str = Field(default="minio", description="Host for the MinIO service")
@@ -708,6 +986,46 @@ class KraphConfig(BaseServiceConfig):
         return {"media": self.media_bucket}
 
 
+class PostgresTuningConfig(BaseModel):
+    """
+    Inputs for the performance settings of the local PostgreSQL database.
+
+    The settings (shared_buffers, work_mem, ...) are derived from the
+    resources of the host and the expected workload, similar to pgtune.
+    """
+
+    enabled: bool = Field(
+        default=False,
+        description="Whether to tune PostgreSQL. If False, PostgreSQL runs with its stock settings",
+    )
+    memory_mb: int = Field(
+        default=4096,
+        ge=1,
+        description="Memory (in MB) PostgreSQL can use on the host",
+    )
+    cpus: int = Field(
+        default=4,
+        ge=1,
+        description="Number of CPUs PostgreSQL can use on the host",
+    )
+    profile: Literal["oltp", "mixed"] = Field(
+        default="mixed",
+        description="Expected workload. oltp for many small transactions, mixed for a mix of transactions and larger analytical queries",
+    )
+    storage: Literal["ssd", "hdd"] = Field(
+        default="ssd",
+        description="Kind of storage the database volume is on",
+    )
+    max_connections: int | None = Field(
+        default=None,
+        ge=1,
+        description="Maximum number of connections. If None, it is derived from the workload profile",
+    )
+    model_config = ConfigDict(
+        extra="forbid",
+    )
+
+
 class DatenConfig(BaseServiceConfig):
     enabled: bool = Field(
         default=True, description="Whether the Daten service is enabled"
@@ -734,6 +1052,79 @@ class DatenConfig(BaseServiceConfig):
         description="Mount point for PostgreSQL database storage in the Daten service. If None, a volume will be created.",
     )
     volume_name: str = "db_data"
+    tuning: PostgresTuningConfig = Field(
+        default_factory=PostgresTuningConfig,
+        description="Performance tuning of the PostgreSQL server",
+    )
+
+
+class PoolerDatabaseConfig(BaseModel):
+    """
+    Per-database overrides of the connection pooler settings.
+
+    Settings that are None fall back to the pooler defaults.
+    """
+
+    pool_mode: Literal["session", "transaction"] | None = Field(
+        default=None, description="Pool mode for this database"
+    )
+    pool_size: int | None = Field(
+        default=None,
+        description="Maximum number of server connections per user for this database",
+    )
+    max_db_connections: int | None = Field(
+        default=None,
+        description="Maximum number of server connections for this database (0 means unlimited)",
+    )
+    model_config = ConfigDict(
+        extra="forbid",
+    )
+
+
+class PoolerConfig(BaseServiceConfig):
+    enabled: bool = Field(
+        default=False,
+        description="Whether to put a PgBouncer connection pooler in front of the local database. If True, all services with a local database connect through the pooler",
+    )
+    host: str = Field(default="pooler", description="Host for the pooler service")
+    image: str = Field(
+        default="edoburu/pgbouncer:latest",
+        description="Docker image for the pooler service. This is used to run PgBouncer",
+    )
+    internal_port: int = Field(
+        default=6432,
+        description="Internal port for the pooler service. Services connect to the database through this port",
+    )
+    pool_mode: Literal["session", "transaction"] = Field(
+        default="session",
+        description="When a server connection is released back to the pool. Transaction pooling allows many more clients per server connection, but breaks session state (e.g. server side cursors, which need DISABLE_SERVER_SIDE_CURSORS in Django)",
+    )
+    default_pool_size: int | None = Field(
+        default=None,
+        ge=1,
+        description="Maximum number of server connections per database and user. If None, the connections of the local database (max_connections) are split evenly between the databases",
+    )
+    min_pool_size: int = Field(
+        default=0,
+        description="Number of server connections that are kept open per database and user",
+    )
+    reserve_pool_size: int = Field(
+        default=5,
+        ge=0,
+        description="Additional server connections that are allowed when a pool is exhausted",
+    )
+    max_client_conn: int = Field(
+        default=1000,
+        description="Maximum number of client connections to the pooler",
+    )
+    max_db_connections: int = Field(
+        default=0,
+        description="Maximum number of server connections per database (0 means unlimited)",
+    )
+    databases: Dict[str, PoolerDatabaseConfig] = Field(
+        default_factory=dict,
+        description="Overrides of the pool settings per local database, keyed by the database name",
+    )
 
 
 class DeployerConfig(BaseServiceConfig):
@@ -772,6 +1163,77 @@ class RedisServiceConfig(BaseServiceConfig):
     enabled: bool = Field(
         default=True, description="Whether the Redis service is enabled"
     )
+    tuning: RedisTuningConfig = Field(
+        default_factory=RedisTuningConfig,
+        description="Sizing, persistence and eviction settings of the Redis service",
+    )
+
+
+Encoding = Literal["zstd", "gzip"]
+
+
+class GatewayRouteConfig(BaseModel):
+    """
+    Per-service overrides of the gateway performance options.
+
+    Settings that are None fall back to the gateway defaults.
+    """
+
+    encode: list[Encoding] | None = Field(
+        default=None,
+        description="Encodings the responses of the service are compressed with. An empty list disables compression",
+    )
+    static_cache_max_age: int | None = Field(
+        default=None,
+        ge=0,
+        description="max-age (in seconds) of the Cache-Control header of the static assets of the service. 0 disables the header",
+    )
+    model_config = ConfigDict(
+        extra="forbid",
+    )
+
+
+class BucketTransferConfig(BaseModel):
+    """
+    Transfer profile of the gateway routes to the local buckets.
+
+    Tunes the proxying of (multi-GB) object transfers, and can serve them
+    on a separate listener, so bulk transfers don't compete with API
+    requests in the same handler chain.
+    """
+
+    enabled: bool = Field(
+        default=False,
+        description="Whether to use the transfer profile for the bucket routes",
+    )
+    read_buffer: str = Field(
+        default="1MiB",
+        description="Size of the read buffer of the connections to MinIO",
+    )
+    write_buffer: str = Field(
+        default="1MiB",
+        description="Size of the write buffer of the connections to MinIO",
+    )
+    port: int | None = Field(
+        default=None,
+        description="Port of a separate gateway listener serving only the buckets. It is exposed with the same port",
+    )
+    domain: str | None = Field(
+        default=None,
+        description="Domain of a separate gateway site serving only the buckets (e.g. data.example.org)",
+    )
+    model_config = ConfigDict(
+        extra="forbid",
+    )
+
+    def get_listener_address(self) -> str | None:
+        """Get the Caddy site address of the separate listener (None if there is none)."""
+        if self.port is None and self.domain is None:
+            return None
+        address = self.domain or "http://"
+        if self.port is not None:
+            address += f":{self.port}"
+        return address
 
 
 class GatewayConfig(BaseServiceConfig):
@@ -807,6 +1269,37 @@ class GatewayConfig(BaseServiceConfig):
         default=443,
         description="Port for the HTTPS server. This is used to expose the HTTPS server to the outside world",
     )
+    lb_policy: Literal[
+        "least_conn", "round_robin", "random", "first", "ip_hash"
+    ] = Field(
+        default="least_conn",
+        description="Policy for balancing requests between the replicas of a service",
+    )
+    lb_try_duration: str = Field(
+        default="5s",
+        description="How long the gateway retries to find an available replica before failing a request",
+    )
+    health_interval: str = Field(
+        default="10s",
+        description="Interval of the active health checks of the replicas of a service",
+    )
+    encode: list[Encoding] = Field(
+        default_factory=list,
+        description="Encodings the responses of the services (e.g. GraphQL JSON) are compressed with, in order of preference. Caddy only compresses compressible content types",
+    )
+    static_cache_max_age: int = Field(
+        default=0,
+        ge=0,
+        description="max-age (in seconds) of the Cache-Control header of the static assets of the services (/<service>/static/*). 0 leaves the headers of the services untouched",
+    )
+    bucket_transfer: BucketTransferConfig = Field(
+        default_factory=BucketTransferConfig,
+        description="Transfer profile of the bucket routes, for large uploads and downloads",
+    )
+    routes: Dict[str, GatewayRouteConfig] = Field(
+        default_factory=dict,
+        description="Overrides of the performance options per service, keyed by the host of the service",
+    )
 
     def get_gateway_path(self, service: BaseService) -> str:
         """
@@ -815,6 +1308,20 @@ class GatewayConfig(BaseServiceConfig):
         """
         return service.host
 
+    def get_encode(self, service: BaseService) -> list[Encoding]:
+        """Get the encodings the responses of a service are compressed with."""
+        route = self.routes.get(service.host)
+        if route is not None and route.encode is not None:
+            return route.encode
+        return self.encode
+
+    def get_static_cache_max_age(self, service: BaseService) -> int:
+        """Get the max-age of the static assets of a service (0 if they are not cached)."""
+        route = self.routes.get(service.host)
+        if route is not None and route.static_cache_max_age is not None:
+            return route.static_cache_max_age
+        return self.static_cache_max_age
+
 
 class Membership(BaseModel):
     """
@@ -890,6 +1397,10 @@ class Organization(BaseModel):
         default_factory=generate_name,
         description="Identifier for the organization. This is used to uniquely identify the organization",
     )
+    bot_password: str | None = Field(
+        default=None,
+        description="Password of the bot user of the organization. If not provided, it is derived from the secret key of the Lok service",
+    )
     model_config = ConfigDict(
         extra="forbid",
     )
@@ -948,6 +1459,47 @@ class EmailConfig(BaseModel):
     )
 
 
+# Fields of the configuration that are indexed for lookups
+INDEXED_FIELDS = {"users", "organizations", "roles"}
+
+
+class ConfigIndex:
+    """
+    Lookup tables of the users, organizations and roles of a configuration.
+
+    The index only stays valid as long as the indexed entries are not
+    changed, the configuration drops it when one of the lists is replaced
+    (see ArkitektServerConfig.get_index).
+
+    Attributes:
+        users: The users by username
+        organizations: The organizations by identifier
+        roles: The roles by identifier
+        duplicates: Usernames and identifiers that appear more than once
+    """
+
+    def __init__(
+        self, users: list[User], organizations: list[Organization], roles: list[Role]
+    ):
+        self.users: dict[str, User] = {}
+        self.organizations: dict[str, Organization] = {}
+        self.roles: dict[str, Role] = {}
+        self.duplicates: list[str] = []
+
+        for kind, table, items, attribute in (
+            ("user", self.users, users, "username"),
+            ("organization", self.organizations, organizations, "identifier"),
+            ("role", self.roles, roles, "identifier"),
+        ):
+            for item in items:
+                key = getattr(item, attribute)
+                # The first entry wins, like in a linear search
+                if key in table:
+                    self.duplicates.append(f"Duplicate {kind} {key}")
+                else:
+                    table[key] = item
+
+
 class ArkitektServerConfig(BaseModel):
     model_config = ConfigDict(
         extra="forbid",
@@ -961,6 +1513,18 @@ class ArkitektServerConfig(BaseModel):
         default_factory=generate_name,
         description="Internal network for the Arkitekt server. This is used to connect the services together",
     )
+    healthchecks: bool = Field(
+        default=True,
+        description="Whether to add healthchecks to the services, and start services only once their dependencies are healthy",
+    )
+    resources: ResourcePlanConfig = Field(
+        default_factory=ResourcePlanConfig,
+        description="CPU and memory limits of the services",
+    )
+    replica_mode: Literal["deploy", "numbered"] = Field(
+        default="deploy",
+        description="How services with more than one replica are deployed. deploy uses deploy.replicas of Docker Compose, numbered creates a separate service per replica (for runtimes that don't support deploy.replicas)",
+    )
     email: EmailConfig | None = Field(
         default=None,
         description="Email configuration for the Arkitekt server. This is used to send emails from the Arkitekt server",
@@ -1015,6 +1579,11 @@ class ArkitektServerConfig(BaseModel):
         description="Configuration for the Daten service",
     )
 
+    pooler: PoolerConfig = Field(
+        default_factory=PoolerConfig,
+        description="Configuration for the PgBouncer connection pooler in front of the local database",
+    )
+
     minio: MinioConfig = Field(
         default_factory=MinioConfig,
         description="Configuration for the MinIO service",
@@ -1055,3 +1624,102 @@ class ArkitektServerConfig(BaseModel):
         default_factory=KraphConfig,
         description="Configuration for the Kraph service",
     )
+
+    _index: ConfigIndex | None = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in INDEXED_FIELDS:
+            self._index = None
+        super().__setattr__(name, value)
+
+    def get_index(self) -> ConfigIndex:
+        """
+        Get the lookup index of the users, organizations and roles.
+
+        The index is built on first use, and dropped when one of the lists
+        is replaced (e.g. config.users = [...] or config.users += [...]) or
+        changed with add_user or remove_user. Other in-place changes of the
+        lists or of the usernames and identifiers of their entries (e.g.
+        config.users.append(...)) must be followed by invalidate_index.
+
+        Returns:
+            The index
+        """
+        if self._index is None:
+            self._index = ConfigIndex(self.users, self.organizations, self.roles)
+        return self._index
+
+    def invalidate_index(self) -> None:
+        """Drop the lookup index, it is rebuilt on the next lookup."""
+        self._index = None
+
+    def get_user(self, username: str) -> User | None:
+        """Get a user by username."""
+        return self.get_index().users.get(username)
+
+    def get_organization(self, identifier: str) -> Organization | None:
+        """Get an organization by identifier."""
+        return self.get_index().organizations.get(identifier)
+
+    def get_role(self, identifier: str) -> Role | None:
+        """Get a role by identifier."""
+        return self.get_index().roles.get(identifier)
+
+    def add_user(self, user: User) -> None:
+        """
+        Add a user to the configuration.
+
+        Args:
+            user: The user to add
+        """
+        self.users.append(user)
+        self.invalidate_index()
+
+    def remove_user(self, username: str) -> User | None:
+        """
+        Remove a user from the configuration.
+
+        Args:
+            username: The username of the user
+
+        Returns:
+            The removed user, or None if there is no user with that username
+        """
+        user = self.get_user(username)
+        if user is not None:
+            self.users = [u for u in self.users if u is not user]
+        return user
+
+    def validate_references(self) -> list[str]:
+        """
+        Check that users and roles only reference organizations that exist.
+
+        Checks the organization of every membership, the active organization
+        of every user with memberships and the organization of every role,
+        and reports duplicate usernames and identifiers.
+
+        Returns:
+            A description of every broken reference, empty if all are valid
+        """
+        index = self.get_index()
+        problems = list(index.duplicates)
+
+        for user in self.users:
+            for membership in user.memberships:
+                if membership.organization not in index.organizations:
+                    problems.append(
+                        f"User {user.username} is a member of the unknown organization {membership.organization}"
+                    )
+            # Users without memberships keep the default active organization
+            if user.memberships and user.active_organization not in index.organizations:
+                problems.append(
+                    f"User {user.username} has the unknown active organization {user.active_organization}"
+                )
+
+        for role in self.roles:
+            if role.organization not in index.organizations:
+                problems.append(
+                    f"Role {role.identifier} belongs to the unknown organization {role.organization}"
+                )
+
+        return problems
@@ -1,27 +1,55 @@
+import copy
 import difflib
+import hashlib
+import hmac
+import os
 import secrets
+import shutil
 import tempfile
+import time
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterable, Iterator
 
 from pydantic import BaseModel
-import typer
 from .config import (
     ArkitektServerConfig,
     BaseService,
     LocalDBConfig,
     Membership,
+    Organization,
     RemoteDBConfig,
     GlobalAdminConfig,
     SpecificAdminConfig,
     LocalRedisConfig,
     LocalBucketConfig,
     LocalAuthConfig,
+    RedisTuningConfig,
     RemoteRedisConfig,
     User,
-    generate_alpha_numeric_string,
 )
-import yaml
+from .cache import CACHE_DIR
+from .resources import ResourcePlan, apply_resource_plan, plan_resources
+from .tuning import build_redis_command, derive_postgres_tuning, plan_pool_sizes
+from .serialization import (
+    ArtifactFormat,
+    LazySequence,
+    dump_jsonl,
+    dump_yaml,
+    iterate_config,
+    load_yaml,
+)
+from .build import (
+    ArtifactRecord,
+    ArtifactTiming,
+    BuildManifest,
+    hash_input,
+    load_manifest,
+    load_restart_plan,
+    plan_restarts,
+    save_manifest,
+    save_restart_plan,
+)
 
 
 def iterate_service(config: ArkitektServerConfig) -> list[BaseService]:
@@ -72,12 +100,13 @@ def create_basic_config_values(
     """
     db: dict[str, str | int] = {}
     if isinstance(service.db_config, LocalDBConfig):
+        pooled = uses_pooler(config)
         db = {
             "db_name": service.db_config.db,
             "engine": "django.db.backends.postgresql",
-            "host": "db",
+            "host": config.pooler.host if pooled else "db",
             "password": config.db.postgres_password,
-            "port": 5432,
+            "port": config.pooler.internal_port if pooled else 5432,
             "username": config.db.postgres_user,
         }
     elif isinstance(service.db_config, RemoteDBConfig):
@@ -115,7 +144,7 @@ def create_basic_config_values(
     redis: dict[str, str | int] | None = None
     if isinstance(service.redis_config, LocalRedisConfig):
         redis = {
-            "host": config.local_redis.host,
+            "host": get_redis_host(config, service),
             "port": config.local_redis.internal_port,
         }
     elif isinstance(service.redis_config, RemoteRedisConfig):
@@ -140,8 +169,8 @@ def create_basic_config_values(
         },
         "lok": {
             "issuer": config.lok.issuer,
-            "key_type": config.lok.auth_key_pair.key_type,
-            "public_key": config.lok.auth_key_pair.public_key,
+            "key_type": config.lok.get_auth_key_pair().key_type,
+            "public_key": config.lok.get_auth_key_pair().public_key,
         },
         "force_script_name": script_name,
         "redis": redis,
@@ -167,10 +196,31 @@ def create_config(
     service_dir.mkdir(parents=True, exist_ok=True)
 
     (service_dir / f"{service_name}.yaml").write_text(
-        yaml.dump(config_values, default_flow_style=False)
+        dump_yaml(config_values)
     )
 
 
+def get_service_dependencies(
+    config: ArkitektServerConfig, service: BaseService
+) -> list[str]:
+    """
+    Get the Docker Compose services a service needs to be running.
+
+    Args:
+        config: The main Arkitekt server configuration
+        service: The service to get the dependencies for
+
+    Returns:
+        The names of the Docker Compose services the service depends on
+    """
+    depends_on = ["redis", "db", "minio"]
+    if isinstance(service.db_config, LocalDBConfig) and uses_pooler(config):
+        depends_on.append(config.pooler.host)
+    if get_redis_host(config, service) != config.local_redis.host:
+        depends_on.append(get_redis_host(config, service))
+    return depends_on
+
+
 def build_default_service(
     config: ArkitektServerConfig, service: BaseService
 ) -> dict[str, Any]:
@@ -190,7 +240,7 @@ def build_default_service(
     return {
         "image": service.image,
         "command": service.build_run_command(),
-        "depends_on": ["redis", "db", "minio"],
+        "depends_on": get_service_dependencies(config, service),
         "stop_grace_period": "2s",
         "volumes": [f"./configs/{service.host}.yaml:/workspace/config.yaml"],
     }
@@ -243,6 +293,92 @@ def parse_local_db_requests(config: ArkitektServerConfig) -> list[LocalDBConfig]
     return db_names
 
 
+def uses_pooler(config: ArkitektServerConfig) -> bool:
+    """
+    Check if the services connect to the local database through the pooler.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        True if the pooler is enabled and the local database is deployed
+    """
+    return config.pooler.enabled and len(parse_local_db_requests(config)) > 1
+
+
+def create_pgbouncer_config(config: ArkitektServerConfig) -> str:
+    """
+    Create the PgBouncer configuration of the connection pooler.
+
+    Every local database gets an entry in the [databases] section, with
+    the per-database overrides of the pooler configuration applied. The
+    pools are sized to fit into the connections of the local database.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        The content of the pgbouncer.ini file
+
+    Raises:
+        PoolSizeError: If the pools can open more connections than the local database allows
+    """
+    pooler = config.pooler
+    lines = ["[databases]"]
+
+    db_names = list(dict.fromkeys(request.db for request in parse_local_db_requests(config)))
+    sizes = plan_pool_sizes(pooler, config.db.tuning, db_names)
+    for db_name in db_names:
+        entry = f"{db_name} = host=db port=5432 dbname={db_name}"
+        override = pooler.databases.get(db_name)
+        if override:
+            if override.pool_mode is not None:
+                entry += f" pool_mode={override.pool_mode}"
+            if override.pool_size is not None:
+                entry += f" pool_size={override.pool_size}"
+            if override.max_db_connections is not None:
+                entry += f" max_db_connections={override.max_db_connections}"
+        lines.append(entry)
+
+    lines += [
+        "",
+        "[pgbouncer]",
+        "listen_addr = 0.0.0.0",
+        f"listen_port = {pooler.internal_port}",
+        "auth_type = scram-sha-256",
+        "auth_file = /etc/pgbouncer/userlist.txt",
+        f"admin_users = {config.db.postgres_user}",
+        f"pool_mode = {pooler.pool_mode}",
+        f"default_pool_size = {sizes.default_pool_size}",
+        f"min_pool_size = {pooler.min_pool_size}",
+        f"reserve_pool_size = {pooler.reserve_pool_size}",
+        f"max_client_conn = {pooler.max_client_conn}",
+        f"max_db_connections = {pooler.max_db_connections}",
+        # All databases share the user, so this caps the connections to PostgreSQL
+        f"max_user_connections = {sizes.max_user_connections}",
+        # Sent by psycopg/Django on connect, PgBouncer would otherwise reject them
+        "ignore_startup_parameters = extra_float_digits,options",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def create_pgbouncer_userlist(config: ArkitektServerConfig) -> str:
+    """
+    Create the PgBouncer auth file with the credentials of the local database.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        The content of the userlist.txt file
+    """
+
+    def quote(value: str) -> str:
+        return '"' + value.replace('"', '""') + '"'
+
+    return f"{quote(config.db.postgres_user)} {quote(config.db.postgres_password)}\n"
+
+
 def parse_local_auth_requests(config: ArkitektServerConfig) -> list[LocalDBConfig]:
     """
     Parse and collect all local authentication configuration requests.
@@ -284,6 +420,42 @@ def parse_local_redis_request(config: ArkitektServerConfig) -> list[LocalRedisCo
     return redis_dbs
 
 
+def get_redis_host(config: ArkitektServerConfig, service: BaseService) -> str:
+    """
+    Get the host of the local Redis instance of a service.
+
+    Args:
+        config: The main Arkitekt server configuration
+        service: A service with a local Redis configuration
+
+    Returns:
+        The host of the dedicated instance of the service, or of the shared local Redis
+    """
+    redis_config = service.redis_config
+    if isinstance(redis_config, LocalRedisConfig) and redis_config.dedicated:
+        return f"{service.host}-{config.local_redis.host}"
+    return config.local_redis.host
+
+
+def build_redis_service(
+    config: ArkitektServerConfig, tuning: RedisTuningConfig
+) -> dict[str, Any]:
+    """
+    Build the Docker Compose service definition of a local Redis instance.
+
+    Args:
+        config: The main Arkitekt server configuration
+        tuning: The settings of the instance
+
+    Returns:
+        A dictionary representing a Docker Compose service definition
+    """
+    definition: dict[str, Any] = {"image": config.local_redis.image}
+    if tuning.enabled:
+        definition["command"] = build_redis_command(tuning)
+    return definition
+
+
 def parse_local_bucket_configs(config: ArkitektServerConfig) -> list[LocalBucketConfig]:
     """
     Parse and collect all local bucket configuration requests.
@@ -308,7 +480,143 @@ def parse_local_bucket_configs(config: ArkitektServerConfig) -> list[LocalBucket
     return bucket_names
 
 
-def create_caddyfilepath(service: BaseService) -> str:
+def get_replica_hosts(config: ArkitektServerConfig, service: BaseService) -> list[str]:
+    """
+    Get the Docker Compose service names of the replicas of a service.
+
+    In the numbered replica mode, every replica is a separate service. The
+    first one keeps the name of the service, so that other services can
+    still reach it by its host.
+
+    Args:
+        config: The main Arkitekt server configuration
+        service: The service to get the replica names for
+
+    Returns:
+        The names of the Docker Compose services running the service
+    """
+    if service.replicas <= 1 or config.replica_mode == "deploy":
+        return [service.host]
+    return [service.host] + [
+        f"{service.host}-{i}" for i in range(2, service.replicas + 1)
+    ]
+
+
+def add_service_replicas(
+    config: ArkitektServerConfig,
+    services: dict[str, Any],
+    service: BaseService,
+    definition: dict[str, Any],
+) -> None:
+    """
+    Add the Docker Compose service definitions for all replicas of a service.
+
+    Args:
+        config: The main Arkitekt server configuration
+        services: The Docker Compose services to add the definitions to
+        service: The service the definition belongs to
+        definition: The Docker Compose definition of a single replica
+    """
+    if service.replicas > 1 and config.replica_mode == "deploy":
+        definition["deploy"] = {
+            **definition.get("deploy", {}),
+            "replicas": service.replicas,
+        }
+
+    for host in get_replica_hosts(config, service):
+        # Copies, so that the YAML output has no anchors and aliases
+        services[host] = copy.deepcopy(definition)
+
+
+def add_service_processes(
+    config: ArkitektServerConfig,
+    services: dict[str, Any],
+    service: BaseService,
+    definition: dict[str, Any],
+) -> None:
+    """
+    Add the Docker Compose service definitions of a service and its workers.
+
+    The web containers get the worker and thread counts of the process
+    model. If the process model asks for dedicated background workers, they
+    run the same image and share the config file of the service.
+
+    Args:
+        config: The main Arkitekt server configuration
+        services: The Docker Compose services to add the definitions to
+        service: The service the definition belongs to
+        definition: The Docker Compose definition of a single web container
+    """
+    process_model = service.process_model
+    worker: dict[str, Any] | None = None
+
+    if process_model is not None:
+        environment = definition.get("environment", {})
+        if process_model.worker_replicas > 0:
+            worker = copy.deepcopy(definition)
+            worker["command"] = process_model.build_worker_command()
+            if process_model.worker_replicas > 1:
+                worker["deploy"] = {
+                    **worker.get("deploy", {}),
+                    "replicas": process_model.worker_replicas,
+                }
+
+        definition["environment"] = {
+            **environment,
+            **process_model.build_web_environment(service.replicas),
+        }
+
+    add_service_replicas(config, services, service, definition)
+    if worker is not None:
+        services[f"{service.host}-worker"] = worker
+
+
+def create_reverse_proxy(config: ArkitektServerConfig, service: BaseService) -> str:
+    """
+    Create the Caddy reverse_proxy directive for a service.
+
+    A service with more than one replica gets an upstream per replica, that
+    are load balanced and health checked. With deploy.replicas, the replicas
+    share the name of the service, so their addresses are resolved
+    dynamically (Caddy only health checks these passively).
+
+    Args:
+        config: The main Arkitekt server configuration
+        service: The service to proxy to
+
+    Returns:
+        The reverse_proxy directive, indented for a handle block
+    """
+    if service.replicas <= 1:
+        return f"\t\treverse_proxy {service.host}:{service.internal_port}\n"
+
+    gateway = config.gateway
+    if config.replica_mode == "deploy":
+        directive = "\t\treverse_proxy {\n"
+        directive += "\t\t\tdynamic a {\n"
+        directive += f"\t\t\t\tname {service.host}\n"
+        directive += f"\t\t\t\tport {service.internal_port}\n"
+        directive += "\t\t\t\trefresh 5s\n"
+        directive += "\t\t\t}\n"
+        directive += "\t\t\tfail_duration 30s\n"
+    else:
+        upstreams = " ".join(
+            f"{host}:{service.internal_port}"
+            for host in get_replica_hosts(config, service)
+        )
+        directive = f"\t\treverse_proxy {upstreams} {{\n"
+        directive += f"\t\t\thealth_uri /{service.host}/ht\n"
+        directive += f"\t\t\thealth_interval {gateway.health_interval}\n"
+
+    directive += f"\t\t\tlb_policy {gateway.lb_policy}\n"
+    directive += f"\t\t\tlb_try_duration {gateway.lb_try_duration}\n"
+    directive += "\t\t}\n"
+    return directive
+
+
+def create_caddyfilepath(
+    service: BaseService, config: ArkitektServerConfig | None = None
+) -> str:
     """
     Create a Caddyfile path matcher and handler for a single service.
 
@@ -317,17 +625,70 @@ def create_caddyfilepath(service: BaseService) -> str:
 
     Args:
         service: The service to create routing configuration for
+        config: The main Arkitekt server configuration, needed to balance between replicas
 
     Returns:
         A string containing the Caddy configuration block for this service
     """
     caddyfile = f"\t@{service.host} path /{service.host}*\n"
     caddyfile += "\thandle @" + service.host + " { \n"
-    caddyfile += f"\t\treverse_proxy {service.host}:{service.internal_port}\n"
+    if config is None:
+        caddyfile += f"\t\treverse_proxy {service.host}:{service.internal_port}\n"
+    else:
+        encode = config.gateway.get_encode(service)
+        if encode:
+            caddyfile += f"\t\tencode {' '.join(encode)}\n"
+
+        max_age = config.gateway.get_static_cache_max_age(service)
+        if max_age:
+            caddyfile += f"\t\t@{service.host}_static path /{service.host}/static/*\n"
+            # Deferred (>), so the header of the upstream doesn't override ours
+            caddyfile += (
+                f"\t\theader @{service.host}_static >Cache-Control "
+                f'"public, max-age={max_age}, immutable"\n'
+            )
+
+        caddyfile += create_reverse_proxy(config, service)
     caddyfile += "\t}\n\n"
     return caddyfile
 
 
+def create_bucket_routes(config: ArkitektServerConfig) -> str:
+    """
+    Create the Caddyfile routes of the local buckets.
+
+    With the bucket transfer profile, responses are streamed to the client
+    without buffering, and the connections to MinIO get large buffers.
+    Caddy does not limit the size of request bodies, so uploads of any
+    size are passed through.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        The handle blocks of all local buckets
+    """
+    transfer = config.gateway.bucket_transfer
+    upstream = f"{config.minio.host}:{config.minio.internal_port}"
+
+    caddyfile = ""
+    for bucket in parse_local_bucket_configs(config):
+        caddyfile += f"\t@{bucket.bucket_name} path /{bucket.bucket_name}*\n"
+        caddyfile += "\thandle @" + bucket.bucket_name + " { \n"
+        if transfer.enabled:
+            caddyfile += f"\t\treverse_proxy {upstream} {{\n"
+            caddyfile += "\t\t\tflush_interval -1\n"
+            caddyfile += "\t\t\ttransport http {\n"
+            caddyfile += f"\t\t\t\tread_buffer {transfer.read_buffer}\n"
+            caddyfile += f"\t\t\t\twrite_buffer {transfer.write_buffer}\n"
+            caddyfile += "\t\t\t}\n"
+            caddyfile += "\t\t}\n"
+        else:
+            caddyfile += f"\t\treverse_proxy {upstream}\n"
+        caddyfile += "\t}\n\n"
+    return caddyfile
+
+
 def create_caddy_file(config: ArkitektServerConfig) -> str:
     """
     Create a Caddyfile for reverse proxy configuration.
@@ -356,23 +717,14 @@ def create_caddy_file(config: ArkitektServerConfig) -> str:
             raise TypeError(
                 f"Expected BaseServiceConfig, got {type(service).__name__} instead."
             )
-        caddyfile += f"\t@{service.host} path /{service.host}*\n"
-        caddyfile += "\thandle @" + service.host + " { \n"
-        caddyfile += f"\t\treverse_proxy {service.host}:{service.internal_port}\n"
-        caddyfile += "\t}\n\n"
+        caddyfile += create_caddyfilepath(service, config)
 
-    for bucket in parse_local_bucket_configs(config):
-        caddyfile += f"\t@{bucket.bucket_name} path /{bucket.bucket_name}*\n"
-        caddyfile += "\thandle @" + bucket.bucket_name + " { \n"
-        caddyfile += (
-            f"\t\treverse_proxy {config.minio.host}:{config.minio.internal_port}\n"
-        )
-        caddyfile += "\t}\n\n"
+    caddyfile += create_bucket_routes(config)
 
     caddyfile += "\t@.well-known path /.well-known/*\n"
     caddyfile += "\thandle @.well-known {\n"
     caddyfile += "\t\trewrite * /lok{uri}\n"
-    caddyfile += f"\t\treverse_proxy {config.lok.host}:{config.lok.internal_port}\n"
+    caddyfile += create_reverse_proxy(config, config.lok)
     caddyfile += "\t}\n\n"
 
     caddyfile += "\t@minio path /minio/*\n"
@@ -381,6 +733,13 @@ def create_caddy_file(config: ArkitektServerConfig) -> str:
     caddyfile += "\t}\n\n"
 
     caddyfile += "}\n"
+
+    address = config.gateway.bucket_transfer.get_listener_address()
+    if address is not None and config.gateway.bucket_transfer.enabled:
+        caddyfile += f"\n{address} {{\n"
+        caddyfile += create_bucket_routes(config)
+        caddyfile += "}\n"
+
     return caddyfile
 
 
@@ -467,219 +826,581 @@ def service_to_instance_config(
     )
 
 
-def write_virtual_config_files(tmpdir: Path, config: ArkitektServerConfig):
+class Artifact(BaseModel):
     """
-    Generate all configuration files needed for deployment.
+    A single generated file of an Arkitekt deployment.
 
-    This is the main function that orchestrates the creation of all necessary
-    configuration files for a complete Arkitekt deployment, including:
+    Artifacts are generated independently of each other, which allows
+    the builder to skip artifacts whose inputs did not change.
 
-    - Docker Compose service definitions
-    - Individual service configuration files (YAML)
-    - Caddyfile for reverse proxy
-    - MinIO initialization configuration
-    - Lok authentication service setup with users, groups, and instances
+    Attributes:
+        name: Unique name of the artifact (e.g. the host of the service)
+        path: Path of the file, relative to the deployment directory
+        content: The content of the file, a dictionary for config files, a list of records for JSONL files or a string for plain text files
+        format: The format the content is serialized in (yaml, json or jsonl)
+    """
 
-    The function analyzes the configuration to determine which services are
-    enabled and what infrastructure components (databases, Redis, storage)
-    are needed, then generates appropriate configurations for each.
+    name: str
+    path: Path
+    content: Any
+    format: ArtifactFormat = "yaml"
+
+
+def iterate_generated_services(
+    config: ArkitektServerConfig,
+) -> list[tuple[BaseService, str]]:
+    """
+    Get the enabled services that run with a default Docker Compose definition.
 
     Args:
-        tmpdir: Temporary directory where configuration files will be written
-        config: The main Arkitekt server configuration to generate files from
+        config: The main Arkitekt server configuration
+
+    Returns:
+        A list of tuples of the service and the identifier it is registered with in Lok
     """
+    all_services: list[tuple[BaseService, str]] = [
+        (config.fluss, "live.arkitekt.fluss"),
+        (config.kabinet, "live.arkitekt.kabinet"),
+        (config.elektro, "live.arkitekt.elektro"),
+        (config.kraph, "live.arkitekt.kraph"),
+        (config.alpaka, "live.arkitekt.alpaka"),
+        (config.mikro, "live.arkitekt.mikro"),
+        (config.rekuest, "live.arkitekt.rekuest"),
+    ]
+    return [(service, name) for service, name in all_services if service.enabled]
 
-    services = {}
 
-    instances: list[InstanceConfig] = []  # Service instances for Lok registration
-    redeem_tokens: list[
-        RedeemTokenConfig
-    ] = []  # Authentication tokens for service access
+def create_deployer_token(config: ArkitektServerConfig, org: Organization) -> str:
+    """
+    Create the redeem token for the deployer of an organization.
 
-    for org in config.organizations:
-        # Add a bot user for each organization
-        config.users.append(
-            User(
-                username=org.bot_name,
-                password=generate_alpha_numeric_string(12),
-                email=None,
-                active_organization=org.name,
-                memberships=[
-                    Membership(
-                        organization=org.identifier,
-                        roles=["bot"],
-                    )
-                ],
-            )
-        )
+    The token is derived from the deployer redeem token, so it stays the same
+    across builds and the Docker Compose file and the Lok config always agree.
 
-    # Configure PostgreSQL database if any services need local databases
-    local_dbs = parse_local_db_requests(config)
-    if len(local_dbs) > 1:
-        services["db"] = {
-            "image": config.db.image,
-            "environment": {
-                "POSTGRES_MULTIPLE_DATABASES": ",".join(
-                    [request.db for request in local_dbs]
-                ),
-                "POSTGRES_PASSWORD": config.db.postgres_password,
-                "POSTGRES_USER": config.db.postgres_user,
-            },
-            "volumes": [
-                f"{config.db.mount or config.db.volume_name}:/var/lib/postgresql/data"
-            ],
-        }
+    Args:
+        config: The main Arkitekt server configuration
+        org: The organization the deployer belongs to
 
-    # Configure Redis service if any services need local Redis
-    local_redis_requests = parse_local_redis_request(config)
-    if len(local_redis_requests) > 1:
-        services[config.local_redis.host] = {
-            "image": config.local_redis.image,
-        }
+    Returns:
+        A 32 character hex token
+    """
+    return hmac.new(
+        config.deployer.redeem_token.encode(),
+        org.identifier.encode(),
+        hashlib.sha256,
+    ).hexdigest()[:32]
 
-    # Configure MinIO object storage if any services need local buckets
-    local_bucket_requests = parse_local_bucket_configs(config)
-    if len(local_bucket_requests) > 1:
-        services[config.minio.host] = {
-            "image": config.minio.image,
-            "command": "server /data",
-            "environment": {
-                "MINIO_ROOT_USER": config.minio.root_user,
-                "MINIO_ROOT_PASSWORD": config.minio.root_password,
-            },
-            "stop_grace_period": "2s",
-            "volumes": [f"{config.minio.mount or config.minio.volume_name}:/data"],
-        }
 
-        # Configuration for MinIO initialization (creates buckets and users)
-        init_config: dict[str, Any] = {
-            "buckets": [{"name": req.bucket_name} for req in local_bucket_requests],
-            "users": [
-                {
-                    "access_key": config.minio.access_key,
-                    "secret_key": config.minio.secret_key,
-                    "policies": ["readwrite"],
-                    "name": "Default User",
-                }
+def create_bot_password(config: ArkitektServerConfig, org: Organization) -> str:
+    """
+    Get the password of the bot user of an organization.
+
+    Unless the organization sets one, the password is derived from the
+    secret key of Lok, so it stays the same across builds.
+
+    Args:
+        config: The main Arkitekt server configuration
+        org: The organization the bot belongs to
+
+    Returns:
+        The password of the bot
+    """
+    if org.bot_password is not None:
+        return org.bot_password
+    return hmac.new(
+        config.lok.secret_key.encode(),
+        f"bot:{org.identifier}".encode(),
+        hashlib.sha256,
+    ).hexdigest()[:32]
+
+
+def create_bot_users(config: ArkitektServerConfig) -> list[User]:
+    """
+    Create the bot users of all organizations.
+
+    The bots are derived from the organizations on every build, they are
+    never added to the users of the configuration.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        A bot user for each organization
+    """
+    return [
+        User(
+            username=org.bot_name,
+            password=create_bot_password(config, org),
+            email=None,
+            active_organization=org.name,
+            memberships=[
+                Membership(
+                    organization=org.identifier,
+                    roles=["bot"],
+                )
             ],
-        }
-        instances.append(
-            service_to_instance_config(config.fluss, "live.arkitekt.fluss")
         )
+        for org in config.organizations
+    ]
 
-        create_config(config.minio.init_container_host, init_config, tmpdir)
-        # MinIO initialization container that sets up buckets and users on startup
-        services[config.minio.init_container_host] = {
-            "image": config.minio.init_container_image,
-            "volumes": [
-                f"./configs/{config.minio.init_container_host}.yaml:/workspace/config.yaml"
-            ],
-            "stop_grace_period": "2s",
-            "environment": {
-                "MINIO_ROOT_USER": config.minio.root_user,
-                "MINIO_ROOT_PASSWORD": config.minio.root_password,
-                "MINIO_HOST": f"http://{config.minio.host}:{config.minio.internal_port}",
-            },
-            "depends_on": {config.minio.host: {"condition": "service_started"}},
-        }
 
-    # Configure deployer service for container orchestration
-    if config.deployer.enabled:
-        for org in config.organizations:
-            token = secrets.token_hex(16)
+def iterate_lok_users(config: ArkitektServerConfig) -> Iterator[User]:
+    """Iterate over the users Lok is seeded with: the configured users and the bots."""
+    yield from config.users
+    yield from create_bot_users(config)
 
-            services[config.deployer.host + org.name] = {
-                "image": config.deployer.image,
-                "volumes": ["/var/run/docker.sock:/var/run/docker.sock"],
-                "command": (
-                    f"arkitekt-next run prod --redeem-token={token} "
-                    f"--url http://{config.gateway.host}:{config.gateway.internal_port}"
-                ),
-                "stop_grace_period": "2s",
-                "deploy": {
-                    "restart_policy": {
-                        "condition": "on-failure",
-                        "delay": "10s",
-                        "max_attempts": 10,
-                        "window": "300s",
-                    }
-                },
-                "environment": {
-                    "ARKITEKT_GATEWAY": f"http://{config.gateway.host}:{config.gateway.internal_port}",
-                    "ARKITEKT_NETWORK": config.internal_network,
-                    "INSTANCE_ID": "default",
-                    "DEPLOYER_ORGANIZATION": org.name,
-                },
+
+def create_redeem_tokens(config: ArkitektServerConfig) -> list[RedeemTokenConfig]:
+    """
+    Create the redeem tokens for the deployers of all organizations.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        A list of redeem tokens, empty if the deployer is disabled
+    """
+    if not config.deployer.enabled:
+        return []
+
+    return [
+        RedeemTokenConfig(
+            token=create_deployer_token(config, org),
+            user=org.bot_name,
+            organization=org.identifier,
+        )
+        for org in config.organizations
+    ]
+
+
+def create_minio_init_config(config: ArkitektServerConfig) -> dict[str, Any]:
+    """
+    Create the configuration for the MinIO initialization container.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        The configuration that creates the buckets and users
+    """
+    local_bucket_requests = parse_local_bucket_configs(config)
+    return {
+        "buckets": [{"name": req.bucket_name} for req in local_bucket_requests],
+        "users": [
+            {
+                "access_key": config.minio.access_key,
+                "secret_key": config.minio.secret_key,
+                "policies": ["readwrite"],
+                "name": "Default User",
             }
+        ],
+    }
 
-            redeem_tokens.append(
-                RedeemTokenConfig(
-                    token=token, user=org.bot_name, organization=org.identifier
-                )
-            )
 
-    # Configure individual Arkitekt services
-    if config.fluss.enabled:
-        services[config.fluss.host] = build_default_service(config, config.fluss)
+def collect_instances(config: ArkitektServerConfig) -> list[InstanceConfig]:
+    """
+    Collect the service instances that are registered with Lok.
 
-        gconfig = create_basic_config_values(config, config.fluss)
-        create_config(config.fluss.host, gconfig, tmpdir)
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        A list of InstanceConfig objects for all deployed services
+    """
+    instances: list[InstanceConfig] = []
+
+    if len(parse_local_bucket_configs(config)) > 1:
         instances.append(
             service_to_instance_config(config.fluss, "live.arkitekt.fluss")
         )
 
-    if config.kabinet.enabled:
-        services[config.kabinet.host] = build_default_service(config, config.kabinet)
+    for service, service_name in iterate_generated_services(config):
+        instances.append(service_to_instance_config(service, service_name))
 
-        gconfig = create_basic_config_values(config, config.kabinet)
-        create_config(config.kabinet.host, gconfig, tmpdir)
-        instances.append(
-            service_to_instance_config(config.kabinet, "live.arkitekt.kabinet")
+    instances.append(service_to_instance_config(config.lok, "live.arkitekt.lok"))
+
+    instances.append(
+        InstanceConfig(
+            service="live.arkitekt.s3",
+            identifier=config.minio.host,
+            aliases=[
+                AliasConfig(
+                    challenge="minio/health/live", kind="relative", layer="public"
+                )
+            ],
         )
+    )
+    return instances
 
-    if config.elektro.enabled:
-        services[config.elektro.host] = build_default_service(config, config.elektro)
 
-        gconfig = create_basic_config_values(config, config.elektro)
-        create_config(config.elektro.host, gconfig, tmpdir)
-        instances.append(
-            service_to_instance_config(config.elektro, "live.arkitekt.elektro")
-        )
+def create_lok_config_values(config: ArkitektServerConfig) -> Dict[str, Any]:
+    """
+    Create the configuration values for the Lok authentication service.
 
-    if config.kraph.enabled:
-        services[config.kraph.host] = build_default_service(config, config.kraph)
+    On top of the basic configuration values, Lok receives its key pair and
+    everything it needs to seed the deployment: users, organizations, roles,
+    service instances and the redeem tokens of the deployers.
 
-        gconfig = create_basic_config_values(config, config.kraph)
-        create_config(config.kraph.host, gconfig, tmpdir)
-        instances.append(
-            service_to_instance_config(config.kraph, "live.arkitekt.kraph")
-        )
+    Args:
+        config: The main Arkitekt server configuration
 
-    if config.alpaka.enabled:
-        services[config.alpaka.host] = build_default_service(config, config.alpaka)
+    Returns:
+        A dictionary containing the Lok configuration values
+    """
+    lok_config = create_basic_config_values(config, config.lok)
 
-        lok_config = create_basic_config_values(config, config.alpaka)
-        create_config(config.alpaka.host, lok_config, tmpdir)
-        instances.append(
-            service_to_instance_config(config.alpaka, "live.arkitekt.alpaka")
+    lok_config["deployment"] = {"name": "test"}
+    lok_config["email"] = {
+        "host": config.email.host if config.email else "NOT_SET",
+        "port": config.email.port if config.email else 587,
+        "user": config.email.username if config.email else "NOT_SET",
+        "password": config.email.password if config.email else "NOT_SET",
+        "email": config.email.email if config.email else "NOT_SET",
+    }
+    lok_config["layers"] = [{"kind": "public", "identifier": "public"}]
+    lok_config["private_key"] = config.lok.get_auth_key_pair().private_key
+    lok_config["public_key"] = config.lok.get_auth_key_pair().public_key
+    lok_config["redeem_tokens"] = [
+        token.model_dump() for token in create_redeem_tokens(config)
+    ]
+
+    lok_config["scopes"] = {
+        "kabinet_add_repo": "Add repositories to the database",
+        "kabinet_deploy": "Deploy containers",
+        "mikro_read": "Read image from the database",
+        "mikro_write": "Write image to the database",
+        "openid": "The open id connect scope",
+        "read": "A generic read access",
+        "read_image": "Read image from the database",
+        "rekuest_agent": "Act as an agent",
+        "rekuest_call": "Call other apps with rekuest",
+        "write": "A generic write access",
+    }
+    lok_config["token_expire_seconds"] = 800000
+    if config.lok.seed_file:
+        lok_config["seed_file"] = LOK_SEED_MOUNT
+        del lok_config["redeem_tokens"]
+        return lok_config
+
+    # The lists grow with the size of the deployment, their entries are
+    # only dumped while the config file is written
+    lok_config["organizations"] = LazySequence(
+        partial(iterate_model_dumps, config.organizations, ORGANIZATION_SECRETS)
+    )
+    lok_config["users"] = LazySequence(
+        partial(iterate_model_dumps, partial(iterate_lok_users, config))
+    )
+    lok_config["roles"] = LazySequence(partial(iterate_model_dumps, config.roles))
+    lok_config["instances"] = [
+        instance.model_dump() for instance in collect_instances(config)
+    ]
+    return lok_config
+
+
+# Fields of an organization that are not passed on to Lok
+ORGANIZATION_SECRETS = {"bot_password"}
+
+
+def iterate_model_dumps(
+    models: Iterable[BaseModel] | Callable[[], Iterable[BaseModel]],
+    exclude: set[str] | None = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Dump models one at a time.
+
+    Args:
+        models: The models, or a function returning them
+        exclude: Fields that are left out of the dumps
+
+    Returns:
+        An iterator over the dumps of the models
+    """
+    for model in models() if callable(models) else models:
+        yield model.model_dump(exclude=exclude)
+
+
+# Where the seed file is mounted in the Lok container
+LOK_SEED_MOUNT = "/workspace/seed.jsonl"
+
+
+def get_lok_seed_path(config: ArkitektServerConfig) -> Path:
+    """Get the path of the Lok seed file, relative to the deployment directory."""
+    return Path("configs") / f"{config.lok.host}_seed.jsonl"
+
+
+def iterate_lok_seed_records(config: ArkitektServerConfig) -> Iterator[dict[str, Any]]:
+    """
+    Create the records of the Lok seed file, one at a time.
+
+    With a seed file, the identities Lok seeds the deployment with are not
+    part of its config file, but written as one JSON record per line. Each
+    record has a kind (organization, user, role, instance or redeem_token)
+    and the data of the entry, in the same form as in the config file.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        An iterator over the records, organizations first so they exist before their members
+    """
+    for org in config.organizations:
+        yield {
+            "kind": "organization",
+            "data": org.model_dump(exclude=ORGANIZATION_SECRETS),
+        }
+    for role in config.roles:
+        yield {"kind": "role", "data": role.model_dump()}
+    for user in iterate_lok_users(config):
+        yield {"kind": "user", "data": user.model_dump()}
+    for instance in collect_instances(config):
+        yield {"kind": "instance", "data": instance.model_dump()}
+    for token in create_redeem_tokens(config):
+        yield {"kind": "redeem_token", "data": token.model_dump()}
+
+
+# Infrastructure checks are cheap, check them often so dependents start early
+INFRASTRUCTURE_HEALTHCHECK: dict[str, Any] = {
+    "interval": "2s",
+    "timeout": "5s",
+    "retries": 30,
+}
+
+# Services run their migrations on startup, which is covered by start_period
+SERVICE_HEALTHCHECK: dict[str, Any] = {
+    "interval": "5s",
+    "timeout": "5s",
+    "retries": 10,
+    "start_period": "120s",
+}
+
+
+def add_healthchecks(config: ArkitektServerConfig, services: dict[str, Any]) -> None:
+    """
+    Add healthchecks to the Docker Compose services, and wait for them.
+
+    The database, Redis, MinIO and every Arkitekt service (through its /ht
+    endpoint) get a healthcheck. Dependencies on a service with a
+    healthcheck then wait until it is healthy instead of only started, so
+    services don't crash-loop while their dependencies are starting up.
+
+    Args:
+        config: The main Arkitekt server configuration
+        services: The Docker Compose services, updated in place
+    """
+    healthchecks: dict[str, list[str]] = {
+        "db": ["CMD-SHELL", f"pg_isready -U {config.db.postgres_user} -d postgres"],
+        config.minio.host: ["CMD", "mc", "ready", "local"],
+        config.local_redis.host: ["CMD", "redis-cli", "ping"],
+    }
+    for service in iterate_service(config):
+        healthchecks[get_redis_host(config, service)] = ["CMD", "redis-cli", "ping"]
+
+    for name, test in healthchecks.items():
+        if name in services:
+            services[name]["healthcheck"] = {"test": test, **INFRASTRUCTURE_HEALTHCHECK}
+
+    web_services = [service for service, _ in iterate_generated_services(config)]
+    for service in [*web_services, config.lok]:
+        url = f"http://localhost:{service.internal_port}/{service.host}/ht"
+        test = [
+            "CMD",
+            "python",
+            "-c",
+            f"import urllib.request; urllib.request.urlopen('{url}', timeout=4)",
+        ]
+        for host in get_replica_hosts(config, service):
+            if host in services:
+                services[host]["healthcheck"] = {"test": test, **SERVICE_HEALTHCHECK}
+
+    for definition in services.values():
+        depends_on = definition.get("depends_on")
+        if isinstance(depends_on, list):
+            definition["depends_on"] = {
+                name: {
+                    "condition": "service_healthy"
+                    if "healthcheck" in services.get(name, {})
+                    else "service_started"
+                }
+                for name in depends_on
+            }
+        elif isinstance(depends_on, dict):
+            for name, dependency in depends_on.items():
+                if "healthcheck" in services.get(name, {}):
+                    dependency["condition"] = "service_healthy"
+
+
+def fit_to_resource_plan(
+    config: ArkitektServerConfig, plan: ResourcePlan, services: dict[str, Any]
+) -> None:
+    """
+    Fit the settings that are sized by CPUs and memory into the planned limits.
+
+    The tuning of the database and the number of web workers and background
+    jobs are derived from the resources of the host, a container with
+    planned limits would be throttled or OOM-killed with them.
+
+    Args:
+        config: The main Arkitekt server configuration
+        plan: The resource plan, already applied to the services
+        services: The Docker Compose services, updated in place
+    """
+    limits = {resources.name: resources for resources in plan.services}
+
+    db = limits.get("db")
+    if db is not None and config.db.tuning.enabled:
+        tuning = derive_postgres_tuning(
+            config.db.tuning.model_copy(
+                update={
+                    "memory_mb": min(config.db.tuning.memory_mb, db.memory_mb),
+                    "cpus": min(config.db.tuning.cpus, max(int(db.cpus), 1)),
+                }
+            )
         )
+        services["db"]["command"] = tuning.to_command()
+        services["db"]["shm_size"] = f"{tuning.shm_size_mb}m"
+
+    generated = [service for service, _ in iterate_generated_services(config)]
+    for service in [*generated, config.lok]:
+        process_model = service.process_model
+        if process_model is None:
+            continue
+        for host in get_replica_hosts(config, service):
+            if host in limits:
+                services[host]["environment"].update(
+                    process_model.build_web_environment(
+                        service.replicas, limits[host].cpus
+                    )
+                )
+        worker = f"{service.host}-worker"
+        if worker in limits:
+            services[worker]["command"] = process_model.build_worker_command(
+                limits[worker].cpus
+            )
 
-    if config.mikro.enabled:
-        services[config.mikro.host] = build_default_service(config, config.mikro)
 
-        lok_config = create_basic_config_values(config, config.mikro)
-        create_config(config.mikro.host, lok_config, tmpdir)
-        instances.append(
-            service_to_instance_config(config.mikro, "live.arkitekt.mikro")
+def create_docker_compose(config: ArkitektServerConfig) -> Dict[str, Any]:
+    """
+    Create the Docker Compose definition of the deployment.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        A dictionary representing the docker-compose.yaml file
+    """
+    services: dict[str, Any] = {}
+
+    # Configure PostgreSQL database if any services need local databases
+    local_dbs = parse_local_db_requests(config)
+    if len(local_dbs) > 1:
+        services["db"] = {
+            "image": config.db.image,
+            "environment": {
+                "POSTGRES_MULTIPLE_DATABASES": ",".join(
+                    [request.db for request in local_dbs]
+                ),
+                "POSTGRES_PASSWORD": config.db.postgres_password,
+                "POSTGRES_USER": config.db.postgres_user,
+            },
+            "volumes": [
+                f"{config.db.mount or config.db.volume_name}:/var/lib/postgresql/data"
+            ],
+        }
+        if config.db.tuning.enabled:
+            tuning = derive_postgres_tuning(config.db.tuning)
+            services["db"]["command"] = tuning.to_command()
+            services["db"]["shm_size"] = f"{tuning.shm_size_mb}m"
+
+    # Configure the connection pooler in front of the local database
+    if uses_pooler(config):
+        services[config.pooler.host] = {
+            "image": config.pooler.image,
+            "depends_on": ["db"],
+            "stop_grace_period": "2s",
+            "volumes": [
+                "./configs/pgbouncer.ini:/etc/pgbouncer/pgbouncer.ini:ro",
+                "./configs/pgbouncer_userlist.txt:/etc/pgbouncer/userlist.txt:ro",
+            ],
+        }
+
+    # Configure Redis service if any services need local Redis
+    local_redis_requests = parse_local_redis_request(config)
+    if len(local_redis_requests) > 1:
+        services[config.local_redis.host] = build_redis_service(
+            config, config.local_redis.tuning
         )
 
-    if config.rekuest.enabled:
-        services[config.rekuest.host] = build_default_service(config, config.rekuest)
+    # Services with a dedicated Redis instance, e.g. to keep latency critical
+    # pub/sub traffic away from caches and snapshots of the shared instance
+    for service in iterate_service(config):
+        redis_config = service.redis_config
+        if isinstance(redis_config, LocalRedisConfig) and redis_config.dedicated:
+            services[get_redis_host(config, service)] = build_redis_service(
+                config, redis_config.tuning or config.local_redis.tuning
+            )
 
-        lok_config = create_basic_config_values(config, config.rekuest)
-        create_config(config.rekuest.host, lok_config, tmpdir)
-        instances.append(
-            service_to_instance_config(config.rekuest, "live.arkitekt.rekuest")
+    # Configure MinIO object storage if any services need local buckets
+    local_bucket_requests = parse_local_bucket_configs(config)
+    if len(local_bucket_requests) > 1:
+        services[config.minio.host] = {
+            "image": config.minio.image,
+            "command": "server /data",
+            "environment": {
+                "MINIO_ROOT_USER": config.minio.root_user,
+                "MINIO_ROOT_PASSWORD": config.minio.root_password,
+            },
+            "stop_grace_period": "2s",
+            "volumes": [f"{config.minio.mount or config.minio.volume_name}:/data"],
+        }
+
+        # MinIO initialization container that sets up buckets and users on startup
+        services[config.minio.init_container_host] = {
+            "image": config.minio.init_container_image,
+            "volumes": [
+                f"./configs/{config.minio.init_container_host}.yaml:/workspace/config.yaml"
+            ],
+            "stop_grace_period": "2s",
+            "environment": {
+                "MINIO_ROOT_USER": config.minio.root_user,
+                "MINIO_ROOT_PASSWORD": config.minio.root_password,
+                "MINIO_HOST": f"http://{config.minio.host}:{config.minio.internal_port}",
+            },
+            "depends_on": {config.minio.host: {"condition": "service_started"}},
+        }
+
+    # Configure deployer service for container orchestration
+    if config.deployer.enabled:
+        for org in config.organizations:
+            token = create_deployer_token(config, org)
+
+            services[config.deployer.host + org.name] = {
+                "image": config.deployer.image,
+                "volumes": ["/var/run/docker.sock:/var/run/docker.sock"],
+                "command": (
+                    f"arkitekt-next run prod --redeem-token={token} "
+                    f"--url http://{config.gateway.host}:{config.gateway.internal_port}"
+                ),
+                "stop_grace_period": "2s",
+                "deploy": {
+                    "restart_policy": {
+                        "condition": "on-failure",
+                        "delay": "10s",
+                        "max_attempts": 10,
+                        "window": "300s",
+                    }
+                },
+                "environment": {
+                    "ARKITEKT_GATEWAY": f"http://{config.gateway.host}:{config.gateway.internal_port}",
+                    "ARKITEKT_NETWORK": config.internal_network,
+                    "INSTANCE_ID": "default",
+                    "DEPLOYER_ORGANIZATION": org.name,
+                },
+            }
+
+    # Configure individual Arkitekt services
+    for service, _ in iterate_generated_services(config):
+        add_service_processes(
+            config, services, service, build_default_service(config, service)
         )
 
     # Configure Caddy reverse proxy/gateway
@@ -693,16 +1414,17 @@ def write_virtual_config_files(tmpdir: Path, config: ArkitektServerConfig):
         "volumes": ["./configs/Caddyfile:/etc/caddy/Caddyfile"],
     }
 
-    # Generate and write the Caddyfile configuration
-    caddyfile = create_caddy_file(config)
-    mkkdirs = tmpdir / "configs"
-    mkkdirs.mkdir(parents=True, exist_ok=True)
-    (tmpdir / "configs" / "Caddyfile").write_text(caddyfile)
+    bucket_transfer = config.gateway.bucket_transfer
+    if bucket_transfer.enabled and bucket_transfer.port is not None:
+        services[config.gateway.host]["ports"].append(
+            f"{bucket_transfer.port}:{bucket_transfer.port}"
+        )
 
     # Create Lok service configuration
-    services[config.lok.host] = {
+    lok_service = {
         "command": config.lok.build_run_command(),
         "image": config.lok.image,
+        "depends_on": get_service_dependencies(config, config.lok),
         "volumes": [f"./configs/{config.lok.host}.yaml:/workspace/config.yaml"],
         "environment": {
             "AUTHLIB_INSECURE_TRANSPORT": "true",
@@ -718,54 +1440,20 @@ def write_virtual_config_files(tmpdir: Path, config: ArkitektServerConfig):
         },
     }
 
-    instances.append(service_to_instance_config(config.lok, "live.arkitekt.lok"))
-
-    instances.append(
-        InstanceConfig(
-            service="live.arkitekt.s3",
-            identifier=config.minio.host,
-            aliases=[
-                AliasConfig(
-                    challenge="minio/health/live", kind="relative", layer="public"
-                )
-            ],
+    if config.lok.seed_file:
+        lok_service["volumes"].append(
+            f"./{get_lok_seed_path(config).as_posix()}:{LOK_SEED_MOUNT}"
         )
-    )
 
-    lok_config = create_basic_config_values(config, config.lok)
-
-    lok_config["deployment"] = {"name": "test"}
-    lok_config["email"] = {
-        "host": config.email.host if config.email else "NOT_SET",
-        "port": config.email.port if config.email else 587,
-        "user": config.email.username if config.email else "NOT_SET",
-        "password": config.email.password if config.email else "NOT_SET",
-        "email": config.email.email if config.email else "NOT_SET",
-    }
-    lok_config["layers"] = [{"kind": "public", "identifier": "public"}]
-    lok_config["private_key"] = config.lok.auth_key_pair.private_key
-    lok_config["public_key"] = config.lok.auth_key_pair.public_key
-    lok_config["redeem_tokens"] = [instance.model_dump() for instance in redeem_tokens]
+    add_service_processes(config, services, config.lok, lok_service)
 
-    lok_config["scopes"] = {
-        "kabinet_add_repo": "Add repositories to the database",
-        "kabinet_deploy": "Deploy containers",
-        "mikro_read": "Read image from the database",
-        "mikro_write": "Write image to the database",
-        "openid": "The open id connect scope",
-        "read": "A generic read access",
-        "read_image": "Read image from the database",
-        "rekuest_agent": "Act as an agent",
-        "rekuest_call": "Call other apps with rekuest",
-        "write": "A generic write access",
-    }
-    lok_config["token_expire_seconds"] = 800000
-    lok_config["organizations"] = [org.model_dump() for org in config.organizations]
-    lok_config["users"] = [user.model_dump() for user in config.users]
-    lok_config["roles"] = [role.model_dump() for role in config.roles]
-    lok_config["instances"] = [instance.model_dump() for instance in instances]
+    if config.healthchecks:
+        add_healthchecks(config, services)
 
-    create_config(config.lok.host, lok_config, tmpdir)
+    if config.resources.enabled:
+        plan = plan_resources(config.resources, services)
+        apply_resource_plan(plan, services)
+        fit_to_resource_plan(config, plan, services)
 
     volumes: list[str] = []
     if not config.db.mount:
@@ -773,7 +1461,7 @@ def write_virtual_config_files(tmpdir: Path, config: ArkitektServerConfig):
     if not config.minio.mount:
         volumes.append(f"{config.minio.volume_name}")
 
-    docker_compose_content: Dict[str, Any] = {
+    return {
         "services": services,
         "networks": {
             config.internal_network: {
@@ -784,35 +1472,401 @@ def write_virtual_config_files(tmpdir: Path, config: ArkitektServerConfig):
         "volumes": {vol: {} for vol in volumes},
     }
 
-    (tmpdir / "docker-compose.yaml").write_text(
-        yaml.dump(docker_compose_content, default_flow_style=False)
+
+# The large lists of the configuration, only some artifacts are created from them
+DIRECTORY_FIELDS = ("users", "organizations", "roles")
+
+
+@lru_cache
+def get_generator_fingerprint() -> str:
+    """
+    Get a fingerprint of the code the artifacts are generated with.
+
+    The version of the package doesn't change with every change of the
+    generators, so the manifest records the source of the package as well.
+
+    Returns:
+        The hex digest of the SHA-256 hash of the modules of the package
+    """
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def hash_config_inputs(config: ArkitektServerConfig) -> dict[str, str]:
+    """
+    Hash the slices of the configuration the artifacts are created from.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        The hash of every directory field, and of the rest of the configuration (as "config")
+    """
+    hashes = {
+        "config": hash_input(
+            config.model_dump(mode="json", exclude=set(DIRECTORY_FIELDS))
+        )
+    }
+    for field in DIRECTORY_FIELDS:
+        hashes[field] = hash_input(
+            LazySequence(partial(iterate_model_dumps, getattr(config, field)))
+        )
+    return hashes
+
+
+class ArtifactGenerator(BaseModel):
+    """
+    Generator for a single artifact of the deployment.
+
+    Attributes:
+        name: Unique name of the artifact
+        path: Path of the file, relative to the deployment directory
+        generate: Function creating the content of the artifact
+        format: The format the content is serialized in (yaml, json or jsonl)
+        reads: The directory fields the artifact is created from, besides the rest of the configuration
+    """
+
+    name: str
+    path: Path
+    generate: Callable[[], Any]
+    format: ArtifactFormat = "yaml"
+    reads: tuple[str, ...] = ()
+
+    def create(self) -> Artifact:
+        """Create the artifact."""
+        return Artifact(
+            name=self.name, path=self.path, content=self.generate(), format=self.format
+        )
+
+    def to_record(self, hashes: dict[str, str]) -> ArtifactRecord:
+        """
+        Create the build manifest record for the artifact, without creating it.
+
+        Args:
+            hashes: The hashes of the slices of the configuration (see hash_config_inputs)
+
+        Returns:
+            The record, keyed on the slices of the configuration the artifact reads
+        """
+        return ArtifactRecord(
+            input_hash=hash_input(
+                {
+                    "generators": get_generator_fingerprint(),
+                    "path": self.path.as_posix(),
+                    "format": self.format,
+                    "inputs": [hashes[key] for key in ("config", *self.reads)],
+                }
+            ),
+            files=[self.path.as_posix()],
+        )
+
+
+def iterate_artifact_generators(
+    config: ArkitektServerConfig,
+) -> list[ArtifactGenerator]:
+    """
+    Get the generators for all artifacts of the deployment.
+
+    The generators are independent of each other, so they can be run in any
+    order and only for the artifacts that are actually needed. Only the
+    artifacts of Lok and Docker Compose read the users, organizations or
+    roles, so changes to them don't regenerate the other artifacts.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        A list of artifact generators
+    """
+    generators: list[ArtifactGenerator] = []
+
+    if len(parse_local_bucket_configs(config)) > 1:
+        generators.append(
+            ArtifactGenerator(
+                name=config.minio.init_container_host,
+                path=Path("configs") / f"{config.minio.init_container_host}.yaml",
+                generate=partial(create_minio_init_config, config),
+            )
+        )
+
+    if uses_pooler(config):
+        generators.append(
+            ArtifactGenerator(
+                name=config.pooler.host,
+                path=Path("configs") / "pgbouncer.ini",
+                generate=partial(create_pgbouncer_config, config),
+            )
+        )
+        generators.append(
+            ArtifactGenerator(
+                name=f"{config.pooler.host}_userlist",
+                path=Path("configs") / "pgbouncer_userlist.txt",
+                generate=partial(create_pgbouncer_userlist, config),
+            )
+        )
+
+    for service, _ in iterate_generated_services(config):
+        generators.append(
+            ArtifactGenerator(
+                name=service.host,
+                path=Path("configs") / f"{service.host}.yaml",
+                generate=partial(create_basic_config_values, config, service),
+                format=service.config_format,
+            )
+        )
+
+    generators.append(
+        ArtifactGenerator(
+            name=config.gateway.host,
+            path=Path("configs") / "Caddyfile",
+            generate=partial(create_caddy_file, config),
+        )
+    )
+    generators.append(
+        ArtifactGenerator(
+            name=config.lok.host,
+            path=Path("configs") / f"{config.lok.host}.yaml",
+            generate=partial(create_lok_config_values, config),
+            format=config.lok.config_format,
+            reads=DIRECTORY_FIELDS,
+        )
     )
+    if config.lok.seed_file:
+        generators.append(
+            ArtifactGenerator(
+                name=f"{config.lok.host}_seed",
+                path=get_lok_seed_path(config),
+                generate=partial(
+                    LazySequence, partial(iterate_lok_seed_records, config)
+                ),
+                format="jsonl",
+                reads=DIRECTORY_FIELDS,
+            )
+        )
+    generators.append(
+        ArtifactGenerator(
+            name="docker-compose",
+            path=Path("docker-compose.yaml"),
+            generate=partial(create_docker_compose, config),
+            # The deployers of the organizations
+            reads=("organizations",),
+        )
+    )
+    return generators
+
 
+def create_artifacts(config: ArkitektServerConfig) -> dict[str, Artifact]:
+    """
+    Create all artifacts of the deployment, without writing them.
+
+    Args:
+        config: The main Arkitekt server configuration
+
+    Returns:
+        A dictionary mapping the artifact name to the artifact
+    """
+    return {
+        generator.name: generator.create()
+        for generator in iterate_artifact_generators(config)
+    }
+
+
+def write_artifact(artifact: Artifact, base_path: Path) -> float:
+    """
+    Write an artifact to the deployment directory.
+
+    Args:
+        artifact: The artifact to write
+        base_path: The deployment directory
+
+    Returns:
+        The time it took to serialize and write the artifact in seconds
+    """
+    start = time.perf_counter()
+    target = base_path / artifact.path
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    if isinstance(artifact.content, str):
+        target.write_text(artifact.content)
+    elif artifact.format == "jsonl":
+        with open(target, "w") as f:
+            dump_jsonl(artifact.content, f)
+    else:
+        # Written chunk by chunk, so lazy sequences never exist as a whole
+        with open(target, "w") as f:
+            f.writelines(iterate_config(artifact.content, artifact.format))
+    return time.perf_counter() - start
+
+
+def write_virtual_config_files(
+    tmpdir: Path,
+    config: ArkitektServerConfig,
+    artifacts: set[str] | None = None,
+) -> list[ArtifactTiming]:
+    """
+    Generate all configuration files needed for deployment.
+
+    This is the main function that orchestrates the creation of all necessary
+    configuration files for a complete Arkitekt deployment, including:
+
+    - Docker Compose service definitions
+    - Individual service configuration files (YAML)
+    - Caddyfile for reverse proxy
+    - MinIO initialization configuration
+    - Lok authentication service setup with users, groups, and instances
+
+    The function analyzes the configuration to determine which services are
+    enabled and what infrastructure components (databases, Redis, storage)
+    are needed, then generates appropriate configurations for each.
+
+    The configuration is not changed (e.g. the bot users of the
+    organizations are derived, not added to it), so building the same
+    configuration again produces the same files.
 
-def collect_all_files(base: Path) -> dict[Path, Path]:
+    Args:
+        tmpdir: Temporary directory where configuration files will be written
+        config: The main Arkitekt server configuration to generate files from
+        artifacts: Names of the artifacts to write. If None, all artifacts are written
+
+    Returns:
+        The timing of every written artifact
+    """
+
+    timings: list[ArtifactTiming] = []
+    for generator in iterate_artifact_generators(config):
+        if artifacts is not None and generator.name not in artifacts:
+            continue
+        start = time.perf_counter()
+        artifact = generator.create()
+        generate_time = time.perf_counter() - start
+        timings.append(
+            ArtifactTiming(
+                name=artifact.name,
+                generate=generate_time,
+                write=write_artifact(artifact, tmpdir),
+            )
+        )
+    return timings
+
+
+def collect_all_files(
+    base: Path, ignore: set[Path] | None = None
+) -> dict[Path, Path]:
     """
     Recursively collect all files in a directory tree.
     This function scans the specified directory and returns a dictionary
     mapping relative file paths to their absolute Path objects. It is useful
     for comparing directory structures or preparing for deployment.
 
+    Ignored directories are pruned before they are entered, so large data
+    directories (e.g. bind-mounted database storage) are never walked.
+
     Args:
         base: The base directory to scan
+        ignore: Directories (relative to base) that should not be scanned
 
     Returns:
         A dictionary mapping relative paths to absolute Path objects
     """
+    ignore = ignore or set()
     files: dict[Path, Path] = {}
-    for path in base.rglob("*"):
-        if path.is_file():
-            relative_path = path.relative_to(base)
-            files[relative_path] = path
+    for root, dirnames, filenames in os.walk(base):
+        relative_root = Path(root).relative_to(base)
+        dirnames[:] = [d for d in dirnames if relative_root / d not in ignore]
+        for filename in filenames:
+            files[relative_root / filename] = Path(root) / filename
     return files
 
 
+def collect_data_directories(
+    config: ArkitektServerConfig, real_dir: Path
+) -> set[Path]:
+    """
+    Collect the data directories of a deployment that should never be compared.
+
+    These are the bind mounts of the database and MinIO storage, if they
+    are located inside the deployment directory.
+
+    Args:
+        config: The main Arkitekt server configuration
+        real_dir: The deployment directory
+
+    Returns:
+        A set of directories relative to the deployment directory
+    """
+    base = real_dir.resolve()
+    directories: set[Path] = set()
+    for mount in (config.db.mount, config.minio.mount):
+        if not mount:
+            continue
+        mount_path = (base / mount).resolve()
+        if mount_path.is_relative_to(base) and mount_path != base:
+            directories.add(mount_path.relative_to(base))
+    return directories
+
+
+def files_identical(a: Path, b: Path) -> bool:
+    """
+    Check if two files have the same content.
+
+    Files with a different size are never identical, and files with the
+    same size and modification time are assumed to be identical. Only
+    otherwise, the content of both files is hashed in chunks.
+
+    Args:
+        a: The first file
+        b: The second file
+
+    Returns:
+        True if both files have the same content
+    """
+    a_stat = a.stat()
+    b_stat = b.stat()
+    if a_stat.st_size != b_stat.st_size:
+        return False
+    if a_stat.st_mtime_ns == b_stat.st_mtime_ns:
+        return True
+
+    with open(a, "rb") as a_file, open(b, "rb") as b_file:
+        return (
+            hashlib.file_digest(a_file, "sha256").digest()
+            == hashlib.file_digest(b_file, "sha256").digest()
+        )
+
+
+class FilesystemDiff(BaseModel):
+    """
+    Result of comparing a virtual and a real deployment directory.
+
+    Attributes:
+        created: Files that only exist in the virtual directory
+        deleted: Files that only exist in the real directory
+        modified: Files that exist in both directories with different content
+        unchanged: Files that exist in both directories with the same content
+    """
+
+    created: list[Path] = []
+    deleted: list[Path] = []
+    modified: list[Path] = []
+    unchanged: list[Path] = []
+
+    @property
+    def changed(self) -> list[Path]:
+        """Files that need to be written to the real directory."""
+        return sorted(self.created + self.modified)
+
+
 def compare_filesystems(
-    virtual_dir: Path, real_dir: Path, *, allow_deletes: bool = True
-):
+    virtual_dir: Path,
+    real_dir: Path,
+    *,
+    allow_deletes: bool = True,
+    exclude: set[Path] | None = None,
+    ignore: set[Path] | None = None,
+    max_diff_lines: int | None = 200,
+) -> FilesystemDiff:
     """
     Compare virtual and real directory structures and display differences.
 
@@ -824,16 +1878,32 @@ def compare_filesystems(
     - Modified (exist in both but with different content)
 
     For modified files, it displays a unified diff showing the exact changes.
+    Files are only read line by line if their size or content hash differ,
+    and the real directory is only walked if deletes should be reported.
 
     Args:
         virtual_dir: Directory containing the generated configuration files
         real_dir: Directory containing the existing deployment files
         allow_deletes: Whether to report files that would be deleted
+        exclude: Relative paths that are left out of the comparison (e.g. up-to-date artifacts)
+        ignore: Directories (relative to the real directory) that are never scanned
+        max_diff_lines: Maximum number of diff lines that are shown per file (None for no limit)
+
+    Returns:
+        A FilesystemDiff describing the changes
     """
     virtual_files = collect_all_files(virtual_dir)
-    real_files = collect_all_files(real_dir)
+    if allow_deletes:
+        real_files = collect_all_files(real_dir, ignore=ignore)
+    else:
+        real_files = {
+            path: real_dir / path
+            for path in virtual_files
+            if (real_dir / path).is_file()
+        }
 
-    all_paths = sorted(set(virtual_files) | set(real_files))
+    all_paths = sorted((set(virtual_files) | set(real_files)) - (exclude or set()))
+    result = FilesystemDiff()
 
     for path in all_paths:
         v_file = virtual_files.get(path)
@@ -841,25 +1911,82 @@ def compare_filesystems(
 
         if v_file and not r_file:
             print(f"[+] Would create: {path}")
+            result.created.append(path)
         elif not v_file and r_file:
             if allow_deletes:
                 print(f"[-] Would delete: {path}")
+                result.deleted.append(path)
         elif v_file and r_file:
+            if files_identical(v_file, r_file):
+                result.unchanged.append(path)
+                continue
+
             v_lines = v_file.read_text().splitlines(keepends=True)
             r_lines = r_file.read_text().splitlines(keepends=True)
+            diff = difflib.unified_diff(
+                r_lines,
+                v_lines,
+                fromfile=f"{path} (current)",
+                tofile=f"{path} (new)",
+                lineterm="",
+            )
+            print(f"[~] Would modify: {path}")
+            for index, line in enumerate(diff):
+                if max_diff_lines is not None and index >= max_diff_lines:
+                    print(f"... diff truncated after {max_diff_lines} lines")
+                    break
+                print(line.rstrip("\n"))
+            result.modified.append(path)
 
-            if v_lines != r_lines:
-                diff = list(
-                    difflib.unified_diff(
-                        r_lines,
-                        v_lines,
-                        fromfile=f"{path} (current)",
-                        tofile=f"{path} (new)",
-                        lineterm="",
-                    )
-                )
-                print(f"[~] Would modify: {path}")
-                print("".join(diff))
+    return result
+
+
+def atomic_copy(source: Path, target: Path) -> None:
+    """
+    Copy a file by writing to a temporary file and renaming it into place.
+
+    The temporary file is created next to the target, so the rename happens
+    on the same filesystem and readers never see a half-written file.
+
+    Args:
+        source: The file to copy
+        target: The destination of the copy
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target.with_name(f".{target.name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with open(source, "rb") as src_file, open(temp_path, "xb") as dst_file:
+            shutil.copyfileobj(src_file, dst_file)
+            dst_file.flush()
+            os.fsync(dst_file.fileno())
+        if target.exists():
+            shutil.copymode(target, temp_path)
+        os.replace(temp_path, target)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def apply_filesystem_diff(
+    diff: FilesystemDiff, virtual_dir: Path, real_dir: Path
+) -> list[Path]:
+    """
+    Apply the changes of a comparison to the real directory.
+
+    Only created and modified files are written, unchanged files are left
+    untouched so their modification times (and the containers mounting
+    them) are not affected.
+
+    Args:
+        diff: The result of compare_filesystems
+        virtual_dir: Directory containing the generated configuration files
+        real_dir: The target directory for the deployment files
+
+    Returns:
+        The relative paths of the files that were written
+    """
+    for path in diff.changed:
+        atomic_copy(virtual_dir / path, real_dir / path)
+    return diff.changed
 
 
 def run_dry_run_diff(
@@ -867,16 +1994,22 @@ def run_dry_run_diff(
     real_dir: Path,
     allow_deletes: bool = False,
     yes: bool = False,
+    force: bool = False,
+    show_timings: bool = False,
 ):
     """
     Execute a dry-run comparison and optionally apply changes.
 
     This is the main entry point for the configuration diff workflow. It:
-    1. Creates a temporary directory with the generated configuration
-    2. Compares it to the existing deployment directory
-    3. Shows the user what changes would be made
-    4. Prompts for confirmation before applying changes
-    5. Copies the new configuration files if confirmed
+    1. Checks the build manifest for artifacts whose inputs (the slices of
+       the configuration they read) did not change
+    2. Creates a temporary directory with the artifacts that need a rebuild,
+       only their generators are run
+    3. Compares it to the existing deployment directory
+    4. Shows the user what changes would be made
+    5. Prompts for confirmation before applying changes
+    6. Atomically writes the changed files and updates the manifest if confirmed
+    7. Records which services need to be recreated for the changes
 
     This provides a safe way to preview and apply configuration changes
     without accidentally overwriting important files.
@@ -885,31 +2018,89 @@ def run_dry_run_diff(
         config: The Arkitekt server configuration to deploy
         real_dir: The target directory for the deployment files
         allow_deletes: Whether to allow deletion of existing files
+        yes: Whether to apply the changes without asking for confirmation
+        force: Whether to rebuild all artifacts, even if they are up-to-date
+        show_timings: Whether to print how long each artifact took to generate
 
     Raises:
         typer.Abort: If the user declines to apply the changes
     """
 
+    hashes = hash_config_inputs(config)
+    records = {
+        generator.name: generator.to_record(hashes)
+        for generator in iterate_artifact_generators(config)
+    }
+    manifest = load_manifest(real_dir)
+
+    stale = {
+        name
+        for name, record in records.items()
+        if force or not manifest.is_up_to_date(name, record, real_dir)
+    }
+    up_to_date_files = {
+        Path(file)
+        for name, record in records.items()
+        if name not in stale
+        for file in record.files
+    }
+
+    print(f"📦 {len(records) - len(stale)} up-to-date, {len(stale)} rebuilt")
+    if not stale:
+        return
+
     with tempfile.TemporaryDirectory() as tmp:
         virtual_dir = Path(tmp)
         print(f"🛠  Generating virtual config in: {virtual_dir}")
-        write_virtual_config_files(virtual_dir, config)
+        timings = write_virtual_config_files(virtual_dir, config, artifacts=stale)
+        if show_timings:
+            print(f"\n⏱  {'artifact':<24} {'generate':>10} {'write':>10}")
+            for timing in sorted(timings, key=lambda t: t.total, reverse=True):
+                print(
+                    f"   {timing.name:<24} {timing.generate * 1000:>8.1f}ms "
+                    f"{timing.write * 1000:>8.1f}ms"
+                )
 
         print(f"\n🔍 Comparing to real directory: {real_dir}\n")
-        compare_filesystems(virtual_dir, real_dir, allow_deletes=allow_deletes)
+        diff = compare_filesystems(
+            virtual_dir,
+            real_dir,
+            allow_deletes=allow_deletes,
+            exclude=up_to_date_files,
+            ignore=collect_data_directories(config, real_dir) | {Path(CACHE_DIR)},
+        )
 
-        if not yes:
-            typer.confirm(
-                "Do you want to apply these changes?",
-                abort=True,
+        if diff.changed:
+            if not yes:
+                import typer
+
+                typer.confirm(
+                    "Do you want to apply these changes?",
+                    abort=True,
+                )
+
+            compose_file = Path(records["docker-compose"].files[0])
+            old_compose = None
+            if (real_dir / compose_file).is_file():
+                old_compose = load_yaml((real_dir / compose_file).read_text())
+            new_compose = old_compose or {}
+            if "docker-compose" in stale:
+                new_compose = load_yaml((virtual_dir / compose_file).read_text())
+
+            written = apply_filesystem_diff(diff, virtual_dir, real_dir)
+            print(f"✅ Wrote {len(written)} files, {len(diff.unchanged)} unchanged")
+
+            plan = plan_restarts(
+                written, old_compose, new_compose, compose_file=compose_file
             )
+            plan = load_restart_plan(real_dir).merge(plan)
+            save_restart_plan(real_dir, plan)
+            if plan.services:
+                print(
+                    f"🔁 Services to recreate: {', '.join(plan.services)} "
+                    "(run 'arkitekt-server start --only-changed')"
+                )
+        else:
+            print("✅ No changes to apply")
 
-        # copy the virtual files to the real directory
-        for path in virtual_dir.rglob("*"):
-            if path.is_file():
-                relative_path = path.relative_to(virtual_dir)
-                target_path = real_dir / relative_path
-                target_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(path, "r") as src_file:
-                    with open(target_path, "w") as dst_file:
-                        dst_file.write(src_file.read())
+    save_manifest(real_dir, BuildManifest(artifacts=records))
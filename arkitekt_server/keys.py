@@ -0,0 +1,180 @@
+import os
+import secrets
+from pathlib import Path
+from typing import Literal, Protocol, runtime_checkable
+
+from .config import KeyPair, build_key_pair
+
+
+KeyProviderMode = Literal["lazy", "pool", "fixture"]
+
+
+def default_cache_dir() -> Path:
+    """
+    Get the user level cache directory for the Arkitekt server.
+
+    This honours ARKITEKT_SERVER_CACHE_DIR and XDG_CACHE_HOME, and falls back
+    to ~/.cache/arkitekt_server.
+    """
+    if "ARKITEKT_SERVER_CACHE_DIR" in os.environ:
+        return Path(os.environ["ARKITEKT_SERVER_CACHE_DIR"])
+    xdg_cache = os.environ.get("XDG_CACHE_HOME")
+    base = Path(xdg_cache) if xdg_cache else Path.home() / ".cache"
+    return base / "arkitekt_server"
+
+
+def _write_private_file(path: Path, content: str) -> None:
+    """Write a file that is only readable by the current user."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(content)
+
+
+@runtime_checkable
+class KeyProvider(Protocol):
+    """
+    Protocol for a key pair provider.
+    This is used to supply the Lok service with its signing key pair.
+    """
+
+    def get_key_pair(self) -> KeyPair:
+        """
+        Get a key pair.
+        This is called once per configuration, the first time the key pair is needed.
+        """
+        ...
+
+
+class LazyKeyProvider:
+    """
+    Generates a fresh RSA key pair every time one is requested.
+    """
+
+    def get_key_pair(self) -> KeyPair:
+        return build_key_pair()
+
+
+class PoolKeyProvider:
+    """
+    Hands out key pairs from a pool of pre-generated keys on disk.
+
+    Every key pair is only handed out once. If the pool is empty, a fresh
+    key pair is generated instead.
+    """
+
+    def __init__(self, directory: Path | None = None):
+        self.directory = directory or default_cache_dir() / "keys" / "pool"
+
+    def size(self) -> int:
+        """Get the number of key pairs that are left in the pool."""
+        if not self.directory.exists():
+            return 0
+        return len(list(self.directory.glob("*.json")))
+
+    def fill(self, size: int) -> int:
+        """
+        Fill the pool up to the given size.
+
+        Args:
+            size: The number of key pairs the pool should hold
+
+        Returns:
+            The number of key pairs that were generated
+        """
+        missing = max(size - self.size(), 0)
+        for _ in range(missing):
+            key_pair = build_key_pair()
+            _write_private_file(
+                self.directory / f"{secrets.token_hex(8)}.json",
+                key_pair.model_dump_json(),
+            )
+        return missing
+
+    def get_key_pair(self) -> KeyPair:
+        if self.directory.exists():
+            for path in sorted(self.directory.glob("*.json")):
+                claimed = path.with_suffix(f".claimed-{secrets.token_hex(4)}")
+                try:
+                    # Renaming is atomic, so concurrent builds never share a key
+                    os.replace(path, claimed)
+                except FileNotFoundError:
+                    continue
+                try:
+                    return KeyPair.model_validate_json(claimed.read_text())
+                finally:
+                    claimed.unlink()
+
+        return build_key_pair()
+
+
+class FixtureKeyProvider:
+    """
+    Hands out the same key pair every time one is requested.
+
+    The key pair is stored on disk, so it stays the same across test runs.
+    This should only ever be used for tests, as every deployment will share
+    the same signing key.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = path or default_cache_dir() / "keys" / "fixture.json"
+        self._key_pair: KeyPair | None = None
+
+    def get_key_pair(self) -> KeyPair:
+        if self._key_pair is None:
+            if self.path.exists():
+                self._key_pair = KeyPair.model_validate_json(self.path.read_text())
+            else:
+                self._key_pair = build_key_pair()
+                _write_private_file(self.path, self._key_pair.model_dump_json())
+        return self._key_pair
+
+
+_key_provider: KeyProvider | None = None
+
+
+def create_key_provider(mode: KeyProviderMode) -> KeyProvider:
+    """
+    Create a key provider for the given mode.
+
+    Args:
+        mode: The key provider mode (lazy, pool or fixture)
+
+    Returns:
+        A new key provider
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    if mode == "lazy":
+        return LazyKeyProvider()
+    if mode == "pool":
+        return PoolKeyProvider()
+    if mode == "fixture":
+        return FixtureKeyProvider()
+    raise ValueError(f"Unknown key provider mode '{mode}'. Use lazy, pool or fixture.")
+
+
+def get_key_provider() -> KeyProvider:
+    """
+    Get the active key provider.
+
+    If no provider was set with set_key_provider, the mode is taken from the
+    ARKITEKT_SERVER_KEY_PROVIDER environment variable (defaults to lazy).
+    """
+    global _key_provider
+    if _key_provider is None:
+        mode = os.environ.get("ARKITEKT_SERVER_KEY_PROVIDER", "lazy")
+        _key_provider = create_key_provider(mode)  # type: ignore[arg-type]
+    return _key_provider
+
+
+def set_key_provider(provider: KeyProvider | None) -> None:
+    """
+    Set the active key provider.
+
+    Passing None resets the provider, so it is picked from the environment again.
+    """
+    global _key_provider
+    _key_provider = provider
@@ -1,35 +1,22 @@
 import subprocess
+import time
 from pathlib import Path
 import sys
-import inquirer
-import rich_click as click
-from pydantic import BaseModel, Field
-import yaml
-from cryptography.hazmat.primitives import serialization as crypto_serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.backends import default_backend as crypto_default_backend
+import click
+from pydantic import BaseModel, ValidationError
 import typer
 from arkitekt_server.config import (
     ArkitektServerConfig,
+    BaseService,
     BaseServiceConfig,
+    ProcessModelConfig,
     RekuestConfig,
-    KeyPair,
-    EmailConfig,
     User,
 )
-from typer.core import TyperGroup
-from arkitekt_server.diff import run_dry_run_diff
-from arkitekt_server.config import generate_name, Organization
-from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
-from rich.markdown import Markdown
+from arkitekt_server.cache import CACHE_DIR, load_cached_config
 from .logo import ASCI_LOGO
-from arkitekt_server.wizard import prompt_config
 
 
-console = Console()
-
 app = typer.Typer(
     rich_markup_mode="rich",
     help="Arkitekt server CLI for managing your local Arkitekt server deployment.",
@@ -73,6 +60,10 @@ service_app = typer.Typer()
 app.add_typer(service_app, name="service", help="Service management commands")
 
 
+keys_app = typer.Typer()
+app.add_typer(keys_app, name="keys", help="Key pair cache management commands")
+
+
 class YamlFile(BaseModel):
     version: str
     config: ArkitektServerConfig
@@ -80,10 +71,11 @@ class YamlFile(BaseModel):
 
 def update_or_create_yaml_file(file_path: str, new_config: ArkitektServerConfig):
     """Update or create a YAML file with the given data."""
+    from arkitekt_server.serialization import dump_yaml
 
     with open("arkitekt_server_config.yaml", "w") as f:
         yaml_data = YamlFile(version="1.0", config=new_config)
-        yaml.dump(yaml_data.model_dump(), f, default_flow_style=False)
+        dump_yaml(yaml_data.model_dump(), f)
 
     # create gitignore file if it does not exist
     try:
@@ -92,6 +84,11 @@ def update_or_create_yaml_file(file_path: str, new_config: ArkitektServerConfig)
     except FileNotFoundError:
         gitignore_content = ""
 
+    if f"{CACHE_DIR}/" not in gitignore_content:
+        with open(".gitignore", "a") as f:
+            f.write(f"\n{CACHE_DIR}/\n")
+            f.write("# Validated snapshots of the config file, contain the same secrets\n")
+
     if "arkitekt_server_config.yaml" not in gitignore_content:
         with open(".gitignore", "a") as f:
             f.write("\narkitekt_server_config.yaml\n")
@@ -104,12 +101,18 @@ def update_or_create_yaml_file(file_path: str, new_config: ArkitektServerConfig)
             )
 
 
+def parse_config(content: bytes) -> ArkitektServerConfig:
+    """Parse and validate the content of a configuration file."""
+    from arkitekt_server.serialization import load_yaml
+
+    data = load_yaml(content)
+    return ArkitektServerConfig(**data["config"])
+
+
 def load_or_create_yaml_file(file_path: str) -> ArkitektServerConfig:
     """Load or create a YAML file with default configuration."""
     try:
-        with open("arkitekt_server_config.yaml", "r") as f:
-            data = yaml.safe_load(f)
-            return ArkitektServerConfig(**data["config"])
+        return load_cached_config(Path("arkitekt_server_config.yaml"), parse_config)
     except FileNotFoundError:
         raise FileNotFoundError(
             f"Configuration file '{file_path}' not found. Please run 'arkitekt init' to create a new configuration."
@@ -119,13 +122,28 @@ def load_or_create_yaml_file(file_path: str) -> ArkitektServerConfig:
 def load_yaml_file(file_path: str) -> ArkitektServerConfig:
     """Load a YAML file and return the configuration."""
     try:
-        with open(file_path, "r") as f:
-            data = yaml.safe_load(f)
-            return ArkitektServerConfig(**data["config"])
+        return load_cached_config(Path(file_path), parse_config)
     except FileNotFoundError:
         raise FileNotFoundError(f"Configuration file '{file_path}' not found.")
-    except yaml.YAMLError as e:
-        raise ValueError(f"Error parsing YAML file: {e}")
+    except Exception as e:
+        # yaml is only imported once the file is parsed
+        import yaml
+
+        if isinstance(e, yaml.YAMLError):
+            raise ValueError(f"Error parsing YAML file: {e}")
+        raise
+
+
+def prompt_interactive_config() -> ArkitektServerConfig:
+    """Run the interactive setup wizard.
+
+    The wizard and its dependencies (rich, inquirer) are only imported here,
+    so non-interactive commands don't pay for them.
+    """
+    from rich.console import Console
+    from arkitekt_server.wizard import prompt_config
+
+    return prompt_config(Console())
 
 
 def show_important_information(config: ArkitektServerConfig):
@@ -148,7 +166,7 @@ def stable(
     """
 
     # Create a default configuration file if it doesn't exist
-    config = ArkitektServerConfig() if defaults else prompt_config(console)
+    config = ArkitektServerConfig() if defaults else prompt_interactive_config()
     if port is not None:
         config.gateway.exposed_http_port = port
     if ssl_port is not None:
@@ -171,7 +189,7 @@ def default(defaults: bool = False, port: int | None = None):
     """
 
     # Create a default configuration file if it doesn't exist
-    config = ArkitektServerConfig() if defaults else prompt_config(console)
+    config = ArkitektServerConfig() if defaults else prompt_interactive_config()
     if port is not None:
         config.gateway.exposed_http_port = port
 
@@ -193,7 +211,7 @@ def dev(defaults: bool = False, port: int | None = None):
     """
 
     # Create a default configuration file if it doesn't exist
-    config = ArkitektServerConfig() if defaults else prompt_config(console)
+    config = ArkitektServerConfig() if defaults else prompt_interactive_config()
     if port is not None:
         config.gateway.exposed_http_port = port
 
@@ -236,6 +254,97 @@ def users():
             print(f"Roles: {', '.join(membership.roles)}")
 
 
+@inspect_app.command()
+def resources():
+    """Show the CPU and memory limits planned for every service."""
+    from arkitekt_server.diff import create_docker_compose
+    from arkitekt_server.resources import ResourcePlanError, plan_resources
+
+    config = load_yaml_file("arkitekt_server_config.yaml")
+    compose = create_docker_compose(config)
+
+    try:
+        plan = plan_resources(config.resources, compose["services"])
+    except ResourcePlanError as e:
+        click.secho(f"Invalid resource plan: {e}", fg="red", err=True)
+        raise typer.Exit(code=1)
+
+    print(f"Host: {plan.cpus:g} CPUs, {plan.memory_mb}MB memory")
+    print(
+        f"{'service':<24} {'weight':>6} {'replicas':>8} {'cpus':>6} {'memory':>8} "
+        f"{'reserved cpus':>13} {'reserved memory':>15} {'cpuset':>8}"
+    )
+    for service in plan.services:
+        weight = "-" if service.weight is None else f"{service.weight:g}"
+        print(
+            f"{service.name:<24} {weight:>6} {service.replicas:>8} "
+            f"{service.cpus:>6g} {service.memory_mb:>6}MB "
+            f"{service.reserved_cpus:>13g} {service.reserved_memory_mb:>13}MB "
+            f"{service.cpuset or '-':>8}"
+        )
+    print(
+        f"Planned: {plan.planned_cpus:g} of {plan.cpus:g} CPUs, "
+        f"{plan.planned_memory_mb} of {plan.memory_mb}MB memory"
+    )
+
+    if not config.resources.enabled:
+        click.secho(
+            "Resource limits are disabled. "
+            "Set resources.enabled in the config file to apply them.",
+            fg="yellow",
+        )
+
+
+@inspect_app.command("db-tuning")
+def db_tuning(
+    memory_mb: int | None = typer.Option(
+        None, "--memory", help="Memory (in MB) of the host, overrides the config"
+    ),
+    cpus: int | None = typer.Option(
+        None, help="Number of CPUs of the host, overrides the config"
+    ),
+    profile: str | None = typer.Option(
+        None, help="Workload profile (oltp or mixed), overrides the config"
+    ),
+):
+    """Show the PostgreSQL settings derived from the tuning configuration."""
+    from arkitekt_server.tuning import derive_postgres_tuning
+
+    config = load_yaml_file("arkitekt_server_config.yaml")
+
+    overrides: dict[str, object] = {
+        "memory_mb": memory_mb,
+        "cpus": cpus,
+        "profile": profile,
+    }
+    try:
+        tuning = config.db.tuning.model_validate(
+            {
+                **config.db.tuning.model_dump(),
+                **{k: v for k, v in overrides.items() if v is not None},
+            }
+        )
+    except ValidationError as e:
+        raise typer.BadParameter(str(e))
+
+    derived = derive_postgres_tuning(tuning)
+
+    print(
+        f"Host: {tuning.memory_mb}MB memory, {tuning.cpus} CPUs, "
+        f"{tuning.profile} workload on {tuning.storage}"
+    )
+    for key, value in derived.settings.items():
+        print(f"{key} = {value}")
+    print(f"shm_size = {derived.shm_size_mb}m")
+
+    if not config.db.tuning.enabled:
+        click.secho(
+            "Tuning is disabled, the database runs with the stock settings. "
+            "Set db.tuning.enabled in the config file to apply these values.",
+            fg="yellow",
+        )
+
+
 @init_app.command()
 def minimal():
     """Build a minimal configuration for the Arkitekt server.
@@ -262,13 +371,17 @@ def add():
 
     username = click.prompt("Enter the username for the user", type=str)
 
+    if config.get_user(username) is not None:
+        click.secho(f"User {username} already exists.", fg="red", err=True)
+        raise typer.Exit(code=1)
+
     password = click.prompt(
         "Enter the password for the user", type=str, hide_input=True
     )
 
     email = click.prompt("Enter the email for the user", type=str, default=None)
 
-    config.users.append(
+    config.add_user(
         User(
             username=username,
             password=password,
@@ -281,10 +394,87 @@ def add():
     update_or_create_yaml_file("arkitekt_server_config.yaml", config)
 
 
+@user_app.command("import")
+def import_(
+    path: Path = typer.Argument(..., help="CSV or JSONL file with the users"),
+    format: str | None = typer.Option(
+        None, help="Format of the file (csv or jsonl), guessed from the suffix"
+    ),
+    create_organizations: bool = typer.Option(
+        False, help="Create organizations that don't exist yet"
+    ),
+    batch_size: int | None = typer.Option(
+        None, min=1, help="Number of rows validated at once (default: 1000)"
+    ),
+    dry_run: bool = typer.Option(
+        False, help="Only validate the file, don't change the configuration"
+    ),
+):
+    """Import users from a CSV or JSONL file.
+
+    CSV files have a header with the columns username, password, email,
+    organization, roles (separated by ;) and active_organization. JSONL
+    files have a user object per line. Duplicate and invalid rows are
+    reported and skipped, the configuration is written once at the end.
+    """
+
+    if format is not None and format not in ("csv", "jsonl"):
+        raise typer.BadParameter("Format must be csv or jsonl", param_hint="--format")
+
+    from arkitekt_server.user_import import (
+        DEFAULT_BATCH_SIZE,
+        detect_import_format,
+        import_users,
+        read_import_rows,
+    )
+
+    config = load_or_create_yaml_file("arkitekt_server_config.yaml")
+
+    result = import_users(
+        config,
+        read_import_rows(path, format or detect_import_format(path)),  # type: ignore[arg-type]
+        batch_size=batch_size or DEFAULT_BATCH_SIZE,
+        create_organizations=create_organizations,
+    )
+
+    for issue in result.duplicates:
+        click.secho(
+            f"Line {issue.line}: {issue.username} already exists, skipped",
+            fg="yellow",
+        )
+    for issue in result.invalid:
+        click.secho(
+            f"Line {issue.line}: {issue.username or 'row'} is invalid, skipped: {issue.message}",
+            fg="red",
+        )
+
+    if result.organizations:
+        print(
+            f"Created organizations: {', '.join(o.identifier for o in result.organizations)}"
+        )
+    print(
+        f"Imported {len(result.users)} users "
+        f"({len(result.duplicates)} duplicates, {len(result.invalid)} invalid)"
+    )
+
+    if dry_run:
+        print("Dry run, the configuration was not changed.")
+    elif result.users:
+        update_or_create_yaml_file("arkitekt_server_config.yaml", config)
+
+
 @user_app.command()
 def remove(name: str):
     """Remove a user from the Arkitekt server configuration."""
-    print("Removing user is not implemented yet.")
+
+    config = load_or_create_yaml_file("arkitekt_server_config.yaml")
+
+    if config.remove_user(name) is None:
+        click.secho(f"User {name} does not exist.", fg="red", err=True)
+        raise typer.Exit(code=1)
+
+    update_or_create_yaml_file("arkitekt_server_config.yaml", config)
+    print(f"Removed user {name}.")
 
 
 @service_app.command()
@@ -329,14 +519,177 @@ def kabinet(enable: bool = True):
     click.echo("Kabinet service added with default configuration.")
 
 
+@service_app.command()
+def scale(
+    service: str = typer.Argument(help="Name of the service (e.g. mikro)"),
+    replicas: int = typer.Argument(help="Number of containers running the service"),
+):
+    """Set the number of replicas of a service, the gateway balances between them."""
+
+    config = load_or_create_yaml_file("arkitekt_server_config.yaml")
+
+    service_config = getattr(config, service, None)
+    if not isinstance(service_config, BaseServiceConfig) or not isinstance(
+        service_config, BaseService
+    ):
+        raise typer.BadParameter(f"Unknown service '{service}'", param_hint="SERVICE")
+    if replicas < 1:
+        raise typer.BadParameter("At least one replica is needed", param_hint="REPLICAS")
+
+    service_config.replicas = replicas
+
+    update_or_create_yaml_file("arkitekt_server_config.yaml", config)
+
+    click.echo(f"{service} scaled to {replicas} replica(s).")
+
+
+@service_app.command()
+def processes(
+    service: str = typer.Argument(help="Name of the service (e.g. mikro)"),
+    workers: int | None = typer.Option(
+        None, help="ASGI worker processes per container (default: one per CPU)"
+    ),
+    threads: int | None = typer.Option(None, help="Threads per ASGI worker process"),
+    background_workers: int | None = typer.Option(
+        None, help="Dedicated containers running the background queue"
+    ),
+    worker_command: str | None = typer.Option(
+        None,
+        help="Command of the background workers, {concurrency} is replaced by the jobs per container",
+    ),
+    reset: bool = typer.Option(
+        False, help="Remove the process model, use the defaults of the image"
+    ),
+):
+    """Configure the web and background worker processes of a service."""
+
+    config = load_or_create_yaml_file("arkitekt_server_config.yaml")
+
+    service_config = getattr(config, service, None)
+    if not isinstance(service_config, BaseServiceConfig) or not isinstance(
+        service_config, BaseService
+    ):
+        raise typer.BadParameter(f"Unknown service '{service}'", param_hint="SERVICE")
+
+    if reset:
+        service_config.process_model = None
+    else:
+        process_model = service_config.process_model or ProcessModelConfig()
+        updates = {
+            "web_workers": workers,
+            "threads": threads,
+            "worker_replicas": background_workers,
+            "worker_command": worker_command,
+        }
+        try:
+            service_config.process_model = ProcessModelConfig.model_validate(
+                {
+                    **process_model.model_dump(),
+                    **{k: v for k, v in updates.items() if v is not None},
+                }
+            )
+        except ValidationError as e:
+            raise typer.BadParameter(str(e))
+
+    update_or_create_yaml_file("arkitekt_server_config.yaml", config)
+
+    if service_config.process_model is None:
+        click.echo(f"{service} uses the process model of its image.")
+    else:
+        model = service_config.process_model
+        click.echo(
+            f"{service}: {model.get_web_workers(service_config.replicas)} web worker(s) "
+            f"with {model.threads or 'default'} thread(s), "
+            f"{model.worker_replicas} background worker container(s)."
+        )
+
+
+@service_app.command()
+def pooler(
+    enable: bool = True,
+    pool_mode: str | None = typer.Option(
+        None, help="Pool mode of the pooler (session or transaction)"
+    ),
+    pool_size: int | None = typer.Option(
+        None, help="Maximum number of server connections per database"
+    ),
+):
+    """Put a PgBouncer connection pooler in front of the local database."""
+
+    config = load_or_create_yaml_file("arkitekt_server_config.yaml")
+
+    config.pooler.enabled = enable
+    if pool_mode is not None:
+        if pool_mode not in ("session", "transaction"):
+            raise typer.BadParameter(
+                "Pool mode must be 'session' or 'transaction'", param_hint="--pool-mode"
+            )
+        config.pooler.pool_mode = pool_mode  # type: ignore[assignment]
+    if pool_size is not None:
+        config.pooler.default_pool_size = pool_size
+
+    update_or_create_yaml_file("arkitekt_server_config.yaml", config)
+
+    if enable:
+        click.echo(
+            f"Pooler enabled ({config.pooler.pool_mode} pooling, "
+            f"{config.pooler.default_pool_size} connections per database)."
+        )
+    else:
+        click.echo("Pooler disabled.")
+
+
+@keys_app.command()
+def fill(size: int = 10):
+    """Pre-generate key pairs for the on-disk key pool.
+
+    Set ARKITEKT_SERVER_KEY_PROVIDER=pool to build new deployments with keys from the pool.
+    """
+    from arkitekt_server.keys import PoolKeyProvider
+
+    pool = PoolKeyProvider()
+    generated = pool.fill(size)
+
+    click.echo(f"Generated {generated} key pairs, {pool.size()} available in {pool.directory}")
+
+
 @build_app.command()
-def docker(path: Path = Path("."), yes: bool = False):
-    """Build the Docker image for the Arkitekt server."""
+def docker(
+    path: Path = Path("."),
+    yes: bool = False,
+    force: bool = False,
+    timings: bool = False,
+):
+    """Build the Docker image for the Arkitekt server.
+
+    Only artifacts whose inputs changed since the last build are regenerated,
+    use --force to regenerate all of them.
+    """
+    from arkitekt_server.diff import run_dry_run_diff
+    from arkitekt_server.resources import ResourcePlanError
+    from arkitekt_server.tuning import PoolSizeError
 
     # load the yaml file
     config = load_or_create_yaml_file("arkitekt_server_config.yaml")
 
-    run_dry_run_diff(config, path, allow_deletes=False, yes=yes)
+    for problem in config.validate_references():
+        click.secho(f"Warning: {problem}", fg="yellow", err=True)
+
+    try:
+        run_dry_run_diff(
+            config,
+            path,
+            allow_deletes=False,
+            yes=yes,
+            force=force,
+            show_timings=timings,
+        )
+    except ResourcePlanError as e:
+        click.secho(f"Invalid resource plan: {e}", fg="red", err=True)
+        raise typer.Exit(code=1)
+    except PoolSizeError as e:
+        click.secho(f"Invalid pooler configuration: {e}", fg="red", err=True)
+        raise typer.Exit(code=1)
 
 
 @build_app.command()
@@ -364,20 +717,118 @@ def migrate():
 
 
 @app.command()
-def start():
-    """Start the Arkitekt server (with Docker Compose)."""
+def start(
+    only_changed: bool = False,
+    measure: bool = typer.Option(
+        False,
+        "--measure",
+        help="Start in the background and measure how long every service takes to get healthy",
+    ),
+    timeout: float = typer.Option(
+        300, help="Seconds to wait for the services to get healthy (with --measure)"
+    ),
+    json_path: Path | None = typer.Option(
+        None, "--json", help="Write the measurement to this JSON file (with --measure)"
+    ),
+):
+    """Start the Arkitekt server (with Docker Compose).
+
+    With --only-changed, only the services affected by the last build are
+    recreated (in the background), all other services keep running.
+
+    With --measure, the services are started in the background and their
+    health endpoints are polled until every service is healthy. The time to
+    healthy of every service is printed as a timeline, with the services on
+    the critical path marked with a *.
+    """
+    from arkitekt_server.build import clear_restart_plan, load_restart_plan
 
     # load the yaml file
     config = load_yaml_file("arkitekt_server_config.yaml")
 
+    plan = load_restart_plan(Path("."))
+
+    if only_changed:
+        if not plan.services and not plan.removed:
+            click.echo("Nothing changed since the last start.")
+            return
+
+        command = ["docker", "compose", "up", "-d", "--no-deps"]
+        if plan.removed:
+            command.append("--remove-orphans")
+        command += list(plan.services)
+    else:
+        command = ["docker", "compose", "up"]
+        if measure:
+            command.append("-d")
+
+    # The plan is only cleared once compose succeeded (a full start brings
+    # every service up to date), so a failed start can be retried
+    if measure:
+        measure_start(config, command, timeout, json_path)
+        clear_restart_plan(Path("."))
+        return
+
     try:
-        subprocess.run(["docker", "compose", "up"], check=True)
+        subprocess.run(command, check=True)
+        clear_restart_plan(Path("."))
     except subprocess.CalledProcessError as e:
         # Print the error message (this will show stderr live)
         click.secho("❌ Failed to start docker compose:", fg="red", bold=True)
         raise typer.Exit(code=e.returncode)
 
 
+def measure_start(
+    config: ArkitektServerConfig,
+    command: list[str],
+    timeout: float,
+    json_path: Path | None,
+):
+    """Run docker compose in the background and measure the cold start of the services."""
+    from arkitekt_server.diff import create_docker_compose
+    from arkitekt_server.measure import (
+        build_startup_probes,
+        format_timeline,
+        measure_startup,
+    )
+    from arkitekt_server.serialization import load_yaml
+
+    compose_file = Path("docker-compose.yaml")
+    if compose_file.exists():
+        compose = load_yaml(compose_file.read_bytes())
+    else:
+        compose = create_docker_compose(config)
+    probes = build_startup_probes(config, compose)
+
+    # Compose waits for healthy dependencies before it returns, so the
+    # services are polled while it is still starting containers
+    start = time.monotonic()
+    process = subprocess.Popen(command)
+    report = measure_startup(probes, timeout=timeout, start=start, process=process)
+    returncode = process.wait()
+    report.compose_seconds = round(time.monotonic() - start, 3)
+    if returncode != 0:
+        click.secho("❌ Failed to start docker compose:", fg="red", bold=True)
+        raise typer.Exit(code=returncode)
+
+    for line in format_timeline(report):
+        print(line)
+    if report.critical_path:
+        print(f"Critical path: {' -> '.join(report.critical_path)}")
+
+    if json_path:
+        json_path.write_text(report.model_dump_json(indent=2))
+        print(f"Measurement written to {json_path}")
+
+    if not report.healthy:
+        pending = [s.name for s in report.services if s.seconds is None]
+        click.secho(
+            f"Not healthy after {timeout:g}s: {', '.join(pending)}", fg="red", bold=True
+        )
+        raise typer.Exit(code=1)
+    print(f"All services healthy after {report.total_seconds:.1f}s")
+
+
 @app.command()
 def update():
     """Update the Arkitekt server by pulling the latest images."""
@@ -0,0 +1,312 @@
+import json
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from typing import Any, Callable, Literal
+
+from pydantic import BaseModel, Field
+
+from .build import get_depends_on
+from .config import ArkitektServerConfig
+from .utils import get_package_version
+
+
+ProbeKind = Literal["http", "compose"]
+
+
+class StartupProbe(BaseModel):
+    """
+    How to find out if a service is healthy.
+
+    Attributes:
+        name: The name of the Docker Compose service
+        kind: http polls the health endpoint of the service through the gateway,
+            compose reads the healthcheck status of the container
+        url: The health endpoint (only for http probes)
+        depends_on: The measured services the service waits for
+    """
+
+    name: str
+    kind: ProbeKind
+    url: str | None = None
+    depends_on: list[str] = Field(default_factory=list)
+
+
+class ServiceStartup(BaseModel):
+    """
+    Measured cold start of a single service.
+
+    Attributes:
+        name: The name of the Docker Compose service
+        kind: The kind of probe the service was measured with
+        seconds: Seconds from the start of Docker Compose until the service was healthy
+            (None if it didn't get healthy before the timeout)
+    """
+
+    name: str
+    kind: ProbeKind
+    seconds: float | None = None
+
+
+class StartupReport(BaseModel):
+    """
+    Cold start measurement of a deployment.
+
+    Attributes:
+        version: Version of arkitekt-server that measured the start
+        created: When the measurement was started
+        timeout: Seconds the services were given to get healthy
+        compose_seconds: Seconds until docker compose up returned
+        services: The measured services, in the order they got healthy
+        critical_path: The chain of services that determined the total start time
+    """
+
+    version: str
+    created: datetime
+    timeout: float
+    compose_seconds: float | None = None
+    services: list[ServiceStartup] = Field(default_factory=list)
+    critical_path: list[str] = Field(default_factory=list)
+
+    @property
+    def healthy(self) -> bool:
+        return all(service.seconds is not None for service in self.services)
+
+    @property
+    def total_seconds(self) -> float | None:
+        if not self.services or not self.healthy:
+            return None
+        return max(service.seconds or 0 for service in self.services)
+
+
+def build_startup_probes(
+    config: ArkitektServerConfig, compose: dict[str, Any]
+) -> list[StartupProbe]:
+    """
+    Build the probes for every service of a deployment that reports its health.
+
+    The Arkitekt services are polled through the gateway, on the same
+    /<service>/ht endpoints the healthchecks use. Infrastructure services
+    with a Docker healthcheck (database, Redis, MinIO) are measured through
+    the status Docker Compose reports for them.
+
+    Args:
+        config: The main Arkitekt server configuration
+        compose: The Docker Compose definition of the deployment
+
+    Returns:
+        The probes, one per measured service
+    """
+    from .diff import iterate_service
+
+    services: dict[str, Any] = compose["services"]
+    base_url = f"http://localhost:{config.gateway.exposed_http_port}"
+
+    probes: dict[str, StartupProbe] = {}
+    for service in iterate_service(config):
+        if service.host in services:
+            probes[service.host] = StartupProbe(
+                name=service.host,
+                kind="http",
+                url=f"{base_url}/{service.host}/ht",
+            )
+    for name, definition in services.items():
+        if name not in probes and "healthcheck" in definition:
+            probes[name] = StartupProbe(name=name, kind="compose")
+
+    for probe in probes.values():
+        probe.depends_on = [
+            name for name in get_depends_on(services[probe.name]) if name in probes
+        ]
+    return list(probes.values())
+
+
+def probe_url(url: str, timeout: float = 2) -> bool:
+    """Check if a health endpoint answers with a successful status code."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return 200 <= response.status < 300
+    except (urllib.error.URLError, OSError, ValueError):
+        return False
+
+
+def get_compose_health() -> dict[str, str]:
+    """
+    Get the health of the running Docker Compose services.
+
+    Returns:
+        The health (e.g. starting, healthy) of every service with a healthcheck
+    """
+    result = subprocess.run(
+        ["docker", "compose", "ps", "--all", "--format", "json"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return {}
+
+    output = result.stdout.strip()
+    # Older versions of Docker Compose print a JSON array, newer ones a line per container
+    if output.startswith("["):
+        containers = json.loads(output)
+    else:
+        containers = [json.loads(line) for line in output.splitlines() if line]
+
+    health: dict[str, str] = {}
+    for container in containers:
+        state = container.get("Health")
+        if state:
+            # With replicas, a service is only healthy once all containers are
+            if health.get(container["Service"], "healthy") == "healthy":
+                health[container["Service"]] = state
+    return health
+
+
+def poll_healthy(probes: list[StartupProbe]) -> set[str]:
+    """
+    Check which of the services are healthy.
+
+    Args:
+        probes: The probes of the services to check
+
+    Returns:
+        The names of the healthy services
+    """
+    healthy: set[str] = set()
+    compose_health = (
+        get_compose_health() if any(p.kind == "compose" for p in probes) else {}
+    )
+    for probe in probes:
+        if probe.kind == "http":
+            if probe.url and probe_url(probe.url):
+                healthy.add(probe.name)
+        elif compose_health.get(probe.name) == "healthy":
+            healthy.add(probe.name)
+    return healthy
+
+
+def find_critical_path(
+    probes: list[StartupProbe], seconds: dict[str, float | None]
+) -> list[str]:
+    """
+    Find the chain of services that determined the start time.
+
+    Starts at the service that got healthy last and follows the dependency
+    it had to wait for the longest, until a service without (measured)
+    dependencies is reached.
+
+    Args:
+        probes: The probes, with the dependencies of every service
+        seconds: The measured time to healthy of every service
+
+    Returns:
+        The names of the services on the critical path, first started first
+    """
+    if not seconds:
+        return []
+
+    dependencies = {probe.name: probe.depends_on for probe in probes}
+
+    def finish(name: str) -> float:
+        # Services that never got healthy are the end of every path
+        value = seconds.get(name)
+        return float("inf") if value is None else value
+
+    current: str | None = max(seconds, key=finish)
+    path: list[str] = []
+    while current is not None and current not in path:
+        path.append(current)
+        waited_for = [name for name in dependencies.get(current, []) if name in seconds]
+        current = max(waited_for, key=finish) if waited_for else None
+    return list(reversed(path))
+
+
+def measure_startup(
+    probes: list[StartupProbe],
+    timeout: float = 300,
+    interval: float = 0.5,
+    poll: Callable[[list[StartupProbe]], set[str]] = poll_healthy,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+    start: float | None = None,
+    process: subprocess.Popen[Any] | None = None,
+) -> StartupReport:
+    """
+    Poll the services until all of them are healthy, and record when they got healthy.
+
+    Args:
+        probes: The probes of the services to measure
+        timeout: Seconds to wait for the services to get healthy
+        interval: Seconds between two polls
+        poll: Function returning the healthy services among the pending ones
+        clock: Monotonic clock in seconds
+        sleep: Function to wait between two polls
+        start: Clock time the start of Docker Compose began (defaults to now)
+        process: The running docker compose up, polling stops as soon as it fails
+
+    Returns:
+        The startup report, without the time Docker Compose took to return
+    """
+    created = datetime.now(timezone.utc)
+    if start is None:
+        start = clock()
+
+    seconds: dict[str, float | None] = {probe.name: None for probe in probes}
+    pending = list(probes)
+    while pending:
+        now = clock()
+        for name in poll(pending):
+            seconds[name] = round(now - start, 3)
+        pending = [probe for probe in pending if seconds[probe.name] is None]
+        if not pending or clock() - start >= timeout:
+            break
+        if process is not None and process.poll() not in (None, 0):
+            # Compose failed, the remaining services won't get healthy
+            break
+        sleep(interval)
+
+    services = [
+        ServiceStartup(name=probe.name, kind=probe.kind, seconds=seconds[probe.name])
+        for probe in probes
+    ]
+    services.sort(key=lambda s: float("inf") if s.seconds is None else s.seconds)
+
+    return StartupReport(
+        version=get_package_version(),
+        created=created,
+        timeout=timeout,
+        services=services,
+        critical_path=find_critical_path(probes, seconds),
+    )
+
+
+def format_timeline(report: StartupReport, width: int = 40) -> list[str]:
+    """
+    Format the start of the services as a timeline.
+
+    Args:
+        report: The startup report
+        width: Width of the bar of the slowest service
+
+    Returns:
+        The lines of the timeline, one per service
+    """
+    longest = max(
+        [s.seconds for s in report.services if s.seconds is not None] or [1.0]
+    )
+    longest = max(longest, 0.001)
+    name_width = max([len(s.name) for s in report.services] + [7])
+
+    lines = []
+    for service in report.services:
+        marker = "*" if service.name in report.critical_path else " "
+        if service.seconds is None:
+            lines.append(f"{marker} {service.name:<{name_width}}   timed out")
+            continue
+        bar = "█" * max(round(service.seconds / longest * width), 1)
+        lines.append(
+            f"{marker} {service.name:<{name_width}} {service.seconds:>7.1f}s {bar}"
+        )
+    return lines
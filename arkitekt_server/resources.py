@@ -0,0 +1,192 @@
+import math
+from typing import Any
+
+from pydantic import BaseModel
+
+from .config import (
+    ResourcePlanConfig,
+    ServiceResourceConfig,
+    get_cpu_count,
+    get_memory_mb,
+)
+
+
+# Smallest limits a service can get, below them most services won't start
+MIN_CPUS = 0.1
+MIN_MEMORY_MB = 64
+
+
+class ResourcePlanError(ValueError):
+    """Raised when the services don't fit into the resources of the host."""
+
+
+class ServiceResources(BaseModel):
+    """
+    Planned resources of a single Docker Compose service.
+
+    Limits and reservations are per container, so the resources of a
+    service with replicas are split between its containers.
+
+    Attributes:
+        name: The name of the Docker Compose service
+        weight: The weight of the service (None if its limits are explicit)
+        replicas: Number of containers running the service
+        cpus: CPU limit per container
+        memory_mb: Memory limit per container in MB
+        reserved_cpus: Reserved CPUs per container
+        reserved_memory_mb: Reserved memory per container in MB
+        cpuset: CPUs the containers are pinned to
+    """
+
+    name: str
+    weight: float | None
+    replicas: int
+    cpus: float
+    memory_mb: int
+    reserved_cpus: float
+    reserved_memory_mb: int
+    cpuset: str | None = None
+
+
+class ResourcePlan(BaseModel):
+    """
+    Resources of all services of a deployment.
+
+    Attributes:
+        cpus: CPUs of the host
+        memory_mb: Memory of the host in MB
+        services: The planned resources of every service
+    """
+
+    cpus: float
+    memory_mb: int
+    services: list[ServiceResources]
+
+    @property
+    def planned_cpus(self) -> float:
+        return sum(s.cpus * s.replicas for s in self.services)
+
+    @property
+    def planned_memory_mb(self) -> int:
+        return sum(s.memory_mb * s.replicas for s in self.services)
+
+
+def floor_cpus(cpus: float) -> float:
+    """Round CPUs down to two decimals, so the rounded limits still fit."""
+    return math.floor(cpus * 100) / 100
+
+
+def plan_resources(
+    plan_config: ResourcePlanConfig, compose_services: dict[str, Any]
+) -> ResourcePlan:
+    """
+    Split the resources of the host between the Docker Compose services.
+
+    Explicit limits are taken as they are. The remaining CPUs and memory
+    are shared by the other services according to their weights. Without
+    explicit resources of the host, the resources of this machine are used.
+
+    Args:
+        plan_config: The resources of the host and the per-service settings
+        compose_services: The services of the Docker Compose definition
+
+    Returns:
+        The resource plan
+
+    Raises:
+        ResourcePlanError: If the explicit limits exceed the host, or a service would get less than the minimum
+    """
+    settings: dict[str, ServiceResourceConfig] = {
+        name: plan_config.services.get(name, ServiceResourceConfig())
+        for name in compose_services
+    }
+    replicas = {
+        name: int(definition.get("deploy", {}).get("replicas", 1))
+        for name, definition in compose_services.items()
+    }
+
+    explicit_cpus = sum(
+        s.cpus * replicas[name] for name, s in settings.items() if s.cpus is not None
+    )
+    explicit_memory = sum(
+        s.memory_mb * replicas[name]
+        for name, s in settings.items()
+        if s.memory_mb is not None
+    )
+    host_cpus = plan_config.cpus or float(get_cpu_count())
+    host_memory_mb = plan_config.memory_mb or get_memory_mb()
+    if explicit_cpus > host_cpus:
+        raise ResourcePlanError(
+            f"The explicit CPU limits ({explicit_cpus:g}) exceed the CPUs of the host ({host_cpus:g})"
+        )
+    if explicit_memory > host_memory_mb:
+        raise ResourcePlanError(
+            f"The explicit memory limits ({explicit_memory}MB) exceed the memory of the host ({host_memory_mb}MB)"
+        )
+
+    cpu_weights = sum(s.weight for s in settings.values() if s.cpus is None)
+    memory_weights = sum(s.weight for s in settings.values() if s.memory_mb is None)
+    free_cpus = host_cpus - explicit_cpus
+    free_memory = host_memory_mb - explicit_memory
+
+    services: list[ServiceResources] = []
+    for name, s in settings.items():
+        count = replicas[name]
+        if s.cpus is not None:
+            cpus = s.cpus
+        else:
+            cpus = floor_cpus(free_cpus * s.weight / cpu_weights / count)
+        if s.memory_mb is not None:
+            memory_mb = s.memory_mb
+        else:
+            memory_mb = int(free_memory * s.weight / memory_weights / count)
+
+        if cpus < MIN_CPUS or memory_mb < MIN_MEMORY_MB:
+            raise ResourcePlanError(
+                f"{name} would only get {cpus:g} CPUs and {memory_mb}MB per container "
+                f"(minimum {MIN_CPUS:g} CPUs and {MIN_MEMORY_MB}MB). "
+                "Add resources to the host or lower the limits of other services"
+            )
+
+        services.append(
+            ServiceResources(
+                name=name,
+                weight=s.weight if s.cpus is None or s.memory_mb is None else None,
+                replicas=count,
+                cpus=cpus,
+                memory_mb=memory_mb,
+                reserved_cpus=floor_cpus(cpus * plan_config.reservation_ratio),
+                reserved_memory_mb=int(memory_mb * plan_config.reservation_ratio),
+                cpuset=s.cpuset,
+            )
+        )
+
+    return ResourcePlan(
+        cpus=host_cpus, memory_mb=host_memory_mb, services=services
+    )
+
+
+def apply_resource_plan(plan: ResourcePlan, compose_services: dict[str, Any]) -> None:
+    """
+    Write the limits and reservations of a plan into the Docker Compose services.
+
+    Args:
+        plan: The resource plan
+        compose_services: The services of the Docker Compose definition, updated in place
+    """
+    for resources in plan.services:
+        definition = compose_services[resources.name]
+        limits: dict[str, Any] = {
+            "cpus": f"{resources.cpus:g}",
+            "memory": f"{resources.memory_mb}M",
+        }
+        reservations: dict[str, Any] = {"memory": f"{resources.reserved_memory_mb}M"}
+        if resources.reserved_cpus > 0:
+            reservations["cpus"] = f"{resources.reserved_cpus:g}"
+
+        definition["deploy"] = {
+            **definition.get("deploy", {}),
+            "resources": {"limits": limits, "reservations": reservations},
+        }
+        if resources.cpuset is not None:
+            definition["cpuset"] = resources.cpuset
@@ -0,0 +1,286 @@
+import hashlib
+import itertools
+import json
+from typing import IO, Any, Callable, Iterable, Iterator, Literal
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML was built without libyaml
+    from yaml import SafeDumper, SafeLoader  # type: ignore[assignment]
+
+
+HAS_LIBYAML: bool = SafeLoader is not yaml.SafeLoader
+
+# Number of items of a lazy sequence that are serialized at once
+STREAM_BATCH_SIZE = 256
+
+
+class LazySequence:
+    """
+    A sequence in a document that is only created while it is serialized.
+
+    Large lists (e.g. the users of a deployment) can be put into a document
+    as a lazy sequence, so their items are created and serialized one batch
+    at a time instead of being held in memory as a whole. The factory is
+    called every time the sequence is iterated, so the sequence can be
+    serialized and hashed more than once.
+
+    Attributes:
+        factory: Function returning an iterable over the items
+    """
+
+    def __init__(self, factory: Callable[[], Iterable[Any]]):
+        self.factory = factory
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.factory())
+
+
+class StreamingDumper(SafeDumper):  # type: ignore[misc, valid-type]
+    """Dumper that serializes nested lazy sequences like lists."""
+
+
+StreamingDumper.add_representer(
+    LazySequence, lambda dumper, data: dumper.represent_list(list(data))
+)
+
+ConfigFormat = Literal["yaml", "json"]
+
+# Formats of generated files, JSONL is only used for data files (e.g. seeds)
+ArtifactFormat = Literal["yaml", "json", "jsonl"]
+
+# Placeholder of the hash in the header of a JSONL file, filled in once all records are written
+JSONL_HEADER = '{"sha256": "%s"}\n'
+
+
+def load_yaml(stream: str | bytes | IO[str] | IO[bytes]) -> Any:
+    """
+    Load a YAML document.
+
+    Uses the libyaml based loader if it is available, and falls back to the
+    pure Python loader otherwise.
+    """
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump_yaml(data: Any, stream: IO[str] | None = None) -> str | None:
+    """
+    Dump data as a YAML document.
+
+    Uses the libyaml based dumper if it is available, and falls back to the
+    pure Python dumper otherwise. The output is the same as yaml.dump with
+    default_flow_style=False.
+
+    Args:
+        data: The data to dump
+        stream: An optional stream to write to. If None, the document is returned
+
+    Returns:
+        The YAML document, or None if a stream was given
+    """
+    return yaml.dump(data, stream, Dumper=StreamingDumper, default_flow_style=False)
+
+
+def dump_json(data: Any) -> str:
+    """
+    Dump data as a JSON document.
+
+    Keys are sorted like in the YAML output. As JSON is a subset of YAML,
+    the document can still be read by consumers expecting a YAML file.
+    """
+    return "".join(iterate_json(data, indent=2)) + "\n"
+
+
+def dump_config(data: Any, format: ConfigFormat = "yaml") -> str:
+    """
+    Dump a configuration document in the given format.
+
+    Args:
+        data: The data to dump
+        format: The format of the document (yaml or json)
+
+    Returns:
+        The serialized document
+    """
+    return "".join(iterate_config(data, format))
+
+
+def iterate_config(data: Any, format: ConfigFormat = "yaml") -> Iterator[str]:
+    """
+    Serialize a configuration document in chunks.
+
+    The chunks add up to the same document as dump_config, but lazy
+    sequences are serialized a batch at a time.
+
+    Args:
+        data: The data to dump
+        format: The format of the document (yaml or json)
+
+    Returns:
+        An iterator over the chunks of the document
+    """
+    if format == "json":
+        yield from iterate_json(data, indent=2)
+        yield "\n"
+    else:
+        yield from iterate_yaml(data)
+
+
+def iterate_batches(items: Iterable[Any]) -> Iterator[list[Any]]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, STREAM_BATCH_SIZE)):
+        yield batch
+
+
+def iterate_yaml(data: Any) -> Iterator[str]:
+    """
+    Serialize data as a YAML document in chunks.
+
+    Lazy sequences are streamed if they are the document, or a value of
+    the top-level mapping. Block sequences in a mapping are not indented,
+    so a sequence dumped batch by batch is the same as the sequence dumped
+    in one go. Lazy sequences nested deeper are serialized as a whole.
+
+    Args:
+        data: The data to dump
+
+    Returns:
+        An iterator over the chunks of the document, adding up to dump_yaml(data)
+    """
+    if isinstance(data, LazySequence):
+        empty = True
+        for batch in iterate_batches(data):
+            empty = False
+            yield dump_yaml(batch)  # type: ignore[misc]
+        if empty:
+            yield dump_yaml([])  # type: ignore[misc]
+        return
+
+    if not isinstance(data, dict) or not any(
+        isinstance(value, LazySequence) for value in data.values()
+    ):
+        yield dump_yaml(data)  # type: ignore[misc]
+        return
+
+    for key in sorted(data):
+        value = data[key]
+        if not isinstance(value, LazySequence):
+            yield dump_yaml({key: value})  # type: ignore[misc]
+            continue
+
+        batches = iterate_batches(value)
+        first = next(batches, None)
+        if first is None:
+            yield dump_yaml({key: []})  # type: ignore[misc]
+            continue
+        # The key line, as the dumper writes it in front of a block sequence
+        marker = dump_yaml([None])
+        yield dump_yaml({key: [None]})[: -len(marker)]  # type: ignore[index, arg-type]
+        yield dump_yaml(first)  # type: ignore[misc]
+        for batch in batches:
+            yield dump_yaml(batch)  # type: ignore[misc]
+
+
+def contains_lazy(data: Any) -> bool:
+    """Check if there is a lazy sequence anywhere in the data."""
+    if isinstance(data, LazySequence):
+        return True
+    if isinstance(data, dict):
+        return any(contains_lazy(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(contains_lazy(value) for value in data)
+    return False
+
+
+def iterate_json(
+    data: Any,
+    indent: int | None = None,
+    default: Callable[[Any], Any] | None = None,
+    level: int = 0,
+) -> Iterator[str]:
+    """
+    Serialize data as JSON with sorted keys in chunks.
+
+    Dictionaries and lists containing lazy sequences are written piece by
+    piece, lazy sequences item by item. Everything else is serialized with
+    json.dumps, so the chunks add up to the same document.
+
+    Args:
+        data: The data to dump
+        indent: The indentation, as for json.dumps
+        default: Function serializing otherwise unserializable objects, as for json.dumps
+        level: The nesting level of the data (for the indentation)
+
+    Returns:
+        An iterator over the chunks of the document, adding up to
+        json.dumps(data, indent=indent, sort_keys=True, default=default)
+    """
+    if not contains_lazy(data):
+        document = json.dumps(data, indent=indent, sort_keys=True, default=default)
+        if indent is not None and level:
+            document = document.replace("\n", "\n" + " " * (indent * level))
+        yield document
+        return
+
+    if isinstance(data, dict):
+        opening, closing = "{", "}"
+        items: Iterable[tuple[str | None, Any]] = (
+            (key, data[key]) for key in sorted(data)
+        )
+    else:
+        opening, closing = "[", "]"
+        items = ((None, item) for item in data)
+
+    if indent is None:
+        separator, newline, inner, outer = ", ", "", "", ""
+    else:
+        separator, newline = ",", "\n"
+        inner = " " * (indent * (level + 1))
+        outer = " " * (indent * level)
+
+    yield opening
+    empty = True
+    for key, value in items:
+        yield (newline if empty else separator + newline) + inner
+        empty = False
+        if key is not None:
+            yield json.dumps(key) + ": "
+        yield from iterate_json(value, indent, default, level + 1)
+    yield closing if empty else newline + outer + closing
+
+
+def dump_jsonl(records: Iterable[Any], stream: IO[str]) -> str:
+    """
+    Write records as JSON lines, one record per line.
+
+    The records are written one by one, so they can come from a generator
+    and the document is never held in memory as a whole. The first line is
+    a header with the SHA-256 hash of the record lines, which lets
+    consumers skip the file if they already processed the same records.
+    The header has a fixed length, so it is written first and filled in
+    once all records are written.
+
+    Args:
+        records: The JSON serializable records
+        stream: A seekable text stream to write to
+
+    Returns:
+        The hex digest of the SHA-256 hash of the record lines
+    """
+    start = stream.tell()
+    stream.write(JSONL_HEADER % ("0" * 64))
+
+    digest = hashlib.sha256()
+    for record in records:
+        line = json.dumps(record, sort_keys=True, separators=(",", ":")) + "\n"
+        digest.update(line.encode())
+        stream.write(line)
+
+    end = stream.tell()
+    stream.seek(start)
+    stream.write(JSONL_HEADER % digest.hexdigest())
+    stream.seek(end)
+    return digest.hexdigest()
@@ -0,0 +1,240 @@
+import math
+
+from pydantic import BaseModel, Field
+
+from .config import PoolerConfig, PostgresTuningConfig, RedisTuningConfig
+
+
+# max_connections of PostgreSQL if it isn't tuned
+DEFAULT_MAX_CONNECTIONS = 100
+# Connections PostgreSQL keeps for superusers (superuser_reserved_connections)
+SUPERUSER_RESERVED_CONNECTIONS = 3
+
+
+class PoolSizeError(ValueError):
+    """Raised when the pools of the pooler don't fit into the connections of PostgreSQL."""
+
+
+def format_memory(kb: int) -> str:
+    """
+    Format an amount of memory in the units PostgreSQL understands.
+
+    Args:
+        kb: The amount of memory in kB
+
+    Returns:
+        The amount in the largest unit it is a whole multiple of (e.g. 2GB, 512MB, 640kB)
+    """
+    if kb >= 1024 * 1024 and kb % (1024 * 1024) == 0:
+        return f"{kb // (1024 * 1024)}GB"
+    if kb >= 1024 and kb % 1024 == 0:
+        return f"{kb // 1024}MB"
+    return f"{kb}kB"
+
+
+class PostgresTuning(BaseModel):
+    """
+    Derived performance settings of the local PostgreSQL server.
+
+    Attributes:
+        settings: The server settings, as passed to postgres -c
+        shm_size_mb: Size of /dev/shm of the container in MB
+    """
+
+    settings: dict[str, str] = Field(default_factory=dict)
+    shm_size_mb: int
+
+    def to_command(self) -> list[str]:
+        """Build the command of the database container that applies the settings."""
+        command = ["postgres"]
+        for key, value in self.settings.items():
+            command += ["-c", f"{key}={value}"]
+        return command
+
+
+def derive_postgres_tuning(tuning: PostgresTuningConfig) -> PostgresTuning:
+    """
+    Derive the PostgreSQL settings for the resources and workload of a host.
+
+    The formulas follow pgtune: a quarter of the memory goes to
+    shared_buffers, the remaining memory is split between the connections
+    for work_mem, and parallel workers are only configured for hosts with
+    at least four CPUs.
+
+    Args:
+        tuning: The resources of the host and the workload profile
+
+    Returns:
+        The derived settings
+    """
+    memory_kb = tuning.memory_mb * 1024
+    cpus = max(tuning.cpus, 1)
+    oltp = tuning.profile == "oltp"
+
+    max_connections = tuning.max_connections or (300 if oltp else 100)
+    shared_buffers_kb = memory_kb // 4
+    effective_cache_size_kb = memory_kb * 3 // 4
+    maintenance_work_mem_kb = min(memory_kb // 16, 2 * 1024 * 1024)
+
+    # 3% of shared_buffers, rounded up to 16MB as recommended once it gets close
+    wal_buffers_kb = shared_buffers_kb * 3 // 100
+    if wal_buffers_kb > 14 * 1024:
+        wal_buffers_kb = 16 * 1024
+    wal_buffers_kb = max(wal_buffers_kb, 32)
+
+    parallel_workers_per_gather = min(math.ceil(cpus / 2), 4)
+    work_mem_kb = (memory_kb - shared_buffers_kb) // (max_connections * 3)
+    if cpus >= 4:
+        work_mem_kb //= parallel_workers_per_gather
+    if not oltp:
+        work_mem_kb //= 2
+    work_mem_kb = max(work_mem_kb, 64)
+
+    settings: dict[str, str] = {
+        "max_connections": str(max_connections),
+        "shared_buffers": format_memory(shared_buffers_kb),
+        "effective_cache_size": format_memory(effective_cache_size_kb),
+        "maintenance_work_mem": format_memory(maintenance_work_mem_kb),
+        "checkpoint_completion_target": "0.9",
+        "wal_buffers": format_memory(wal_buffers_kb),
+        "default_statistics_target": "100",
+        "random_page_cost": "1.1" if tuning.storage == "ssd" else "4",
+        "effective_io_concurrency": "200" if tuning.storage == "ssd" else "2",
+        "work_mem": format_memory(work_mem_kb),
+        "min_wal_size": "2GB" if oltp else "1GB",
+        "max_wal_size": "8GB" if oltp else "4GB",
+    }
+
+    if cpus >= 4:
+        settings["max_worker_processes"] = str(cpus)
+        settings["max_parallel_workers_per_gather"] = str(parallel_workers_per_gather)
+        settings["max_parallel_workers"] = str(cpus)
+        settings["max_parallel_maintenance_workers"] = str(parallel_workers_per_gather)
+
+    # Parallel queries allocate dynamic shared memory in /dev/shm, which Docker
+    # limits to 64MB. Size it like shared_buffers, so it never is the bottleneck,
+    # but never above the memory PostgreSQL can use
+    shm_size_mb = min(max(shared_buffers_kb // 1024, 128), tuning.memory_mb)
+
+    return PostgresTuning(settings=settings, shm_size_mb=shm_size_mb)
+
+
+def get_max_connections(tuning: PostgresTuningConfig) -> int:
+    """
+    Get the max_connections of the local PostgreSQL server.
+
+    Args:
+        tuning: The tuning of the local database
+
+    Returns:
+        The derived max_connections if the database is tuned, the stock default otherwise
+    """
+    if not tuning.enabled:
+        return DEFAULT_MAX_CONNECTIONS
+    return int(derive_postgres_tuning(tuning).settings["max_connections"])
+
+
+class PoolSizes(BaseModel):
+    """
+    Sizes of the pools of the connection pooler.
+
+    Attributes:
+        default_pool_size: Server connections per database without an explicit pool size
+        max_user_connections: Server connections the pooler opens in total
+    """
+
+    default_pool_size: int
+    max_user_connections: int
+
+
+def plan_pool_sizes(
+    pooler: PoolerConfig, tuning: PostgresTuningConfig, db_names: list[str]
+) -> PoolSizes:
+    """
+    Size the pools of the pooler to fit into the connections of PostgreSQL.
+
+    All databases are accessed by the same user, so every database has a
+    single pool, which opens up to pool_size + reserve_pool_size server
+    connections (capped by max_db_connections). Without a default_pool_size,
+    the connections left by the databases with an explicit pool size are
+    split evenly between the other databases.
+
+    Args:
+        pooler: The configuration of the pooler
+        tuning: The tuning of the local database
+        db_names: The names of the local databases
+
+    Returns:
+        The pool sizes
+
+    Raises:
+        PoolSizeError: If the pools can open more server connections than PostgreSQL allows
+    """
+    max_connections = get_max_connections(tuning)
+    available = max_connections - SUPERUSER_RESERVED_CONNECTIONS
+
+    def get_connections(db_name: str, default_pool_size: int) -> int:
+        override = pooler.databases.get(db_name)
+        pool_size = default_pool_size
+        limit = pooler.max_db_connections
+        if override and override.pool_size is not None:
+            pool_size = override.pool_size
+        if override and override.max_db_connections is not None:
+            limit = override.max_db_connections
+        connections = pool_size + pooler.reserve_pool_size
+        return min(connections, limit) if limit else connections
+
+    default_pool_size = pooler.default_pool_size
+    if default_pool_size is None:
+        explicit = [
+            name
+            for name in db_names
+            if name in pooler.databases
+            and pooler.databases[name].pool_size is not None
+        ]
+        left = available - sum(get_connections(name, 0) for name in explicit)
+        shared = len(db_names) - len(explicit)
+        default_pool_size = left // max(shared, 1) - pooler.reserve_pool_size
+        if shared and default_pool_size < 1:
+            raise PoolSizeError(
+                f"The pools of {shared} databases don't fit into the {left} "
+                f"connections PostgreSQL has left for them, lower reserve_pool_size "
+                f"or raise db.tuning.max_connections"
+            )
+        default_pool_size = max(default_pool_size, 1)
+
+    total = sum(get_connections(name, default_pool_size) for name in db_names)
+    if total > available:
+        raise PoolSizeError(
+            f"The pools can open {total} server connections, but PostgreSQL only "
+            f"allows {available} (max_connections {max_connections} minus "
+            f"{SUPERUSER_RESERVED_CONNECTIONS} reserved for superusers), lower "
+            f"the pool sizes or raise db.tuning.max_connections"
+        )
+
+    return PoolSizes(
+        default_pool_size=default_pool_size, max_user_connections=available
+    )
+
+
+def build_redis_command(tuning: RedisTuningConfig) -> list[str]:
+    """
+    Build the command of a Redis container that applies the settings.
+
+    Args:
+        tuning: The settings of the Redis instance
+
+    Returns:
+        The redis-server command with the settings as arguments
+    """
+    command = ["redis-server"]
+    if tuning.maxmemory is not None:
+        command += ["--maxmemory", tuning.maxmemory]
+    command += ["--maxmemory-policy", tuning.maxmemory_policy]
+    if not tuning.rdb:
+        # An empty save disables the RDB snapshots
+        command += ["--save", ""]
+    command += ["--appendonly", "yes" if tuning.aof else "no"]
+    if tuning.io_threads > 1:
+        command += ["--io-threads", str(tuning.io_threads)]
+    return command
@@ -0,0 +1,267 @@
+import csv
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+from .config import ArkitektServerConfig, Organization, User
+
+
+ImportFormat = Literal["csv", "jsonl"]
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Separator of multiple roles in the roles column of a CSV file
+ROLE_SEPARATOR = ";"
+
+USER_LIST = TypeAdapter(list[User])
+
+
+class ImportIssue(BaseModel):
+    """
+    A row of an import file that was skipped.
+
+    Attributes:
+        line: Line of the row in the import file
+        username: The username of the row, if it has one
+        message: Why the row was skipped
+    """
+
+    line: int
+    username: str | None = None
+    message: str
+
+
+class ImportResult(BaseModel):
+    """
+    Result of a user import.
+
+    Attributes:
+        users: The imported users
+        organizations: The organizations that were created for the imported users
+        duplicates: Rows with a username that already exists
+        invalid: Rows that failed validation
+    """
+
+    users: list[User] = Field(default_factory=list)
+    organizations: list[Organization] = Field(default_factory=list)
+    duplicates: list[ImportIssue] = Field(default_factory=list)
+    invalid: list[ImportIssue] = Field(default_factory=list)
+
+
+def detect_import_format(path: Path) -> ImportFormat:
+    """Guess the format of an import file from its suffix."""
+    return "csv" if path.suffix.lower() == ".csv" else "jsonl"
+
+
+def read_import_rows(path: Path, format: ImportFormat) -> Iterator[tuple[int, Any]]:
+    """
+    Stream the rows of an import file.
+
+    CSV files have a header with the columns username, password, email,
+    organization, roles (separated by ;) and active_organization. JSONL
+    files have a user object per line, with the fields of a user in the
+    config file, or the organization and roles shorthand of the CSV format.
+
+    Args:
+        path: The import file
+        format: The format of the file
+
+    Returns:
+        An iterator over the line numbers and rows of the file
+    """
+    with open(path, newline="" if format == "csv" else None, encoding="utf-8") as f:
+        if format == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Empty cells fall back to the defaults of the user
+                yield reader.line_num, {
+                    key: value.strip()
+                    for key, value in row.items()
+                    if key and value and value.strip()
+                }
+        else:
+            for line, text in enumerate(f, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    yield line, json.loads(text)
+                except json.JSONDecodeError as e:
+                    yield line, e
+
+
+def normalize_row(row: Any) -> dict[str, Any]:
+    """
+    Turn an import row into the fields of a user.
+
+    Args:
+        row: The parsed row
+
+    Returns:
+        The fields of the user
+
+    Raises:
+        ValueError: If the row is not a user object or has no username
+    """
+    if isinstance(row, Exception):
+        raise ValueError(f"Invalid JSON: {row}")
+    if not isinstance(row, dict):
+        raise ValueError("Expected an object with the fields of a user")
+    if not row.get("username"):
+        raise ValueError("Missing username")
+
+    fields = dict(row)
+    organization = fields.pop("organization", None)
+    roles = fields.pop("roles", None)
+    if organization is not None:
+        if isinstance(roles, str):
+            roles = [r.strip() for r in roles.split(ROLE_SEPARATOR) if r.strip()]
+        membership: dict[str, Any] = {"organization": organization}
+        if roles:
+            membership["roles"] = roles
+        fields["memberships"] = [*fields.get("memberships", []), membership]
+    elif roles is not None:
+        raise ValueError("Roles given without an organization")
+
+    memberships = fields.get("memberships")
+    if "active_organization" not in fields and memberships:
+        first = memberships[0]
+        fields["active_organization"] = (
+            first.get("organization") if isinstance(first, dict) else first
+        )
+    return fields
+
+
+def validate_batch(
+    batch: list[tuple[int, dict[str, Any]]],
+) -> tuple[list[tuple[int, User]], list[ImportIssue]]:
+    """
+    Validate a batch of rows as users in a single pass.
+
+    Args:
+        batch: The line numbers and fields of the users
+
+    Returns:
+        The valid users with their line numbers, and the invalid rows
+    """
+    try:
+        users = USER_LIST.validate_python([fields for _, fields in batch])
+        return [(line, user) for (line, _), user in zip(batch, users)], []
+    except ValidationError as e:
+        messages: dict[int, list[str]] = {}
+        for error in e.errors():
+            index = int(error["loc"][0])
+            field = ".".join(str(loc) for loc in error["loc"][1:])
+            messages.setdefault(index, []).append(f"{field}: {error['msg']}")
+
+    invalid = [
+        ImportIssue(
+            line=batch[index][0],
+            username=str(batch[index][1].get("username")),
+            message="; ".join(errors),
+        )
+        for index, errors in sorted(messages.items())
+    ]
+    # Only the invalid rows are dropped, the rest of the batch is validated again
+    valid, _ = validate_batch(
+        [row for index, row in enumerate(batch) if index not in messages]
+    )
+    return valid, invalid
+
+
+def import_users(
+    config: ArkitektServerConfig,
+    rows: Iterable[tuple[int, Any]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    create_organizations: bool = False,
+) -> ImportResult:
+    """
+    Import users into a configuration.
+
+    The rows are validated in batches. Duplicate usernames (in the
+    configuration or of a user imported earlier) and invalid rows are reported
+    in the result and skipped, all other users are added to the
+    configuration.
+
+    Args:
+        config: The configuration to add the users to, updated in place
+        rows: The line numbers and rows to import
+        batch_size: Number of rows validated at once
+        create_organizations: Create unknown organizations instead of rejecting the users
+
+    Returns:
+        The result of the import
+    """
+    result = ImportResult()
+    index = config.get_index()
+    usernames = set(index.users)
+    organizations = set(index.organizations)
+
+    def flush(batch: list[tuple[int, dict[str, Any]]]) -> None:
+        valid, invalid = validate_batch(batch)
+        result.invalid += invalid
+        for line, user in valid:
+            unknown = [
+                identifier
+                for identifier in dict.fromkeys(
+                    [m.organization for m in user.memberships]
+                    # Users without an explicit one keep the default organization
+                    + (
+                        [user.active_organization]
+                        if "active_organization" in user.model_fields_set
+                        else []
+                    )
+                )
+                if identifier not in organizations
+            ]
+            if unknown and not create_organizations:
+                result.invalid.append(
+                    ImportIssue(
+                        line=line,
+                        username=user.username,
+                        message=f"Unknown organizations: {', '.join(unknown)}",
+                    )
+                )
+                continue
+            # Only imported users reserve their username, so a rejected row
+            # can be corrected by a later row with the same username
+            if user.username in usernames:
+                result.duplicates.append(
+                    ImportIssue(
+                        line=line, username=user.username, message="Duplicate username"
+                    )
+                )
+                continue
+            usernames.add(user.username)
+
+            for identifier in unknown:
+                organizations.add(identifier)
+                result.organizations.append(
+                    Organization(name=identifier, identifier=identifier)
+                )
+            result.users.append(user)
+
+    batch: list[tuple[int, dict[str, Any]]] = []
+    for line, row in rows:
+        try:
+            fields = normalize_row(row)
+        except ValueError as e:
+            username = row.get("username") if isinstance(row, dict) else None
+            result.invalid.append(
+                ImportIssue(line=line, username=username, message=str(e))
+            )
+            continue
+
+        batch.append((line, fields))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    result.invalid.sort(key=lambda issue: issue.line)
+    result.duplicates.sort(key=lambda issue: issue.line)
+    config.organizations += result.organizations
+    config.users += result.users
+    return result
@@ -1,9 +1,18 @@
-from slugify import slugify
-
-
 def safe_org_slug(name: str, max_length: int = 8) -> str:
+    from slugify import slugify
+
     return slugify(
         name.lower(),
         separator="_",
         regex_pattern=r"[^a-z]+",  # ✅ allow only lowercase letters and underscores
     )[:max_length]
+
+
+def get_package_version() -> str:
+    """Get the installed version of the arkitekt-server package."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("arkitekt-server")
+    except PackageNotFoundError:
+        return "unknown"
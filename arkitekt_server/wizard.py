@@ -278,7 +278,7 @@ background processes. This user will have the `bot` role in all organizations.
             ]
         )
 
-        config.users.append(
+        config.add_user(
             User(
                 username=username,
                 password=password,
@@ -0,0 +1,58 @@
+"""
+Benchmark for the construction of ArkitektServerConfig objects.
+
+Compares constructing a configuration with an eagerly generated key pair
+(the old behaviour) to the lazy, pool and fixture key providers.
+
+    python benchmarks/config_construction.py --rounds 20
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from arkitekt_server.config import ArkitektServerConfig
+from arkitekt_server.keys import (
+    FixtureKeyProvider,
+    LazyKeyProvider,
+    PoolKeyProvider,
+    set_key_provider,
+)
+
+
+def time_rounds(rounds: int, eager: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        config = ArkitektServerConfig()
+        if eager:
+            config.lok.get_auth_key_pair()
+    return (time.perf_counter() - start) / rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = PoolKeyProvider(Path(tmp) / "pool")
+        pool.fill(args.rounds)
+
+        cases = [
+            ("eager (before)", LazyKeyProvider(), True),
+            ("lazy, not serialized", LazyKeyProvider(), False),
+            ("pool, serialized", pool, True),
+            ("fixture, serialized", FixtureKeyProvider(Path(tmp) / "fixture.json"), True),
+        ]
+
+        print(f"{'case':<24} {'ms / config':>12}")
+        for name, provider, eager in cases:
+            set_key_provider(provider)
+            print(f"{name:<24} {time_rounds(args.rounds, eager) * 1000:>12.2f}")
+
+    set_key_provider(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Memory benchmark for writing the Lok config of large deployments.
+
+Measures the peak of the Python allocations (with tracemalloc) while the
+Lok config (and optionally its seed file) is created and written, once
+streamed and once with all entries materialized up front, as the files
+were written before. The streamed peak should stay flat as the number of
+users grows, while the materialized peak grows with it.
+
+    python benchmarks/memory.py --users 1000 10000 50000
+    python benchmarks/memory.py --format json --seed-file
+"""
+
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+from arkitekt_server.config import ArkitektServerConfig, Membership, User
+from arkitekt_server.diff import create_artifacts, write_artifact
+from arkitekt_server.keys import FixtureKeyProvider, set_key_provider
+from arkitekt_server.serialization import LazySequence
+
+
+def create_config(users: int, format: str, seed_file: bool) -> ArkitektServerConfig:
+    config = ArkitektServerConfig(
+        internal_network="benchmark",
+        global_admin_password="benchmark",
+        users=[
+            User(
+                username=f"user{i}",
+                password=f"password{i}",
+                email=f"user{i}@example.com",
+                memberships=[Membership(organization="arkitektio", roles=["user"])],
+                active_organization="arkitektio",
+            )
+            for i in range(users)
+        ],
+    )
+    config.lok.config_format = format  # type: ignore[assignment]
+    config.lok.seed_file = seed_file
+    return config
+
+
+def materialize(content: Any) -> Any:
+    """Replace the lazy sequences of a document by lists."""
+    if isinstance(content, LazySequence):
+        return [materialize(item) for item in content]
+    if isinstance(content, dict):
+        return {key: materialize(value) for key, value in content.items()}
+    return content
+
+
+def measure_peak(config: ArkitektServerConfig, workdir: Path, streamed: bool) -> int:
+    """Peak of the allocations (in bytes) while the Lok artifacts are created and written."""
+    names = {config.lok.host, f"{config.lok.host}_seed"}
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    artifacts = [a for name, a in create_artifacts(config).items() if name in names]
+    for artifact in artifacts:
+        if not streamed:
+            artifact.content = materialize(artifact.content)
+        write_artifact(artifact, workdir)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--format", choices=["yaml", "json"], default="yaml")
+    parser.add_argument(
+        "--seed-file", action="store_true", help="Write the users to the Lok seed file"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        set_key_provider(FixtureKeyProvider(Path(tmp) / "fixture.json"))
+
+        # Warm up, so one-time allocations (imports, caches) don't count for the first size
+        measure_peak(create_config(1, args.format, args.seed_file), Path(tmp), streamed=True)
+
+        print(f"{'users':>8} {'streamed':>12} {'materialized':>14}")
+        for users in args.users:
+            config = create_config(users, args.format, args.seed_file)
+            streamed = measure_peak(config, Path(tmp), streamed=True)
+            materialized = measure_peak(config, Path(tmp), streamed=False)
+            print(
+                f"{users:>8} {streamed / 1024 / 1024:>10.1f}MB "
+                f"{materialized / 1024 / 1024:>12.1f}MB"
+            )
+
+        set_key_provider(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Benchmark suite for the config -> artifacts pipeline.
+
+Times every stage of a build on synthetic configurations, scaled by the
+number of organizations, users and enabled services, and writes the
+results as JSON for regression tracking.
+
+    python benchmarks/pipeline.py --output results.json
+    python benchmarks/pipeline.py --scales 1:1 500:20000 --services all
+    python benchmarks/pipeline.py --baseline results.json
+
+A scale is given as ORGANIZATIONS:USERS.
+
+"slowest artifact" is the time of the most expensive single artifact of a
+build (the Lok config for large deployments). Building the artifacts
+concurrently can at most save the difference to write_virtual_config_files.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from arkitekt_server.config import (
+    ArkitektServerConfig,
+    Membership,
+    Organization,
+    User,
+)
+from arkitekt_server.diff import (
+    compare_filesystems,
+    create_basic_config_values,
+    create_caddy_file,
+    write_virtual_config_files,
+)
+from arkitekt_server.keys import FixtureKeyProvider, set_key_provider
+from arkitekt_server.main import load_yaml_file
+from arkitekt_server.serialization import HAS_LIBYAML, dump_yaml
+from arkitekt_server.utils import get_package_version
+
+
+DEFAULT_SCALES = ["1:1", "10:100", "100:2000", "500:20000"]
+
+# Services that are disabled by default, enabled for the "all" service set
+OPTIONAL_SERVICES = ["alpaka", "elektro"]
+
+
+def create_synthetic_config(
+    organizations: int, users: int, services: str
+) -> ArkitektServerConfig:
+    """Create a configuration with the given number of organizations and users."""
+    orgs = [
+        Organization(name=f"org{i}", identifier=f"org{i}")
+        for i in range(organizations)
+    ]
+    config = ArkitektServerConfig(
+        internal_network="benchmark",
+        global_admin_password="benchmark",
+        organizations=orgs,
+        users=[
+            User(
+                username=f"user{i}",
+                password=f"password{i}",
+                email=f"user{i}@example.com",
+                memberships=[
+                    Membership(
+                        organization=orgs[i % organizations].identifier,
+                        roles=["user"],
+                    )
+                ],
+                active_organization=orgs[i % organizations].identifier,
+            )
+            for i in range(users)
+        ],
+    )
+    for name in OPTIONAL_SERVICES:
+        getattr(config, name).enabled = services == "all"
+    return config
+
+
+def measure(
+    rounds: int,
+    function: Callable[[], Any],
+    setup: Callable[[], Any] | None = None,
+) -> dict[str, float]:
+    """Time a function, with an optional untimed setup whose result is passed in."""
+    times = []
+    for _ in range(rounds):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument) if setup else function()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times)}
+
+
+def run_scale(
+    organizations: int, users: int, services: str, rounds: int, workdir: Path
+) -> dict[str, dict[str, float]]:
+    """Run all pipeline benchmarks for one scale."""
+    results: dict[str, dict[str, float]] = {}
+    config = create_synthetic_config(organizations, users, services)
+
+    results["construct"] = measure(
+        rounds, lambda: create_synthetic_config(organizations, users, services)
+    )
+
+    config_file = workdir / "arkitekt_server_config.yaml"
+    config_file.write_text(dump_yaml({"version": "1.0", "config": config.model_dump()}))  # type: ignore[arg-type]
+
+    os.environ["ARKITEKT_SERVER_NO_CACHE"] = "1"
+    results["load_yaml_file"] = measure(rounds, lambda: load_yaml_file(str(config_file)))
+    del os.environ["ARKITEKT_SERVER_NO_CACHE"]
+    load_yaml_file(str(config_file))
+    results["load_yaml_file (cached)"] = measure(
+        rounds, lambda: load_yaml_file(str(config_file))
+    )
+
+    results["create_basic_config_values"] = measure(
+        rounds, lambda: create_basic_config_values(config, config.mikro)
+    )
+    results["create_caddy_file"] = measure(rounds, lambda: create_caddy_file(config))
+
+    counter = iter(range(sys.maxsize))
+
+    def fresh_target() -> Path:
+        return workdir / f"build{next(counter)}"
+
+    results["write_virtual_config_files"] = measure(
+        rounds,
+        lambda target: write_virtual_config_files(target, config),
+        setup=fresh_target,
+    )
+    slowest = [
+        max(timing.total for timing in write_virtual_config_files(fresh_target(), config))
+        for _ in range(rounds)
+    ]
+    results["slowest artifact"] = {
+        "min": min(slowest),
+        "median": statistics.median(slowest),
+    }
+
+    virtual_dir = workdir / "virtual"
+    real_dir = workdir / "real"
+    write_virtual_config_files(virtual_dir, config)
+    shutil.copytree(virtual_dir, real_dir)
+    results["compare_filesystems"] = measure(
+        rounds, lambda: compare_filesystems(virtual_dir, real_dir)
+    )
+
+    return results
+
+
+def parse_scale(value: str) -> tuple[int, int]:
+    organizations, users = value.split(":")
+    return max(int(organizations), 1), max(int(users), 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument(
+        "--services", nargs="+", choices=["default", "all"], default=["default", "all"]
+    )
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=Path("pipeline_results.json"))
+    parser.add_argument(
+        "--baseline", type=Path, default=None, help="Earlier results to compare to"
+    )
+    args = parser.parse_args()
+
+    baseline: dict[tuple[Any, ...], float] = {}
+    if args.baseline:
+        for entry in json.loads(args.baseline.read_text())["results"]:
+            key = (entry["benchmark"], entry["organizations"], entry["users"], entry["services"])
+            baseline[key] = entry["min"]
+
+    # Key generation is not part of the pipeline, reuse one key pair
+    with tempfile.TemporaryDirectory() as tmp:
+        set_key_provider(FixtureKeyProvider(Path(tmp) / "fixture.json"))
+
+        entries: list[dict[str, Any]] = []
+        print(f"{'benchmark':<30} {'orgs':>6} {'users':>7} {'services':>8} {'min':>10} {'median':>10}")
+        for services in args.services:
+            for scale in args.scales:
+                organizations, users = parse_scale(scale)
+                workdir = Path(tmp) / f"{services}-{organizations}-{users}"
+                workdir.mkdir()
+                results = run_scale(organizations, users, services, args.rounds, workdir)
+
+                for benchmark, timing in results.items():
+                    entry = {
+                        "benchmark": benchmark,
+                        "organizations": organizations,
+                        "users": users,
+                        "services": services,
+                        **timing,
+                    }
+                    entries.append(entry)
+
+                    line = (
+                        f"{benchmark:<30} {organizations:>6} {users:>7} {services:>8} "
+                        f"{timing['min'] * 1000:>8.1f}ms {timing['median'] * 1000:>8.1f}ms"
+                    )
+                    previous = baseline.get((benchmark, organizations, users, services))
+                    if previous:
+                        line += f" {(timing['min'] / previous - 1) * 100:>+7.1f}%"
+                    print(line)
+
+                shutil.rmtree(workdir)
+
+        set_key_provider(None)
+
+    args.output.write_text(
+        json.dumps(
+            {
+                "version": get_package_version(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "libyaml": HAS_LIBYAML,
+                "created": datetime.now(timezone.utc).isoformat(),
+                "rounds": args.rounds,
+                "results": entries,
+            },
+            indent=2,
+        )
+    )
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
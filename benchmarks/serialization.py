@@ -0,0 +1,73 @@
+"""
+Benchmark for loading and dumping configurations of different sizes.
+
+Compares the pure Python YAML loader/dumper to the libyaml based ones,
+and to the JSON output mode for service configs.
+
+    python benchmarks/serialization.py --users 10 1000 10000
+"""
+
+import argparse
+import time
+from typing import Any, Callable
+
+import yaml
+
+from arkitekt_server.config import ArkitektServerConfig, Membership, User
+from arkitekt_server.serialization import HAS_LIBYAML, dump_json, dump_yaml, load_yaml
+
+
+def create_config_data(users: int) -> dict[str, Any]:
+    config = ArkitektServerConfig(
+        users=[
+            User(
+                username=f"user{i}",
+                password=f"password{i}",
+                email=f"user{i}@example.com",
+                memberships=[Membership(organization="arkitektio", roles=["user"])],
+                active_organization="arkitektio",
+            )
+            for i in range(users)
+        ]
+    )
+    return {"version": "1.0", "config": config.model_dump()}
+
+
+def best_of(rounds: int, function: Callable[[], Any]) -> float:
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"libyaml available: {HAS_LIBYAML}")
+    print(
+        f"{'users':>8} {'load py':>10} {'load c':>10} "
+        f"{'dump py':>10} {'dump c':>10} {'dump json':>10}"
+    )
+    for users in args.users:
+        data = create_config_data(users)
+        document = dump_yaml(data)
+
+        results = [
+            best_of(args.rounds, lambda: yaml.safe_load(document)),
+            best_of(args.rounds, lambda: load_yaml(document)),
+            best_of(
+                args.rounds, lambda: yaml.dump(data, default_flow_style=False)
+            ),
+            best_of(args.rounds, lambda: dump_yaml(data)),
+            best_of(args.rounds, lambda: dump_json(data)),
+        ]
+        print(f"{users:>8} " + " ".join(f"{r * 1000:>8.1f}ms" for r in results))
+
+
+if __name__ == "__main__":
+    main()
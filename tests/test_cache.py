@@ -0,0 +1,57 @@
+from pathlib import Path
+import yaml
+from typer.testing import CliRunner
+from arkitekt_server import cache
+from arkitekt_server.cache import get_cache_file, load_cached_config
+from arkitekt_server.config import ArkitektServerConfig
+from arkitekt_server.main import app, parse_config
+from tests.utils import run_init_command
+
+runner = CliRunner()
+
+
+def test_config_cache_reuses_validated_snapshot():
+    """Test that an unchanged config file is only validated once."""
+    with runner.isolated_filesystem():
+        run_init_command(app, runner)
+        config_file = Path("arkitekt_server_config.yaml")
+
+        parsed: list[bytes] = []
+
+        def counting_parse(content: bytes) -> ArkitektServerConfig:
+            parsed.append(content)
+            return parse_config(content)
+
+        first = load_cached_config(config_file, counting_parse)
+        second = load_cached_config(config_file, counting_parse)
+        assert len(parsed) == 1, "Unchanged config file was validated again"
+        assert first == second
+        assert get_cache_file(config_file).stat().st_mode & 0o077 == 0
+
+        data = yaml.safe_load(config_file.read_text())
+        data["config"]["mikro"]["debug"] = True
+        config_file.write_text(yaml.dump(data))
+
+        changed = load_cached_config(config_file, counting_parse)
+        assert len(parsed) == 2, "Changed config file was not validated again"
+        assert changed.mikro.debug is True
+
+        result = runner.invoke(app, ["inspect", "users"])
+        assert result.exit_code == 0, result.stdout
+
+
+def test_config_cache_is_invalidated_by_model_changes(monkeypatch):
+    """Test that a snapshot of older config models is not reused."""
+    with runner.isolated_filesystem():
+        run_init_command(app, runner)
+        config_file = Path("arkitekt_server_config.yaml")
+        parsed: list[bytes] = []
+
+        def counting_parse(content: bytes) -> ArkitektServerConfig:
+            parsed.append(content)
+            return parse_config(content)
+
+        load_cached_config(config_file, counting_parse)
+        monkeypatch.setattr(cache, "get_schema_fingerprint", lambda: "changed")
+        load_cached_config(config_file, counting_parse)
+        assert len(parsed) == 2, "Snapshot of older models was reused"
@@ -0,0 +1,61 @@
+from pathlib import Path
+from arkitekt_server.diff import apply_filesystem_diff, compare_filesystems
+
+
+def test_compare_filesystems(tmp_path: Path, capsys):
+    virtual_dir = tmp_path / "virtual"
+    real_dir = tmp_path / "real"
+    (virtual_dir / "configs").mkdir(parents=True)
+    (real_dir / "configs").mkdir(parents=True)
+    (real_dir / "db_data").mkdir()
+
+    (virtual_dir / "configs" / "same.yaml").write_text("a: 1\n")
+    (real_dir / "configs" / "same.yaml").write_text("a: 1\n")
+    (virtual_dir / "configs" / "changed.yaml").write_text(
+        "".join(f"line {i}\n" for i in range(100))
+    )
+    (real_dir / "configs" / "changed.yaml").write_text("line\n")
+    (virtual_dir / "configs" / "new.yaml").write_text("b: 2\n")
+    (real_dir / "configs" / "old.yaml").write_text("c: 3\n")
+    (real_dir / "db_data" / "PG_VERSION").write_text("16\n")
+
+    result = compare_filesystems(
+        virtual_dir,
+        real_dir,
+        allow_deletes=True,
+        ignore={Path("db_data")},
+        max_diff_lines=10,
+    )
+
+    assert result.created == [Path("configs/new.yaml")]
+    assert result.deleted == [Path("configs/old.yaml")], "Data directory was scanned"
+    assert result.modified == [Path("configs/changed.yaml")]
+    assert result.unchanged == [Path("configs/same.yaml")]
+    assert "diff truncated after 10 lines" in capsys.readouterr().out
+
+    result = compare_filesystems(virtual_dir, real_dir, allow_deletes=False)
+    assert result.deleted == [], "Deletes were reported"
+
+
+def test_apply_only_writes_changed_files(tmp_path: Path):
+    virtual_dir = tmp_path / "virtual"
+    real_dir = tmp_path / "real"
+    (virtual_dir / "configs").mkdir(parents=True)
+    (real_dir / "configs").mkdir(parents=True)
+
+    (virtual_dir / "configs" / "same.yaml").write_text("a: 1\n")
+    (real_dir / "configs" / "same.yaml").write_text("a: 1\n")
+    (virtual_dir / "configs" / "Caddyfile").write_text("http:// {\n}\n")
+    (real_dir / "configs" / "Caddyfile").write_text("http:// {\n\n}\n")
+    (virtual_dir / "docker-compose.yaml").write_text("services: {}\n")
+
+    unchanged_mtime = (real_dir / "configs" / "same.yaml").stat().st_mtime_ns
+
+    diff = compare_filesystems(virtual_dir, real_dir, allow_deletes=False)
+    written = apply_filesystem_diff(diff, virtual_dir, real_dir)
+
+    assert written == [Path("configs/Caddyfile"), Path("docker-compose.yaml")]
+    assert (real_dir / "configs" / "Caddyfile").read_text() == "http:// {\n}\n"
+    assert (real_dir / "docker-compose.yaml").read_text() == "services: {}\n"
+    assert (real_dir / "configs" / "same.yaml").stat().st_mtime_ns == unchanged_mtime
+    assert not list(real_dir.rglob("*.tmp")), "Temporary files were left behind"
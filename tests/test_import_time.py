@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+
+# Cumulative import time budget in milliseconds, can be raised on slow CI machines
+IMPORT_BUDGET_MS = float(os.environ.get("ARKITEKT_SERVER_IMPORT_BUDGET_MS", "750"))
+
+HEAVY_MODULES = ["cryptography", "inquirer", "namegenerator", "rich", "typer"]
+
+
+def measure_import_time(module: str) -> float:
+    """Measure the cumulative import time of a module in a fresh interpreter (in ms)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in reversed(result.stderr.splitlines()):
+        # import time: self [us] | cumulative | imported package
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    raise AssertionError(f"No import time reported for {module}: {result.stderr}")
+
+
+def test_programmatic_import_time():
+    """Test that the programmatic API stays within the import time budget."""
+    elapsed = min(measure_import_time("arkitekt_server.create") for _ in range(3))
+    assert elapsed < IMPORT_BUDGET_MS, (
+        f"Importing arkitekt_server.create took {elapsed:.0f}ms "
+        f"(budget {IMPORT_BUDGET_MS:.0f}ms)"
+    )
+
+
+def test_programmatic_import_avoids_heavy_modules():
+    """Test that the programmatic API doesn't import the CLI and crypto dependencies."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, arkitekt_server.create; "
+            "print(' '.join(sorted({m.split('.')[0] for m in sys.modules})))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(result.stdout.split())
+    assert not loaded & set(HEAVY_MODULES), sorted(loaded & set(HEAVY_MODULES))
+
+
+# Only loaded by the commands that build, import users or tune the deployment
+GENERATOR_MODULES = [
+    "arkitekt_server.diff",
+    "arkitekt_server.build",
+    "arkitekt_server.resources",
+    "arkitekt_server.serialization",
+    "arkitekt_server.tuning",
+    "arkitekt_server.user_import",
+    "yaml",
+]
+
+
+def test_cli_import_time():
+    """Test that the CLI stays within the import time budget."""
+    elapsed = min(measure_import_time("arkitekt_server.main") for _ in range(3))
+    assert elapsed < IMPORT_BUDGET_MS, (
+        f"Importing arkitekt_server.main took {elapsed:.0f}ms "
+        f"(budget {IMPORT_BUDGET_MS:.0f}ms)"
+    )
+
+
+def test_cli_import_avoids_generators():
+    """Test that the CLI only loads the generator stack in the commands that use it."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, arkitekt_server.main; print(' '.join(sorted(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(result.stdout.split())
+    assert not loaded & set(GENERATOR_MODULES), sorted(loaded & set(GENERATOR_MODULES))
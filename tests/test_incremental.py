@@ -0,0 +1,124 @@
+import json
+import subprocess
+from pathlib import Path
+import yaml
+from typer.testing import CliRunner
+from arkitekt_server.build import (
+    MANIFEST_FILE,
+    clear_restart_plan,
+    load_restart_plan,
+    plan_restarts,
+)
+from arkitekt_server.main import app
+from tests.utils import run_building_command, run_init_command
+
+runner = CliRunner()
+
+
+def test_rebuild_skips_unchanged_artifacts():
+    """Test that a second build only regenerates the artifacts whose inputs changed."""
+    with runner.isolated_filesystem():
+        run_init_command(app, runner)
+        run_building_command(app, runner)
+
+        manifest = json.loads(Path(MANIFEST_FILE).read_text())
+        assert "docker-compose" in manifest["artifacts"], "Compose file not in manifest"
+        assert "lok" in manifest["artifacts"], "Lok config not in manifest"
+
+        result = runner.invoke(app, ["build", "docker", "--yes"])
+        assert result.exit_code == 0, result.stdout
+        assert f"{len(manifest['artifacts'])} up-to-date, 0 rebuilt" in result.stdout
+
+        config_file = Path("arkitekt_server_config.yaml")
+        data = yaml.safe_load(config_file.read_text())
+        data["config"]["mikro"]["debug"] = True
+        config_file.write_text(yaml.dump(data))
+
+        result = runner.invoke(app, ["build", "docker", "--yes"])
+        assert result.exit_code == 0, result.stdout
+        # Every artifact reads the services, but only the mikro config and
+        # the compose file (run command) change
+        assert "Wrote 2 files" in result.stdout, result.stdout
+
+        mikro_config = yaml.safe_load(Path("configs/mikro.yaml").read_text())
+        assert mikro_config["django"]["debug"] is True
+
+        # Only the Lok config reads the users
+        data = yaml.safe_load(config_file.read_text())
+        data["config"]["users"].append({"username": "alice"})
+        config_file.write_text(yaml.dump(data))
+
+        result = runner.invoke(app, ["build", "docker", "--yes"])
+        assert result.exit_code == 0, result.stdout
+        assert f"{len(manifest['artifacts']) - 1} up-to-date, 1 rebuilt" in (
+            result.stdout
+        ), result.stdout
+
+        result = runner.invoke(app, ["build", "docker", "--yes", "--force"])
+        assert result.exit_code == 0, result.stdout
+        assert f"0 up-to-date, {len(manifest['artifacts'])} rebuilt" in result.stdout
+
+
+def test_restart_plan_after_rebuild():
+    """Test that a rebuild only plans to recreate the affected services."""
+    with runner.isolated_filesystem():
+        run_init_command(app, runner)
+        run_building_command(app, runner)
+
+        assert "gateway" in load_restart_plan(Path(".")).services
+        clear_restart_plan(Path("."))
+
+        config_file = Path("arkitekt_server_config.yaml")
+        data = yaml.safe_load(config_file.read_text())
+        data["config"]["mikro"]["debug"] = True
+        config_file.write_text(yaml.dump(data))
+
+        run_building_command(app, runner)
+
+        plan = load_restart_plan(Path("."))
+        assert list(plan.services) == ["mikro"], plan
+        assert set(plan.services["mikro"]) == {
+            "configs/mikro.yaml",
+            "docker-compose.yaml",
+        }
+
+
+def test_plan_restarts_follows_dependencies():
+    compose = {
+        "services": {
+            "db": {"image": "postgres"},
+            "mikro": {
+                "image": "mikro",
+                "depends_on": ["db"],
+                "volumes": ["./configs/mikro.yaml:/workspace/config.yaml"],
+            },
+            "gateway": {"volumes": ["./configs/Caddyfile:/etc/caddy/Caddyfile"]},
+        }
+    }
+    old_compose = {
+        "services": {**compose["services"], "db": {"image": "postgres:16"}}
+    }
+
+    plan = plan_restarts([Path("configs/Caddyfile")], compose, compose)
+    assert list(plan.services) == ["gateway"]
+
+    plan = plan_restarts([Path("docker-compose.yaml")], old_compose, compose)
+    assert list(plan.services) == ["db", "mikro"]
+    assert plan.services["mikro"] == ["depends on db"]
+
+
+def test_failed_start_keeps_restart_plan(monkeypatch):
+    """Test that the restart plan survives a docker compose up that fails."""
+
+    def failing_run(command, check):
+        raise subprocess.CalledProcessError(1, command)
+
+    with runner.isolated_filesystem():
+        run_init_command(app, runner)
+        run_building_command(app, runner)
+        monkeypatch.setattr(subprocess, "run", failing_run)
+
+        result = runner.invoke(app, ["start"])
+
+        assert result.exit_code == 1
+        assert "gateway" in load_restart_plan(Path(".")).services
@@ -0,0 +1,105 @@
+from typer.testing import CliRunner
+
+from arkitekt_server import config as config_module
+from arkitekt_server.config import (
+    ArkitektServerConfig,
+    ConfigIndex,
+    Membership,
+    Organization,
+    Role,
+    User,
+)
+from arkitekt_server.main import app, load_yaml_file
+from tests.utils import run_init_command
+
+
+def test_index_follows_mutations():
+    config = ArkitektServerConfig()
+
+    demo = config.get_user("demo")
+    assert demo is config.users[0]
+    assert config.get_organization("arkitektio") is config.organizations[0]
+    assert config.get_user("alice") is None
+
+    config.add_user(User(username="alice"))
+    assert config.get_user("alice") is config.users[-1]
+
+    config.organizations = [Organization(name="Lab", identifier="lab")]
+    assert config.get_organization("arkitektio") is None
+    assert config.get_organization("lab") is config.organizations[0]
+
+    config.roles += [Role(name="Imaging", identifier="imaging", organization="lab")]
+    assert config.get_role("imaging") is config.roles[0]
+
+    # In-place changes of the lists need an explicit invalidation
+    config.users[0] = User(username="bob")
+    assert config.get_user("demo") is demo
+    config.invalidate_index()
+    assert config.get_user("demo") is None
+    assert config.get_user("bob") is config.users[0]
+    config.users[0].username = "carl"
+    config.invalidate_index()
+    assert config.get_user("carl") is config.users[0]
+    config.users[0] = demo
+    config.invalidate_index()
+
+    assert config.remove_user("alice") is not None
+    assert config.get_user("alice") is None
+    assert [u.username for u in config.users] == ["demo"]
+    assert config.remove_user("alice") is None
+
+
+def test_repeated_lookups_use_the_index(monkeypatch):
+    builds: list[ConfigIndex] = []
+
+    class CountingIndex(ConfigIndex):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            builds.append(self)
+
+    monkeypatch.setattr(config_module, "ConfigIndex", CountingIndex)
+    config = ArkitektServerConfig(users=[User(username=f"user{i}") for i in range(100)])
+
+    for i in range(100):
+        assert config.get_user(f"user{i}") is config.users[i]
+    # The lookups share one index, they don't scan the users again
+    assert len(builds) == 1
+
+    config.add_user(User(username="alice"))
+    assert config.get_user("alice") is config.users[-1]
+    assert config.get_user("user0") is config.users[0]
+    assert len(builds) == 2
+
+
+def test_validate_references():
+    config = ArkitektServerConfig()
+    assert config.validate_references() == []
+
+    config.users += [
+        User(
+            username="alice",
+            memberships=[Membership(organization="nowhere")],
+            active_organization="arkitektio",
+        ),
+        User(username="demo"),
+    ]
+    config.roles.append(Role(name="Imaging", identifier="imaging", organization="lab"))
+
+    assert config.validate_references() == [
+        "Duplicate user demo",
+        "User alice is a member of the unknown organization nowhere",
+        "Role imaging belongs to the unknown organization lab",
+    ]
+
+
+def test_user_remove_command():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        run_init_command(app, runner)
+
+        result = runner.invoke(app, ["auth", "user", "remove", "demo"])
+        assert result.exit_code == 0, result.stdout
+        assert load_yaml_file("arkitekt_server_config.yaml").get_user("demo") is None
+
+        result = runner.invoke(app, ["auth", "user", "remove", "demo"])
+        assert result.exit_code == 1
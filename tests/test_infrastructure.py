@@ -0,0 +1,385 @@
+import os
+from pathlib import Path
+import pytest
+import yaml
+from arkitekt_server.config import (
+    ArkitektServerConfig,
+    GatewayRouteConfig,
+    PoolerDatabaseConfig,
+    PostgresTuningConfig,
+    ProcessModelConfig,
+    RedisTuningConfig,
+    ServiceResourceConfig,
+)
+from arkitekt_server.diff import create_docker_compose, write_virtual_config_files
+from arkitekt_server import resources
+from arkitekt_server.resources import ResourcePlanError, plan_resources
+from arkitekt_server.tuning import (
+    PoolSizeError,
+    derive_postgres_tuning,
+    plan_pool_sizes,
+)
+
+
+def test_pooler_rewrites_database_connections(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.pooler.enabled = True
+    config.pooler.pool_mode = "transaction"
+    config.pooler.databases["mikro"] = PoolerDatabaseConfig(pool_size=50)
+
+    write_virtual_config_files(tmp_path, config)
+
+    mikro = yaml.safe_load((tmp_path / "configs" / "mikro.yaml").read_text())
+    assert mikro["db"]["host"] == "pooler"
+    assert mikro["db"]["port"] == config.pooler.internal_port
+
+    pgbouncer = (tmp_path / "configs" / "pgbouncer.ini").read_text()
+    assert "mikro = host=db port=5432 dbname=mikro pool_size=50\n" in pgbouncer
+    assert "rekuest = host=db port=5432 dbname=rekuest\n" in pgbouncer
+    assert "pool_mode = transaction\n" in pgbouncer
+    # mikro takes 55 of the 97 connections, the other 5 databases share the rest
+    assert "default_pool_size = 3\n" in pgbouncer
+    assert "max_user_connections = 97\n" in pgbouncer
+    assert (tmp_path / "configs" / "pgbouncer_userlist.txt").read_text() == (
+        f'"{config.db.postgres_user}" "{config.db.postgres_password}"\n'
+    )
+
+    compose = yaml.safe_load((tmp_path / "docker-compose.yaml").read_text())
+    assert compose["services"]["pooler"]["depends_on"] == {
+        "db": {"condition": "service_healthy"}
+    }
+    assert "pooler" in compose["services"]["mikro"]["depends_on"]
+
+
+def test_pool_sizes_fit_into_postgres():
+    config = ArkitektServerConfig()
+    db_names = ["lok", "mikro", "rekuest", "kabinet", "fluss", "alpaka"]
+
+    sizes = plan_pool_sizes(config.pooler, config.db.tuning, db_names)
+    assert sizes.default_pool_size == 11
+    assert sizes.max_user_connections == 97
+
+    config.db.tuning.enabled = True
+    config.db.tuning.profile = "oltp"
+    sizes = plan_pool_sizes(config.pooler, config.db.tuning, db_names)
+    assert sizes.default_pool_size == 44
+
+    config.db.tuning.enabled = False
+    config.pooler.default_pool_size = 20
+    with pytest.raises(PoolSizeError):
+        plan_pool_sizes(config.pooler, config.db.tuning, db_names)
+
+    # Capping the connections per database makes them fit again
+    config.pooler.max_db_connections = 16
+    plan_pool_sizes(config.pooler, config.db.tuning, db_names)
+
+
+def test_pooler_disabled_connects_directly(tmp_path: Path):
+    config = ArkitektServerConfig()
+
+    write_virtual_config_files(tmp_path, config)
+
+    mikro = yaml.safe_load((tmp_path / "configs" / "mikro.yaml").read_text())
+    assert (mikro["db"]["host"], mikro["db"]["port"]) == ("db", 5432)
+    assert not (tmp_path / "configs" / "pgbouncer.ini").exists()
+
+
+def test_derive_postgres_tuning():
+    tuning = derive_postgres_tuning(
+        PostgresTuningConfig(memory_mb=16384, cpus=8, profile="oltp")
+    )
+
+    assert tuning.settings["max_connections"] == "300"
+    assert tuning.settings["shared_buffers"] == "4GB"
+    assert tuning.settings["effective_cache_size"] == "12GB"
+    assert tuning.settings["wal_buffers"] == "16MB"
+    assert tuning.settings["max_parallel_workers_per_gather"] == "4"
+    assert tuning.shm_size_mb == 4096
+
+    small = derive_postgres_tuning(PostgresTuningConfig(memory_mb=512, cpus=1))
+    assert "max_worker_processes" not in small.settings
+    assert small.shm_size_mb == 128
+
+    for invalid in ({"memory_mb": 0}, {"cpus": -1}, {"max_connections": 0}):
+        with pytest.raises(ValueError):
+            PostgresTuningConfig(**invalid)
+
+
+def test_db_tuning_in_compose(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.db.tuning.enabled = True
+    config.db.tuning.memory_mb = 8192
+
+    write_virtual_config_files(tmp_path, config)
+
+    compose = yaml.safe_load((tmp_path / "docker-compose.yaml").read_text())
+    db = compose["services"]["db"]
+    assert db["command"][:3] == ["postgres", "-c", "max_connections=100"]
+    assert "shared_buffers=2GB" in db["command"]
+    assert db["shm_size"] == "2048m"
+
+
+def test_replicas_are_load_balanced(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.mikro.replicas = 3
+
+    write_virtual_config_files(tmp_path / "deploy", config)
+
+    compose = yaml.safe_load((tmp_path / "deploy" / "docker-compose.yaml").read_text())
+    assert compose["services"]["mikro"]["deploy"]["replicas"] == 3
+    assert "deploy" not in compose["services"]["rekuest"]
+    caddyfile = (tmp_path / "deploy" / "configs" / "Caddyfile").read_text()
+    assert "\t\t\t\tname mikro\n" in caddyfile
+    assert "\t\treverse_proxy rekuest:80\n" in caddyfile
+
+    config.replica_mode = "numbered"
+    write_virtual_config_files(tmp_path / "numbered", config)
+
+    compose = yaml.safe_load(
+        (tmp_path / "numbered" / "docker-compose.yaml").read_text()
+    )
+    assert {"mikro", "mikro-2", "mikro-3"} <= set(compose["services"])
+    assert "deploy" not in compose["services"]["mikro-2"]
+    caddyfile = (tmp_path / "numbered" / "configs" / "Caddyfile").read_text()
+    assert "reverse_proxy mikro:80 mikro-2:80 mikro-3:80 {\n" in caddyfile
+    assert "\t\t\thealth_uri /mikro/ht\n" in caddyfile
+    assert "\t\t\tlb_policy least_conn\n" in caddyfile
+
+
+def test_process_model_adds_workers(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.mikro.replicas = 2
+    config.mikro.process_model = ProcessModelConfig(
+        cpus=8,
+        threads=2,
+        worker_replicas=2,
+        worker_command="python manage.py rqworker --num-workers {concurrency}",
+    )
+
+    write_virtual_config_files(tmp_path, config)
+
+    compose = yaml.safe_load((tmp_path / "docker-compose.yaml").read_text())
+    web = compose["services"]["mikro"]
+    assert web["environment"] == {"WEB_CONCURRENCY": "4", "ASGI_THREADS": "2"}
+    assert web["command"] == "bash run.sh"
+    assert web["deploy"]["replicas"] == 2
+
+    worker = compose["services"]["mikro-worker"]
+    assert worker["command"] == "python manage.py rqworker --num-workers 8"
+    assert worker["volumes"] == web["volumes"]
+    assert "environment" not in worker
+    assert worker["deploy"]["replicas"] == 2
+    assert "environment" not in compose["services"]["rekuest"]
+
+    with pytest.raises(ValueError):
+        ProcessModelConfig(worker_replicas=1)
+
+
+def test_process_model_uses_cpus_of_build_machine(monkeypatch):
+    process_model = ProcessModelConfig(worker_replicas=1, worker_command="w {concurrency}")
+    # The CPUs of the machine the config is created on are not stored
+    assert process_model.model_dump()["cpus"] is None
+
+    monkeypatch.setattr(os, "cpu_count", lambda: 6)
+    assert process_model.build_web_environment(replicas=2) == {"WEB_CONCURRENCY": "3"}
+    assert process_model.build_worker_command() == "w 6"
+
+
+def test_gateway_performance_options(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.gateway.encode = ["zstd", "gzip"]
+    config.gateway.static_cache_max_age = 86400
+    config.gateway.bucket_transfer.enabled = True
+    config.gateway.routes["rekuest"] = GatewayRouteConfig(
+        encode=[], static_cache_max_age=0
+    )
+
+    write_virtual_config_files(tmp_path, config)
+
+    caddyfile = (tmp_path / "configs" / "Caddyfile").read_text()
+    mikro = caddyfile[caddyfile.index("handle @mikro ") :]
+    mikro = mikro[: mikro.index("\t}\n")]
+    assert "\t\tencode zstd gzip\n" in mikro
+    assert (
+        '\t\theader @mikro_static >Cache-Control "public, max-age=86400, immutable"\n'
+        in mikro
+    )
+
+    rekuest = caddyfile[caddyfile.index("handle @rekuest ") :]
+    rekuest = rekuest[: rekuest.index("\t}\n")]
+    assert "encode" not in rekuest
+    assert "Cache-Control" not in rekuest
+
+    assert "\t\t\tflush_interval -1\n" in caddyfile
+
+
+def test_bucket_transfer_listener(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.gateway.bucket_transfer.enabled = True
+    config.gateway.bucket_transfer.port = 9080
+
+    write_virtual_config_files(tmp_path, config)
+
+    caddyfile = (tmp_path / "configs" / "Caddyfile").read_text()
+    bucket = config.mikro.zarr_bucket.bucket_name
+    assert "\t\t\t\tread_buffer 1MiB\n" in caddyfile
+
+    listener = caddyfile[caddyfile.index("\nhttp://:9080 {\n") :]
+    assert f"\t@{bucket} path /{bucket}*\n" in listener
+    assert "@mikro " not in listener
+
+    compose = yaml.safe_load((tmp_path / "docker-compose.yaml").read_text())
+    assert "9080:9080" in compose["services"]["gateway"]["ports"]
+
+
+def test_redis_tuning_and_dedicated_instances(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.local_redis.tuning = RedisTuningConfig(
+        enabled=True, maxmemory="512mb", maxmemory_policy="allkeys-lru"
+    )
+    config.rekuest.redis_config.dedicated = True  # type: ignore[union-attr]
+    config.rekuest.redis_config.tuning = RedisTuningConfig(  # type: ignore[union-attr]
+        enabled=True, rdb=False, io_threads=4
+    )
+
+    write_virtual_config_files(tmp_path, config)
+
+    compose = yaml.safe_load((tmp_path / "docker-compose.yaml").read_text())
+    assert compose["services"]["redis"]["command"] == [
+        "redis-server",
+        "--maxmemory",
+        "512mb",
+        "--maxmemory-policy",
+        "allkeys-lru",
+        "--appendonly",
+        "no",
+    ]
+    assert compose["services"]["rekuest-redis"]["command"] == [
+        "redis-server",
+        "--maxmemory-policy",
+        "noeviction",
+        "--save",
+        "",
+        "--appendonly",
+        "no",
+        "--io-threads",
+        "4",
+    ]
+    assert "rekuest-redis" in compose["services"]["rekuest"]["depends_on"]
+
+    rekuest = yaml.safe_load((tmp_path / "configs" / "rekuest.yaml").read_text())
+    assert rekuest["redis"]["host"] == "rekuest-redis"
+    mikro = yaml.safe_load((tmp_path / "configs" / "mikro.yaml").read_text())
+    assert mikro["redis"]["host"] == "redis"
+
+
+def test_resource_plan_limits(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.resources.enabled = True
+    config.resources.cpus = 8
+    config.resources.memory_mb = 16384
+    config.resources.services["gateway"] = ServiceResourceConfig(
+        cpus=1, memory_mb=256, cpuset="0"
+    )
+    config.resources.services["db"] = ServiceResourceConfig(weight=3)
+    config.mikro.replicas = 2
+
+    write_virtual_config_files(tmp_path, config)
+
+    compose = yaml.safe_load((tmp_path / "docker-compose.yaml").read_text())
+    services = compose["services"]
+    assert services["gateway"]["deploy"]["resources"] == {
+        "limits": {"cpus": "1", "memory": "256M"},
+        "reservations": {"cpus": "0.5", "memory": "128M"},
+    }
+    assert services["gateway"]["cpuset"] == "0"
+    assert services["mikro"]["deploy"]["replicas"] == 2
+    # Existing deploy settings are kept
+    assert "restart_policy" in services["lok"]["deploy"]
+
+    plan = plan_resources(config.resources, services)
+    assert plan.planned_cpus <= 8
+    assert plan.planned_memory_mb <= 16384
+    limits = {s.name: s for s in plan.services}
+    assert limits["db"].cpus == pytest.approx(3 * limits["rekuest"].cpus, abs=0.05)
+    assert limits["mikro"].memory_mb * 2 == pytest.approx(
+        limits["rekuest"].memory_mb, abs=2
+    )
+
+
+def test_resource_plan_limits_tuning_and_processes():
+    config = ArkitektServerConfig()
+    config.resources.enabled = True
+    config.resources.cpus = 8
+    config.resources.memory_mb = 16384
+    config.resources.services["db"] = ServiceResourceConfig(cpus=2, memory_mb=1024)
+    config.resources.services["mikro"] = ServiceResourceConfig(cpus=3, memory_mb=1024)
+    config.db.tuning.enabled = True
+    config.db.tuning.memory_mb = 8192
+    config.db.tuning.cpus = 8
+    config.mikro.process_model = ProcessModelConfig(
+        cpus=16, worker_replicas=1, worker_command="worker -c {concurrency}"
+    )
+
+    services = create_docker_compose(config)["services"]
+
+    # The tuning follows the planned limits of the db, not the tuning inputs
+    assert services["db"]["shm_size"] == "256m"
+    assert "shared_buffers=256MB" in services["db"]["command"]
+    assert "max_worker_processes=8" not in services["db"]["command"]
+    assert services["mikro"]["environment"]["WEB_CONCURRENCY"] == "3"
+    limits = {s.name: s for s in plan_resources(config.resources, services).services}
+    assert services["mikro-worker"]["command"] == (
+        f"worker -c {max(int(limits['mikro-worker'].cpus), 1)}"
+    )
+
+
+def test_resource_plan_uses_resources_of_build_machine(monkeypatch):
+    config = ArkitektServerConfig()
+    # The resources of the machine the config is created on are not stored
+    assert config.resources.model_dump()["cpus"] is None
+    assert config.resources.model_dump()["memory_mb"] is None
+
+    monkeypatch.setattr(resources, "get_cpu_count", lambda: 32)
+    monkeypatch.setattr(resources, "get_memory_mb", lambda: 131072)
+    services = create_docker_compose(config)["services"]
+
+    plan = plan_resources(config.resources, services)
+    assert (plan.cpus, plan.memory_mb) == (32, 131072)
+
+    config.resources.cpus = 4
+    assert plan_resources(config.resources, services).cpus == 4
+
+
+def test_resource_plan_must_fit():
+    config = ArkitektServerConfig()
+    config.resources.cpus = 2
+    config.resources.services["db"] = ServiceResourceConfig(cpus=4)
+
+    with pytest.raises(ResourcePlanError):
+        plan_resources(config.resources, create_docker_compose(config)["services"])
+
+
+def test_healthchecks_gate_dependencies():
+    config = ArkitektServerConfig()
+    config.pooler.enabled = True
+
+    services = create_docker_compose(config)["services"]
+
+    assert services["db"]["healthcheck"]["test"][0] == "CMD-SHELL"
+    assert services["redis"]["healthcheck"]["test"] == ["CMD", "redis-cli", "ping"]
+    assert "/mikro/ht" in services["mikro"]["healthcheck"]["test"][-1]
+    assert services["mikro"]["depends_on"]["db"] == {"condition": "service_healthy"}
+    # The pooler has no healthcheck, so it only needs to be started
+    assert services["mikro"]["depends_on"]["pooler"] == {
+        "condition": "service_started"
+    }
+    assert services["lok"]["depends_on"]["db"] == {"condition": "service_healthy"}
+    assert services["minio_init"]["depends_on"]["minio"] == {
+        "condition": "service_healthy"
+    }
+
+    config.healthchecks = False
+    services = create_docker_compose(config)["services"]
+    assert "healthcheck" not in services["db"]
+    assert services["mikro"]["depends_on"] == ["redis", "db", "minio", "pooler"]
@@ -0,0 +1,46 @@
+from pathlib import Path
+from arkitekt_server.config import ArkitektServerConfig
+from arkitekt_server.keys import FixtureKeyProvider, PoolKeyProvider, set_key_provider
+
+
+def test_key_pair_is_generated_lazily():
+    config = ArkitektServerConfig()
+    assert config.lok.auth_key_pair is None, "Key pair was generated on construction"
+
+    dumped = config.model_dump()
+    assert dumped["lok"]["auth_key_pair"]["private_key"], "Key pair was not serialized"
+
+    # The key pair is kept on the configuration once it was generated
+    assert config.lok.auth_key_pair is not None
+    assert config.model_dump()["lok"]["auth_key_pair"] == dumped["lok"]["auth_key_pair"]
+
+    reloaded = ArkitektServerConfig(**dumped)
+    assert reloaded.lok.get_auth_key_pair() == config.lok.get_auth_key_pair()
+
+
+def test_fixture_key_provider(tmp_path: Path):
+    set_key_provider(FixtureKeyProvider(tmp_path / "fixture.json"))
+    try:
+        first = ArkitektServerConfig().lok.get_auth_key_pair()
+        second = ArkitektServerConfig().lok.get_auth_key_pair()
+    finally:
+        set_key_provider(None)
+
+    assert first == second, "Fixture key provider returned different keys"
+    assert (
+        FixtureKeyProvider(tmp_path / "fixture.json").get_key_pair() == first
+    ), "Fixture key was not persisted"
+
+
+def test_pool_key_provider(tmp_path: Path):
+    pool = PoolKeyProvider(tmp_path / "pool")
+    assert pool.fill(2) == 2
+    assert pool.fill(2) == 0, "Pool was filled beyond its size"
+
+    first = pool.get_key_pair()
+    second = pool.get_key_pair()
+    assert pool.size() == 0, "Key pairs were not removed from the pool"
+    assert first != second, "Pool handed out the same key twice"
+
+    # An empty pool falls back to generating a key pair
+    assert pool.get_key_pair() not in (first, second)
@@ -0,0 +1,109 @@
+from arkitekt_server.config import ArkitektServerConfig
+from arkitekt_server.diff import create_docker_compose
+from arkitekt_server.measure import (
+    StartupProbe,
+    build_startup_probes,
+    format_timeline,
+    measure_startup,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def test_startup_probes_use_gateway_health_endpoints():
+    config = ArkitektServerConfig()
+    config.gateway.exposed_http_port = 4569
+
+    probes = {
+        probe.name: probe
+        for probe in build_startup_probes(config, create_docker_compose(config))
+    }
+
+    assert probes["mikro"].kind == "http"
+    assert probes["mikro"].url == "http://localhost:4569/mikro/ht"
+    assert probes["db"].kind == "compose"
+    assert set(probes["mikro"].depends_on) == {"db", "redis", "minio"}
+    assert "gateway" not in probes
+
+
+def test_measure_startup_records_time_to_healthy():
+    clock = FakeClock()
+    probes = [
+        StartupProbe(name="db", kind="compose"),
+        StartupProbe(name="redis", kind="compose"),
+        StartupProbe(name="mikro", kind="http", depends_on=["db", "redis"]),
+        StartupProbe(name="rekuest", kind="http", depends_on=["redis"]),
+    ]
+    healthy_at = {"redis": 1.0, "db": 3.0, "rekuest": 5.0, "mikro": 12.0}
+
+    def poll(pending: list[StartupProbe]) -> set[str]:
+        return {p.name for p in pending if clock.now >= healthy_at[p.name]}
+
+    report = measure_startup(
+        probes, timeout=60, interval=1, poll=poll, clock=clock, sleep=clock.sleep
+    )
+
+    assert [s.name for s in report.services] == ["redis", "db", "rekuest", "mikro"]
+    assert report.healthy
+    assert report.total_seconds == 12.0
+    assert report.critical_path == ["db", "mikro"]
+    assert clock.now == 12.0
+
+    timeline = format_timeline(report, width=12)
+    assert timeline[-1] == "* mikro      12.0s " + "█" * 12
+    assert timeline[0].startswith("  redis")
+
+
+def test_measure_startup_times_out():
+    clock = FakeClock()
+    probes = [
+        StartupProbe(name="db", kind="compose"),
+        StartupProbe(name="mikro", kind="http", depends_on=["db"]),
+    ]
+
+    report = measure_startup(
+        probes,
+        timeout=10,
+        interval=1,
+        poll=lambda pending: {p.name for p in pending if p.name == "db"},
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    assert not report.healthy
+    assert report.total_seconds is None
+    assert report.services[-1].seconds is None
+    assert report.critical_path == ["db", "mikro"]
+    assert clock.now == 10.0
+    assert "timed out" in format_timeline(report)[-1]
+
+
+class FailedProcess:
+    def poll(self) -> int:
+        return 1
+
+
+def test_measure_startup_stops_when_compose_fails():
+    clock = FakeClock()
+
+    report = measure_startup(
+        [StartupProbe(name="db", kind="compose")],
+        timeout=300,
+        interval=1,
+        poll=lambda pending: set(),
+        clock=clock,
+        sleep=clock.sleep,
+        process=FailedProcess(),  # type: ignore[arg-type]
+    )
+
+    assert not report.healthy
+    assert clock.now == 0.0
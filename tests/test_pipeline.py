@@ -0,0 +1,70 @@
+import hashlib
+import json
+from pathlib import Path
+import yaml
+from arkitekt_server.config import ArkitektServerConfig, Organization
+from arkitekt_server.diff import collect_all_files, write_virtual_config_files
+
+
+def test_repeated_generation_is_idempotent(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.organizations.append(
+        Organization(name="lab", identifier="lab", bot_password="lab-bot-secret")
+    )
+    users = config.model_dump()["users"]
+
+    write_virtual_config_files(tmp_path / "first", config)
+    write_virtual_config_files(tmp_path / "second", config)
+
+    assert config.model_dump()["users"] == users
+    first = collect_all_files(tmp_path / "first")
+    second = collect_all_files(tmp_path / "second")
+    assert first.keys() == second.keys()
+    for path, first_file in first.items():
+        assert first_file.read_bytes() == second[path].read_bytes(), path
+
+    lok = yaml.safe_load((tmp_path / "first" / "configs" / "lok.yaml").read_text())
+    bots = {u["username"]: u for u in lok["users"] if u["username"].endswith("_bot")}
+    assert set(bots) == {"arkitektio_bot", "lab_bot"}
+    assert bots["lab_bot"]["password"] == "lab-bot-secret"
+    assert "bot_password" not in lok["organizations"][1]
+
+
+def test_json_config_format(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.mikro.config_format = "json"
+
+    write_virtual_config_files(tmp_path, config)
+
+    content = (tmp_path / "configs" / "mikro.yaml").read_text()
+    # JSON is a valid YAML document, so consumers can still read the file
+    assert json.loads(content) == yaml.safe_load(content)
+    assert json.loads(content)["force_script_name"] == "mikro"
+
+
+def test_lok_seed_file(tmp_path: Path):
+    config = ArkitektServerConfig()
+    config.lok.seed_file = True
+
+    write_virtual_config_files(tmp_path, config)
+
+    lok = yaml.safe_load((tmp_path / "configs" / "lok.yaml").read_text())
+    assert lok["seed_file"] == "/workspace/seed.jsonl"
+    assert "users" not in lok and "redeem_tokens" not in lok
+
+    header, *lines = (tmp_path / "configs" / "lok_seed.jsonl").read_text().splitlines(
+        keepends=True
+    )
+    assert json.loads(header)["sha256"] == hashlib.sha256(
+        "".join(lines).encode()
+    ).hexdigest()
+    records = [json.loads(line) for line in lines]
+    kinds = [record["kind"] for record in records]
+    assert kinds[0] == "organization"
+    assert {"user", "instance", "redeem_token"} <= set(kinds)
+    assert {"username": "demo"}.items() <= records[kinds.index("user")]["data"].items()
+
+    compose = yaml.safe_load((tmp_path / "docker-compose.yaml").read_text())
+    assert "./configs/lok_seed.jsonl:/workspace/seed.jsonl" in (
+        compose["services"]["lok"]["volumes"]
+    )
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from arkitekt_server import serialization
+from arkitekt_server.build import hash_input
+from arkitekt_server.serialization import (
+    LazySequence,
+    dump_config,
+    dump_json,
+    dump_yaml,
+    iterate_json,
+)
+
+
+def create_users(count: int) -> list[dict]:
+    return [
+        {
+            "username": f"user{i}",
+            "description": "a long description that wraps " * 4,
+            "memberships": [{"organization": "lab", "roles": ["admin", "user"]}],
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("count", [0, 1, 5])
+def test_streamed_documents_match(count: int, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(serialization, "STREAM_BATCH_SIZE", 2)
+    users = create_users(count)
+    document = {"z": {"nested": [1, 2]}, "users": users, "a": "value", "empty": []}
+    lazy = {
+        **document,
+        "users": LazySequence(lambda: iter(create_users(count))),
+        "empty": LazySequence(lambda: []),
+    }
+
+    assert dump_config(lazy, "yaml") == dump_yaml(document)
+    assert dump_config(lazy, "json") == dump_json(document)
+    assert "".join(iterate_json(lazy)) == json.dumps(document, sort_keys=True)
+    assert hash_input({"content": lazy}) == hash_input({"content": document})
+
+    # Nested lazy sequences are serialized as a whole
+    assert dump_yaml({"outer": lazy}) == dump_yaml({"outer": document})
+    assert dump_config(LazySequence(lambda: users)) == dump_yaml(users)
@@ -0,0 +1,89 @@
+import json
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from arkitekt_server.config import ArkitektServerConfig
+from arkitekt_server.main import app, load_yaml_file
+from arkitekt_server.user_import import import_users, read_import_rows
+from tests.utils import run_init_command
+
+
+CSV = """username,password,email,organization,roles,active_organization
+alice,secret,alice@example.com,arkitektio,admin;user,
+bob,,,arkitektio,,
+alice,other,,arkitektio,user,
+carol,secret,,unknown,user,
+dave,secret,,arkitektio,user,arkitektio
+,secret,,arkitektio,user,
+erin,secret,,arkitektio,user,
+"""
+
+
+def test_import_users_from_csv(tmp_path: Path):
+    path = tmp_path / "users.csv"
+    path.write_text(CSV)
+    config = ArkitektServerConfig()
+
+    result = import_users(config, read_import_rows(path, "csv"), batch_size=2)
+
+    assert [u.username for u in result.users] == ["alice", "bob", "dave", "erin"]
+    assert [(i.line, i.username) for i in result.duplicates] == [(4, "alice")]
+    assert [(i.line, i.username) for i in result.invalid] == [(5, "carol"), (7, None)]
+    assert "unknown" in result.invalid[0].message
+
+    alice = result.users[0]
+    assert alice.memberships[0].roles == ["admin", "user"]
+    assert alice.active_organization == "arkitektio"
+    assert result.users[1].memberships[0].roles == ["guest"]
+    assert [u.username for u in config.users] == ["demo", "alice", "bob", "dave", "erin"]
+
+
+def test_import_users_from_jsonl(tmp_path: Path):
+    path = tmp_path / "users.jsonl"
+    rows = [
+        {"username": "alice", "memberships": [{"organization": "lab", "roles": ["user"]}]},
+        {"username": "bob", "organization": "lab", "roles": ["admin"]},
+        {"username": "carol", "unknown_field": 1},
+    ]
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n{not json\n")
+    config = ArkitektServerConfig()
+
+    result = import_users(
+        config, read_import_rows(path, "jsonl"), create_organizations=True
+    )
+
+    assert [u.username for u in result.users] == ["alice", "bob"]
+    assert [o.identifier for o in result.organizations] == ["lab"]
+    assert [o.identifier for o in config.organizations] == ["arkitektio", "lab"]
+    assert [i.line for i in result.invalid] == [3, 4]
+    assert "unknown_field" in result.invalid[0].message
+
+
+def test_user_import_command():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        run_init_command(app, runner)
+        Path("users.csv").write_text(CSV)
+
+        result = runner.invoke(app, ["auth", "user", "import", "users.csv"])
+
+        assert result.exit_code == 0, result.stdout
+        assert "Imported 4 users (1 duplicates, 2 invalid)" in result.stdout
+        config = load_yaml_file("arkitekt_server_config.yaml")
+        assert {"alice", "bob", "dave", "erin"} <= {u.username for u in config.users}
+
+
+def test_rejected_row_does_not_reserve_username(tmp_path: Path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "username,organization\ncarol,typo\ncarol,arkitektio\ncarol,arkitektio\n"
+    )
+    config = ArkitektServerConfig()
+
+    result = import_users(config, read_import_rows(path, "csv"))
+
+    assert [u.username for u in result.users] == ["carol"]
+    assert result.users[0].memberships[0].organization == "arkitektio"
+    assert [i.line for i in result.invalid] == [2]
+    assert [i.line for i in result.duplicates] == [4]